@@ -0,0 +1,133 @@
+import collections
+import itertools
+import json
+import multiprocessing
+import ranking
+from solver import WordHotness
+from worker import init_worker
+from util import format_suggestions
+
+
+def parse_record(solver, line):
+    """
+    A game history, a JSON list of [word, hotness] or an object {"history": [[word, hotness], ...], "id": ...}
+    whose id is echoed. The hotness is typed like `Solver.parse_hotness` or a list like [-1, 2, 0, ...].
+
+    :return: (record id or None, list of (word, WordHotness))
+    """
+    record = json.loads(line)
+    record_id = None
+    if isinstance(record, dict):
+        record_id = record.get('id')
+        record = record['history']
+    history = []
+    for word, hotness in record:
+        if isinstance(hotness, str):
+            history.append((word, solver.parse_hotness(word, hotness)))
+        else:
+            assert solver.is_valid_word(word), f"{word} is an invalid word"
+            assert len(word) == len(hotness), "length of word and hotness must be the same"
+            history.append((word, WordHotness(word, list(hotness))))
+    return record_id, history
+
+
+def process_lines(solver, lines, num_suggestions=10, strategy=ranking.SCORE):
+    """
+    Suggestions of each game history of `lines`, see `parse_record`, as JSON lines in the same order:
+    {"suggestions": [[word, score], ...]} best first, or {"error": message} for an invalid record.
+    The suggestions are those of a session playing the game, see `GameSession.suggestions`. With ranking.SCORE the
+    records are ranked together by `Solver.batch_suggestions`.
+
+    :param lines: list of str, without blank lines
+    :return: str of one line per record
+    """
+    responses = [None] * len(lines)
+    valid, histories = [], []
+    for i, line in enumerate(lines):
+        try:
+            record_id, history = parse_record(solver, line)
+        except KeyError as e:
+            responses[i] = {'error': f"Missing {e}"}
+            continue
+        except (AssertionError, ValueError, TypeError) as e:
+            responses[i] = {'error': str(e) or type(e).__name__}
+            continue
+        responses[i] = {} if record_id is None else {'id': record_id}
+        valid.append(i)
+        histories.append(history)
+
+    if strategy == ranking.SCORE:
+        results = solver.batch_suggestions(histories, num_suggestions)
+    else:
+        results = []
+        for history in histories:
+            session = solver.new_session()
+            for word, word_hotness in history:
+                session.update(word, word_hotness)
+            results.append(session.suggestions(num_suggestions, strategy))
+    for i, suggestions in zip(valid, results):
+        responses[i]['suggestions'] = format_suggestions(suggestions)
+    return ''.join(json.dumps(response) + '\n' for response in responses)
+
+
+def iter_lines(files):
+    """
+    Non blank lines of `files`, opened text files read in turn
+    """
+    for f in files:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+_worker = {}
+
+
+def _init_worker(solver_args, solver_kwargs, patterns_dir, num_suggestions, strategy):
+    init_worker(_worker, solver_args, solver_kwargs, patterns_dir, num_suggestions=num_suggestions, strategy=strategy)
+
+
+def _process_worker(lines):
+    return process_lines(_worker['solver'], lines, _worker['num_suggestions'], _worker['strategy'])
+
+
+def run(words_list_path, files, output, number_of_letters=5, max_guesses=6, num_suggestions=10, strategy=ranking.SCORE,
+        processes=1, window=None, chunk_size=256, patterns_dir=None, hotness_weights=None, cache_size=1 << 16):
+    """
+    Stream the suggestions of the game histories of `files` to `output` in input order.
+    Records are sent in chunks of `chunk_size` lines to a pool of `processes` workers, each loading the dictionary once.
+    At most `window` chunks are in flight: reading stops until the oldest chunk is written, so a slow `output` holds
+    back the input rather than buffering results.
+
+    :param files: iterable of text files of newline-delimited records, see `parse_record`
+    :param output: text file
+    :param window: maximum number of chunks in flight, default to 4 per process
+    :return: number of records
+    """
+    solver_args = (words_list_path, number_of_letters, max_guesses)
+    solver_kwargs = {'hotness_weights': hotness_weights, 'cache_size': cache_size}
+    lines = iter_lines(files)
+    chunks = iter(lambda: list(itertools.islice(lines, chunk_size)), [])
+    count = 0
+    if processes == 1:
+        _init_worker(solver_args, solver_kwargs, patterns_dir, num_suggestions, strategy)
+        for chunk in chunks:
+            output.write(_process_worker(chunk))
+            output.flush()
+            count += len(chunk)
+        return count
+
+    window = window or processes * 4
+    in_flight = collections.deque()
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(solver_args, solver_kwargs, patterns_dir, num_suggestions, strategy)) as pool:
+        for chunk in chunks:
+            if len(in_flight) >= window:
+                output.write(in_flight.popleft().get())
+                output.flush()
+            in_flight.append(pool.apply_async(_process_worker, (chunk,)))
+            count += len(chunk)
+        while in_flight:
+            output.write(in_flight.popleft().get())
+            output.flush()
+    return count
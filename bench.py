@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+import warnings
+import word_cache
+from solver import Solver
+
+
+VERSION = 3
+SIZES = (1000, 5000, 20000)
+# number of guesses made before the benchmarked call
+STAGES = {'empty': 0, 'one_guess': 1, 'three_guesses': 3}
+BENCHMARKS = ('hotness', 'score_word', 'update_word', 'suggestions')
+# relative slowdown above which a benchmark is a regression
+THRESHOLD = 0.25
+
+# English letter frequencies, in percent, of the synthetic words
+LETTER_FREQUENCIES = {
+    'a': 8.2, 'b': 1.5, 'c': 2.8, 'd': 4.3, 'e': 12.7, 'f': 2.2, 'g': 2.0, 'h': 6.1, 'i': 7.0, 'j': 0.2, 'k': 0.8,
+    'l': 4.0, 'm': 2.4, 'n': 6.7, 'o': 7.5, 'p': 1.9, 'q': 0.1, 'r': 6.0, 's': 6.3, 't': 9.1, 'u': 2.8, 'v': 1.0,
+    'w': 2.4, 'x': 0.2, 'y': 2.0, 'z': 0.1,
+}
+
+
+def synthetic_words(size, number_of_letters, rng):
+    letters, weights = zip(*LETTER_FREQUENCIES.items())
+    words = {}
+    while len(words) < min(size, 26 ** number_of_letters):
+        words[''.join(rng.choices(letters, weights, k=number_of_letters))] = 1
+    return list(words)
+
+
+def sample_words(words_list_path, size, number_of_letters, rng):
+    """
+    `size` words of the dictionary at `words_list_path` in dictionary order, all of them with a warning if it has fewer
+    """
+    words = [word for word, _ in word_cache.iter_words(words_list_path, number_of_letters)]
+    if len(words) < size:
+        warnings.warn(f"{words_list_path} has {len(words)} words of {number_of_letters} letters, fewer than {size}")
+    if len(words) <= size:
+        return words
+    return [words[i] for i in sorted(rng.sample(range(len(words)), size))]
+
+
+def play_stage(solver, session, guesses, rng):
+    """
+    Make `guesses` random guesses against a random target of the dictionary
+    """
+    target = rng.choice(solver.words)
+    for _ in range(guesses):
+        guess = rng.choice(solver.words)
+        session.update(guess, solver.hotness(guess, target))
+    return target
+
+
+def measure(func, repeat, min_time):
+    """
+    :return: sorted times in seconds of one call of `func` in each of `repeat` runs of at least `min_time` seconds
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return sorted(seconds / number for seconds in timer.repeat(repeat, number))
+
+
+def bench_solver(solver, size, seed=0, repeat=7, min_time=0.1, samples=200):
+    """
+    Time `BENCHMARKS` at each of `STAGES` of a game
+
+    :param solver: Solver, its suggestion cache is bypassed
+    :param size: number of words of the dictionary of `solver`, used in the benchmark names
+    :param samples: number of words scored or compared per timed run of the micro benchmarks
+    :return: {'benchmark/size/stage': sorted seconds per call of each run}
+    """
+    results = {}
+    for stage, guesses in STAGES.items():
+        rng = random.Random(f"{seed}/{stage}")
+        session = solver.new_session()
+        target = play_stage(solver, session, guesses, rng)
+        letters_hotness = session.letters_hotness
+        words = [rng.choice(solver.words) for _ in range(samples)]
+        guess = rng.choice(solver.words)
+        guess_hotness = solver.hotness(guess, target)
+        # stages with a guess score the candidates left like `GameSession.suggestions`
+        candidates = session.candidates if guesses else None
+
+        def hotness():
+            for word in words:
+                solver.hotness(word, target)
+
+        def score_word():
+            for word in words:
+                solver.score_word(word, letters_hotness)
+
+        def update_word():
+            letters_hotness.copy().update_word(guess, guess_hotness)
+
+        def suggestions():
+            solver.suggestions_cache.clear()
+            solver.suggestions(letters_hotness, 10, candidates)
+
+        for name, func, calls in (('hotness', hotness, samples), ('score_word', score_word, samples),
+                                  ('update_word', update_word, 1), ('suggestions', suggestions, 1)):
+            results[f"{name}/{size}/{stage}"] = [seconds / calls for seconds in measure(func, repeat, min_time)]
+    return results
+
+
+def run(words_list_path=None, sizes=SIZES, number_of_letters=5, seed=0, repeat=7, min_time=0.1):
+    """
+    Benchmark dictionaries of `sizes` words sampled from `words_list_path`, or synthetic when it is None
+
+    :return: {'version', 'dictionary', 'number_of_letters', 'sizes': {size: number of words benchmarked}, 'python',
+        'machine', 'results': {'benchmark/size/stage': median seconds per call},
+        'ranges': {'benchmark/size/stage': [fastest, slowest] seconds per call over the runs}}
+    """
+    results = {}
+    ranges = {}
+    number_of_words = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            rng = random.Random(f"{seed}/{size}")
+            if words_list_path is None:
+                words = synthetic_words(size, number_of_letters, rng)
+            else:
+                words = sample_words(words_list_path, size, number_of_letters, rng)
+            number_of_words[str(size)] = len(words)
+            path = os.path.join(directory, f"words_{size}.json")
+            with open(path, 'w') as f:
+                json.dump(dict.fromkeys(words, 1), f)
+            solver = Solver(path, number_of_letters, verbose=False)
+            for name, runs in bench_solver(solver, size, seed, repeat, min_time).items():
+                results[name] = runs[len(runs) // 2]
+                ranges[name] = [runs[0], runs[-1]]
+    return {'version': VERSION, 'dictionary': os.path.basename(words_list_path) if words_list_path else 'synthetic',
+            'number_of_letters': number_of_letters, 'sizes': number_of_words,
+            'python': platform.python_version(), 'machine': platform.machine(), 'results': results, 'ranges': ranges}
+
+
+def compare(report, baseline, threshold=THRESHOLD):
+    """
+    Benchmarks of `report` slower than in `baseline` by more than `threshold`, benchmarks missing from either are skipped.
+    A benchmark is only slower when its median is, and its fastest run is slower than the slowest run of the baseline:
+    single timings of microseconds vary by more than the threshold from one run to the next.
+
+    :return: list of (name, baseline seconds, seconds, ratio), slowest first
+    :raise: Exception if the reports are not of the same dictionary, or of a size sampled to a different number of words
+    """
+    for key in ('version', 'dictionary', 'number_of_letters'):
+        if report.get(key) != baseline.get(key):
+            raise Exception(f"Baseline {key} {baseline.get(key)} differs from {report.get(key)}")
+    baseline_sizes = baseline.get('sizes', {})
+    for size, number_of_words in report.get('sizes', {}).items():
+        if baseline_sizes.get(size, number_of_words) != number_of_words:
+            raise Exception(f"Baseline size {size} has {baseline_sizes[size]} words, not {number_of_words}")
+    regressions = []
+    for name, seconds in report['results'].items():
+        base = baseline['results'].get(name)
+        if not base or seconds <= base * (1 + threshold):
+            continue
+        fastest = report.get('ranges', {}).get(name, [seconds])[0]
+        base_slowest = baseline.get('ranges', {}).get(name, [base])[-1]
+        if fastest > base_slowest:
+            regressions.append((name, base, seconds, seconds / base))
+    return sorted(regressions, key=lambda r: r[3], reverse=True)
+
+
+def merge_fastest(report, other):
+    """
+    Keep in `report` the measure of each benchmark of `other` with a lower median, so that a benchmark measured twice
+    is only as slow as its best measure: a slowdown of the machine seldom lasts across both, a regression does
+    """
+    for name, seconds in other['results'].items():
+        if name in report['results'] and seconds < report['results'][name]:
+            report['results'][name] = seconds
+            report['ranges'][name] = other['ranges'][name]
+    return report
+
+
+def format_report(report, baseline=None):
+    lines = []
+    for name, seconds in sorted(report['results'].items()):
+        line = f"{name:<40} {seconds * 1e6:>12.2f} us"
+        base = baseline['results'].get(name) if baseline else None
+        if base:
+            line += f" {seconds / base:>8.2f}x"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the solver hot paths against a stored baseline")
+    parser.add_argument('-d', '--dictionary', default='data/words_dictionary.json',
+                        help="dictionary to sample the words from, synthetic words are used if it does not exist")
+    parser.add_argument('--synthetic', action='store_true', help="use synthetic words even if the dictionary exists")
+    parser.add_argument('-n', '--number-of-letters', type=int, default=5)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=7, help="number of timed runs, their median is compared")
+    parser.add_argument('--min-time', type=float, default=0.1, help="minimum seconds of one timed run")
+    parser.add_argument('-o', '--output', help="write the results as JSON to this file")
+    parser.add_argument('-b', '--baseline', default='bench_baseline.json',
+                        help="results of this machine to compare against, see --save-baseline")
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the baseline")
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help="relative slowdown from the baseline failing the run")
+    parser.add_argument('--retries', type=int, default=2,
+                        help="times the sizes with regressions are measured again before failing the run")
+    args = parser.parse_args()
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    synthetic = args.synthetic or not os.path.exists(args.dictionary)
+    if baseline is not None and baseline.get('dictionary') == 'synthetic':
+        # compare like with like rather than with whatever dictionary happens to be there
+        synthetic = True
+    words_list_path = None if synthetic else args.dictionary
+    dictionary = os.path.basename(words_list_path) if words_list_path else 'synthetic'
+    if baseline is not None and baseline.get('dictionary') != dictionary:
+        print(f"Baseline {args.baseline} was recorded on {baseline.get('dictionary')} words, not {dictionary}, "
+              f"see --save-baseline", file=sys.stderr)
+        sys.exit(2)
+    report = run(words_list_path, args.sizes, args.number_of_letters, args.seed, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(format_report(report))
+        print(f"Baseline saved to {args.baseline}")
+    elif baseline is not None:
+        try:
+            regressions = compare(report, baseline, args.threshold)
+        except Exception as e:
+            print(f"Cannot compare with {args.baseline}: {e}", file=sys.stderr)
+            sys.exit(2)
+        for _ in range(args.retries):
+            if not regressions:
+                break
+            sizes = sorted({int(name.split('/')[1]) for name, _, _, _ in regressions})
+            merge_fastest(report, run(words_list_path, sizes, args.number_of_letters, args.seed, args.repeat,
+                                      args.min_time))
+            regressions = compare(report, baseline, args.threshold)
+        print(format_report(report, baseline))
+        for name, base, seconds, ratio in regressions:
+            print(f"Regression of {name}: {base * 1e6:.2f} us -> {seconds * 1e6:.2f} us ({ratio:.2f}x)")
+        sys.exit(1 if regressions else 0)
+    else:
+        print(format_report(report))
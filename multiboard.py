@@ -0,0 +1,187 @@
+import argparse
+import random
+import numpy as np
+import patterns
+import ranking
+
+
+class MultiBoardSession:
+
+    def __init__(self, solver, number_of_boards, max_guesses=None):
+        """
+        State of a game of `number_of_boards` boards solved at once (Dordle, Quordle...): every guess is played on
+        every board not solved yet, and each board keeps its own GameSession
+
+        :param solver: Solver
+        :param max_guesses: default to `number_of_boards` + 5
+        """
+        self.solver = solver
+        self.boards = [solver.new_session() for _ in range(number_of_boards)]
+        self.solved = [False] * number_of_boards
+        self.max_guesses = max_guesses if max_guesses is not None else number_of_boards + 5
+        self.guesses = []
+
+    def active_boards(self):
+        return [board for board, solved in zip(self.boards, self.solved) if not solved]
+
+    def update(self, word, word_hotnesses):
+        """
+        Play `word` on every board not solved yet
+
+        :param word: str
+        :param word_hotnesses: one WordHotness per board not solved yet, in board order
+        """
+        active = [i for i, solved in enumerate(self.solved) if not solved]
+        assert len(word_hotnesses) == len(active), f"Expected the hotness of {len(active)} boards"
+        all_correct = patterns.all_correct_pattern(self.solver.number_of_letters)
+        for i, word_hotness in zip(active, word_hotnesses):
+            if word_hotness.pattern == all_correct:
+                self.solved[i] = True
+            else:
+                self.boards[i].update(word, word_hotness)
+        self.guesses.append(word)
+
+    def is_solved(self):
+        return all(self.solved)
+
+    def suggestions(self, num_suggestions=5, strategy=ranking.ENTROPY, all_words=False):
+        """
+        Best guesses by the sum over the boards not solved yet of their partition score, see `ranking.partition_scores`.
+        The pattern of a guess against a candidate is computed once for all the boards containing the candidate.
+        Ties are broken like `ranking.top_suggestions`, in favor of the candidates of any board.
+
+        :param strategy: ranking.ENTROPY or ranking.EXPECTED_SIZE
+        :param all_words: rank every word of the dictionary rather than only the candidates of the boards
+        :return: heap of (score, word)
+        """
+        if strategy not in (ranking.ENTROPY, ranking.EXPECTED_SIZE):
+            raise Exception(f"Unknown multi-board ranking strategy {strategy}")
+        active = self.active_boards()
+        if not active:
+            return []
+
+        solver = self.solver
+        union = np.unique(np.concatenate([board.candidates for board in active]))
+        if len(union) == 0:
+            return []
+        guesses = np.arange(len(solver.words)) if all_words else union
+        # boards with the same candidates, like every board before the first guess, are scored once
+        groups = {}
+        for board in active:
+            key = board.candidates.tobytes()
+            if key in groups:
+                groups[key][2] += 1
+            else:
+                is_candidate = np.zeros(len(solver.words), dtype=bool)
+                is_candidate[board.candidates] = True
+                groups[key] = [np.searchsorted(union, board.candidates), is_candidate, 1]
+
+        scores = np.zeros(len(guesses))
+        for start in range(0, len(guesses), ranking.CHUNK_SIZE):
+            chunk = guesses[start:start + ranking.CHUNK_SIZE]
+            block = ranking.pattern_block(solver.words_matrix, solver.words_letters, solver.patterns, chunk, union)
+            for columns, is_candidate, count in groups.values():
+                scores[start:start + len(chunk)] += count * ranking.partition_scores(
+                    block[:, columns], strategy, solver.number_of_letters, is_candidate[chunk])
+
+        # a board left with one candidate is solved by guessing it, which no partition score rewards
+        for board in active:
+            if len(board) == 1:
+                scores[np.searchsorted(guesses, board.candidates[0])] = float('inf')
+        return ranking.top_suggestions(solver.words, guesses, scores, union, num_suggestions)
+
+    def __len__(self):
+        return sum(len(board) for board in self.active_boards())
+
+
+def solve(solver, targets, strategy=ranking.ENTROPY, max_guesses=None, first_guess=None):
+    """
+    Play the top multi-board suggestion against `targets` until every board is solved or the guesses run out
+
+    :param targets: the answer of each board
+    :param first_guess: str, the same for every game of the same number of boards so it can be computed once
+    :return: (number of guesses solving each board or None, guesses)
+    """
+    session = MultiBoardSession(solver, len(targets), max_guesses)
+    solved_at = [None] * len(targets)
+    guess = first_guess
+    for guess_number in range(1, session.max_guesses + 1):
+        if guess is None:
+            suggestions = session.suggestions(1, strategy)
+            if not suggestions:
+                break
+            guess = max(suggestions)[1]
+
+        active = [i for i, solved in enumerate(session.solved) if not solved]
+        session.update(guess, [solver.hotness(guess, targets[i]) for i in active])
+        for i in active:
+            if session.solved[i]:
+                solved_at[i] = guess_number
+        if session.is_solved():
+            break
+        guess = None
+
+    return solved_at, session.guesses
+
+
+def suggest(solver, number_of_boards, num_suggestions=10, strategy=ranking.ENTROPY, max_guesses=None):
+    """
+    Suggestions for a multi-board game played elsewhere, the hotness of each board is typed like `Solver.suggest`
+    """
+    session = MultiBoardSession(solver, number_of_boards, max_guesses)
+    for i in range(1, session.max_guesses + 1):
+        while True:
+            try:
+                word = input(f"Type in guess {i}: ")
+                assert solver.is_valid_word(word), f"{word} is an invalid word"
+                word_hotnesses = []
+                for board, solved in enumerate(session.solved):
+                    if not solved:
+                        word_hotnesses.append(solver.parse_hotness(word, input(f"Type in hotness of board {board + 1}: ")))
+                break
+            except AssertionError as e:
+                print(e)
+            except ValueError:
+                print("Input value or format is not correct")
+
+        session.update(word, word_hotnesses)
+        if session.is_solved():
+            return
+        counts = ', '.join(f"{board + 1}: {'solved' if solved else len(session.boards[board])}"
+                           for board, solved in enumerate(session.solved))
+        suggestions = sorted(session.suggestions(num_suggestions, strategy), reverse=True)
+        print(f"Number of possible words per board: {counts}")
+        print(f"Here are some suggestions: {', '.join([f'{word}({score:.3f})' for score, word in suggestions])}")
+
+
+if __name__ == '__main__':
+    from solver import Solver
+
+    parser = argparse.ArgumentParser(description="Multi-board (Dordle, Quordle...) solver")
+    parser.add_argument('-d', '--dictionary', default='data/words_dictionary.json')
+    parser.add_argument('-n', '--number-of-letters', type=int, default=5)
+    parser.add_argument('-b', '--boards', type=int, default=4)
+    parser.add_argument('-g', '--max-guesses', type=int, help="default to the number of boards + 5")
+    parser.add_argument('-s', '--strategy', choices=(ranking.ENTROPY, ranking.EXPECTED_SIZE), default=ranking.ENTROPY)
+    parser.add_argument('--patterns-dir', help="directory of the pattern matrix, see patterns.py")
+    subparsers = parser.add_subparsers(dest='command')
+    suggest_parser = subparsers.add_parser('suggest', help="get suggestions for a game played elsewhere")
+    suggest_parser.add_argument('-k', '--num-suggestions', type=int, default=10)
+    solve_parser = subparsers.add_parser('solve', help="solve games against random or given answers")
+    solve_parser.add_argument('targets', nargs='*', help="answers of the boards, random if not given")
+    solve_parser.add_argument('--games', type=int, default=1)
+    solve_parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    s = Solver(args.dictionary, args.number_of_letters, verbose=False)
+    if args.patterns_dir:
+        s.load_patterns(args.patterns_dir)
+    if args.command == 'solve':
+        rng = random.Random(args.seed)
+        for _ in range(args.games):
+            targets = args.targets or rng.sample(s.words, args.boards)
+            solved_at, guesses = solve(s, targets, args.strategy, args.max_guesses)
+            print(' '.join(guesses))
+            print(', '.join(f"{target}: {'failed' if n is None else n}" for target, n in zip(targets, solved_at)))
+    else:
+        suggest(s, args.boards, getattr(args, 'num_suggestions', 10), args.strategy, args.max_guesses)
@@ -0,0 +1,144 @@
+import argparse
+import hashlib
+import os
+import numpy as np
+
+
+# digit of a letter in a pattern id, the pattern id of a word is sum(digit[i] * 3**i)
+WRONG_DIGIT = 0
+CORRECT_CHAR_DIGIT = 1
+CORRECT_CHAR_POS_DIGIT = 2
+
+
+def pattern_dtype(number_of_letters):
+    number_of_patterns = 3 ** number_of_letters
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if number_of_patterns <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint64
+
+
+def all_correct_pattern(number_of_letters):
+    return sum(CORRECT_CHAR_POS_DIGIT * 3 ** i for i in range(number_of_letters))
+
+
+def encode(hotness):
+    """
+    Pattern id of a word hotness
+
+    :param hotness: [-1, 2, 0, ...] as returned by `Solver.hotness`
+    :return: int
+    """
+    res = 0
+    for i, h in enumerate(hotness):
+        if h > 0:
+            res += CORRECT_CHAR_POS_DIGIT * 3 ** i
+        elif h < 0:
+            res += CORRECT_CHAR_DIGIT * 3 ** i
+    return res
+
+
+def encode_array(hotness):
+    """
+    Vectorized `encode`
+
+    :param hotness: np.ndarray of shape (n, number_of_letters) as returned by `Solver.hotness_array`
+    :return: np.ndarray of n pattern ids
+    """
+    number_of_letters = hotness.shape[1]
+    dtype = pattern_dtype(number_of_letters)
+    res = np.zeros(len(hotness), dtype=dtype)
+    for i in range(number_of_letters):
+        column = hotness[:, i]
+        res += (column > 0).astype(dtype) * dtype(CORRECT_CHAR_POS_DIGIT * 3 ** i)
+        res += (column < 0).astype(dtype) * dtype(CORRECT_CHAR_DIGIT * 3 ** i)
+    return res
+
+
+def decode(pattern, number_of_letters):
+    """
+    Inverse of `encode`
+
+    :param pattern: int
+    :param number_of_letters: int
+    :return: [-1, 2, 0, ...]
+    """
+    res = []
+    pattern = int(pattern)
+    for i in range(number_of_letters):
+        pattern, digit = divmod(pattern, 3)
+        if digit == CORRECT_CHAR_POS_DIGIT:
+            res.append(i + 1)
+        elif digit == CORRECT_CHAR_DIGIT:
+            res.append(-i - 1)
+        else:
+            res.append(0)
+    return res
+
+
+def dictionary_key(words, number_of_letters):
+    """
+    Key identifying a dictionary, changes whenever a word is added, removed or reordered
+
+    :param words: list of str
+    :param number_of_letters: int
+    :return: str
+    """
+    h = hashlib.sha1(f"{number_of_letters}\n".encode())
+    for word in words:
+        h.update(word.encode())
+        h.update(b"\n")
+    return h.hexdigest()[:16]
+
+
+def pattern_matrix_path(directory, words, number_of_letters):
+    return os.path.join(directory, f"patterns_{number_of_letters}_{dictionary_key(words, number_of_letters)}.bin")
+
+
+def build_pattern_matrix(solver, path):
+    """
+    Compute the pattern id of every (guess, answer) pair of the solver dictionary and write it to `path`
+    as a raw len(words) x len(words) matrix, row `i` holding the patterns of guess `solver.words[i]`
+
+    :param solver: Solver
+    :param path: str
+    :return: path
+    """
+    n = len(solver.words)
+    dtype = pattern_dtype(solver.number_of_letters)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    matrix = np.memmap(tmp_path, dtype=dtype, mode='w+', shape=(n, n))
+    for i, word in enumerate(solver.words):
+        matrix[i] = encode_array(solver.hotness_array(word))
+    matrix.flush()
+    del matrix
+    # rename is atomic, readers never see a partially written file
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_pattern_matrix(path, number_of_words, number_of_letters):
+    """
+    Memory map a matrix written by `build_pattern_matrix`, read only so that processes share the page cache
+
+    :return: np.memmap of shape (number_of_words, number_of_words)
+    """
+    dtype = pattern_dtype(number_of_letters)
+    expected_size = number_of_words * number_of_words * np.dtype(dtype).itemsize
+    if os.path.getsize(path) != expected_size:
+        raise Exception(f"Pattern matrix {path} does not match a dictionary of {number_of_words} words")
+    return np.memmap(path, dtype=dtype, mode='r', shape=(number_of_words, number_of_words))
+
+
+if __name__ == '__main__':
+    from solver import Solver
+
+    parser = argparse.ArgumentParser(description="Build the guess x answer pattern matrix of a dictionary")
+    parser.add_argument('dictionary_path', nargs='?', default='data/words_dictionary.json')
+    parser.add_argument('-n', '--number-of-letters', type=int, default=5)
+    parser.add_argument('-d', '--directory', default='data')
+    args = parser.parse_args()
+
+    s = Solver(args.dictionary_path, args.number_of_letters)
+    s.load_patterns(args.directory, build=True)
+    print(f"Pattern matrix: {pattern_matrix_path(args.directory, s.words, s.number_of_letters)}")
@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import ranking
+from solver import WordHotness
+
+
+class Prefetcher:
+
+    def __init__(self, solver, num_suggestions=10, strategy=ranking.SCORE, backend=ranking.SERIAL):
+        """
+        Speculative updates of an interactive game while its player is typing.
+        Each prefetch plays a guess with one possible hotness on a copy of the session and ranks its suggestions,
+        which also stores them in the suggestions cache of `solver`. A single background thread runs the prefetches
+        in the order they were started.
+
+        :param solver: Solver
+        :param num_suggestions: number of suggestions the game shows, the cache is keyed by it
+        :param strategy: ranking strategy the game shows
+        :param backend: ranking backend of the game
+        """
+        self.solver = solver
+        self.num_suggestions = num_suggestions
+        self.strategy = strategy
+        self.backend = backend
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+        self._futures = {}
+
+    def _next_session(self, session, word, pattern):
+        o = session.copy()
+        o.update(word, WordHotness.from_pattern(word, pattern))
+        o.suggestions(self.num_suggestions, self.strategy, self.backend)
+        return o
+
+    def _submit(self, session, word, pattern):
+        key = (word, pattern)
+        if key not in self._futures:
+            self._futures[key] = self.executor.submit(self._next_session, session, word, pattern)
+
+    def guess(self, session, word):
+        """
+        Prefetch every hotness `word` can get against the candidates of `session`, the most frequent first.
+        The prefetches of a previous guess not started yet are cancelled.
+        """
+        self.cancel()
+        patterns, counts = np.unique(self.solver.patterns_for(word, session.candidates), return_counts=True)
+        for i in np.argsort(-counts, kind='stable'):
+            self._submit(session, word, int(patterns[i]))
+
+    def guesses(self, session, words, target):
+        """
+        Prefetch the hotness of each of `words` against `target`, when the answer is known
+        """
+        for word in words:
+            self._submit(session, word, self.solver.hotness(word, target).pattern)
+
+    def update(self, session, word, word_hotness):
+        """
+        Session after playing `word` with `word_hotness`: the prefetched one, waited for if it is still running,
+        or an updated copy of `session` when it was not prefetched. Every other prefetch not started is cancelled,
+        `session` is never updated in place since a running prefetch may be copying it.
+
+        :return: GameSession
+        """
+        future = self._futures.pop((word, word_hotness.pattern), None)
+        self.cancel()
+        stats = self.solver.stats
+        if stats is not None:
+            stats.add('prefetch_hits' if future is not None else 'prefetch_misses')
+        if future is not None:
+            return future.result()
+        session = session.copy()
+        session.update(word, word_hotness)
+        return session
+
+    def cancel(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+
+    def close(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
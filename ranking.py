@@ -0,0 +1,392 @@
+import heapq
+import multiprocessing
+import time
+import weakref
+from multiprocessing import shared_memory
+import numpy as np
+import patterns
+from util import hotness_kernel
+
+
+# ranking strategies of `Solver.suggestions`
+SCORE = 'score'
+ENTROPY = 'entropy'
+EXPECTED_SIZE = 'expected_size'
+STRATEGIES = (SCORE, ENTROPY, EXPECTED_SIZE)
+
+# backends computing the partition strategies
+SERIAL = 'serial'
+PROCESS = 'process'
+APPROXIMATE = 'approximate'
+BACKENDS = (SERIAL, PROCESS, APPROXIMATE)
+
+# above this number of patterns, counting per pattern id takes too much memory and we count distinct ids per guess instead
+MAX_DENSE_PATTERNS = 3 ** 8
+CHUNK_SIZE = 256
+
+
+def pattern_block(words_matrix, words_letters, pattern_matrix, guesses, candidates):
+    """
+    Pattern ids of every guess relative to every candidate
+
+    :param words_matrix: np.ndarray of shape (n, number_of_letters), see `util.words2matrix`
+    :param words_letters: np.ndarray of shape (26, n), see `util.letters_presence`
+    :param pattern_matrix: np.ndarray of shape (n, n) or None, see `patterns.build_pattern_matrix`
+    :param guesses: indices of the guesses
+    :param candidates: indices of the candidates
+    :return: np.ndarray of shape (len(guesses), len(candidates))
+    """
+    if pattern_matrix is not None:
+        return pattern_matrix[np.ix_(guesses, candidates)]
+
+    targets = words_matrix.T[:, candidates]
+    targets_letters = words_letters[:, candidates]
+    res = np.empty((len(guesses), len(candidates)), dtype=patterns.pattern_dtype(words_matrix.shape[1]))
+    for i, guess in enumerate(guesses):
+        res[i] = patterns.encode_array(hotness_kernel(words_matrix[guess], targets, targets_letters))
+    return res
+
+
+def partition_scores(block, strategy, number_of_letters, is_candidate):
+    """
+    Score of each guess from the partition of the candidates by pattern id, higher is better.
+    ENTROPY is the expected information of the pattern in bits.
+    EXPECTED_SIZE is minus the expected number of candidates left after the guess.
+
+    :param block: np.ndarray of shape (number of guesses, number of candidates) returned by `pattern_block`
+    :param strategy: ENTROPY or EXPECTED_SIZE
+    :param number_of_letters: int
+    :param is_candidate: np.ndarray of bool, True if the guess is one of the candidates
+    :return: np.ndarray of scores
+    """
+    rows, n = block.shape
+    if n == 0:
+        return np.zeros(rows)
+
+    number_of_patterns = 3 ** number_of_letters
+    if number_of_patterns <= MAX_DENSE_PATTERNS:
+        offsets = np.arange(rows, dtype=np.int64)[:, None] * number_of_patterns
+        counts = np.bincount((block + offsets).ravel(), minlength=rows * number_of_patterns)
+        counts = counts.reshape(rows, number_of_patterns)
+    else:
+        counts = np.zeros((rows, n), dtype=np.int64)
+        for i, row in enumerate(block):
+            row_counts = np.unique(row, return_counts=True)[1]
+            counts[i, :len(row_counts)] = row_counts
+
+    if strategy == ENTROPY:
+        p = counts / n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return -np.where(counts > 0, p * np.log2(p), 0).sum(axis=1)
+    elif strategy == EXPECTED_SIZE:
+        # a guess which is the answer leaves no candidates rather than itself
+        return -((counts * counts).sum(axis=1) - is_candidate) / n
+    else:
+        raise Exception(f"Unknown partition strategy {strategy}")
+
+
+def rank(words_matrix, words_letters, pattern_matrix, guesses, candidates, strategy):
+    """
+    Serial computation of the partition scores of `guesses`, see `partition_scores`
+
+    :return: np.ndarray of scores, one per guess
+    """
+    number_of_letters = words_matrix.shape[1]
+    is_candidate = np.zeros(len(words_matrix), dtype=bool)
+    is_candidate[candidates] = True
+    res = np.empty(len(guesses))
+    for start in range(0, len(guesses), CHUNK_SIZE):
+        chunk = guesses[start:start + CHUNK_SIZE]
+        block = pattern_block(words_matrix, words_letters, pattern_matrix, chunk, candidates)
+        res[start:start + len(chunk)] = partition_scores(block, strategy, number_of_letters, is_candidate[chunk])
+    return res
+
+
+class Budget:
+
+    def __init__(self, seconds=1.0, memory=64 << 20, sample_size=4096, seed=0):
+        """
+        Limits of `approximate_rank`
+
+        :param seconds: time after which the guesses not scored yet are dropped, at least one chunk of at most
+            `CHUNK_SIZE` guesses is scored
+        :param memory: bytes of a block of patterns and of the buffers counting them
+        :param sample_size: maximum number of candidates sampled as answers
+        :param seed: seed of the sample
+        """
+        self.seconds = seconds
+        self.memory = memory
+        self.sample_size = sample_size
+        self.seed = seed
+
+
+# peak bytes per pattern of a block counted by `_sample_scores`: the pattern, its key, the buffers of np.unique and the
+# float arrays of the jackknife, one per distinct key
+BYTES_PER_PATTERN = 80
+# errors of `approximate_rank` are the half width of this confidence interval, 95%
+Z = 1.96
+
+
+class Estimate:
+
+    def __init__(self, guesses, scores, errors, number_of_guesses, number_of_candidates, sample_size, elapsed):
+        """
+        Scores of `approximate_rank`
+
+        :param guesses: indices of the guesses scored before the time ran out, sorted
+        :param scores: estimated score of each guess
+        :param errors: half width of the confidence interval of each score, 0 when every candidate was sampled
+        :param number_of_guesses: number of guesses to rank
+        """
+        self.guesses = guesses
+        self.scores = scores
+        self.errors = errors
+        self.number_of_guesses = number_of_guesses
+        self.number_of_candidates = number_of_candidates
+        self.sample_size = sample_size
+        self.elapsed = elapsed
+
+    @property
+    def coverage(self):
+        return len(self.guesses) / self.number_of_guesses if self.number_of_guesses else 1.0
+
+    def error(self, guess):
+        return self.errors[np.searchsorted(self.guesses, guess)]
+
+
+def _sample_scores(block, strategy, number_of_letters, number_of_candidates, is_candidate):
+    """
+    Estimates of `partition_scores` of the candidates from the patterns of a sample of them, and their standard errors.
+    ENTROPY is the jackknife estimate of the entropy of the partition of the sample, which removes most of the bias of
+    the entropy of a sample, with the jackknife standard error.
+    EXPECTED_SIZE uses the unbiased estimate of the sum of the squared partition sizes of a sample without replacement,
+    a U-statistic, with its first order standard error.
+    Both are exact when the sample is every candidate.
+
+    :param block: np.ndarray of shape (number of guesses, sample size) returned by `pattern_block`
+    :param number_of_candidates: number of candidates the sample is drawn from
+    :return: (np.ndarray of scores, np.ndarray of standard errors)
+    """
+    rows, m = block.shape
+    n = number_of_candidates
+    number_of_patterns = 3 ** number_of_letters
+    keys = block.astype(np.int64) + np.arange(rows, dtype=np.int64)[:, None] * number_of_patterns
+    keys, counts = np.unique(keys.ravel(), return_counts=True)
+    row = keys // number_of_patterns
+    counts = counts.astype(np.float64)
+    if m == n:
+        # the exact `partition_scores`, counted from the keys rather than by a dense count per pattern id
+        if strategy == ENTROPY:
+            p = counts / n
+            return -np.bincount(row, p * np.log2(p), rows), np.zeros(rows)
+        elif strategy == EXPECTED_SIZE:
+            return -(np.bincount(row, counts * counts, rows) - is_candidate) / n, np.zeros(rows)
+        else:
+            raise Exception(f"Unknown partition strategy {strategy}")
+    # finite population correction of sampling without replacement
+    fpc = np.sqrt((n - m) / (n - 1))
+
+    if strategy == ENTROPY:
+        # entropy of the sample is log2(m) - sum(c log2 c) / m, and without one answer of a part of size c
+        # the sum loses c log2 c - (c - 1) log2 (c - 1)
+        c_log_c = counts * np.log2(counts)
+        smaller = counts - 1
+        smaller_log = smaller * np.log2(np.maximum(smaller, 1))
+        total = np.bincount(row, c_log_c, rows)
+        entropy = np.log2(m) - total / m
+        left_out = np.log2(m - 1) - (total[row] - c_log_c + smaller_log) / (m - 1)
+        mean_left_out = np.bincount(row, counts * left_out, rows) / m
+        variance = (m - 1) / m * np.bincount(row, counts * (left_out - mean_left_out[row]) ** 2, rows)
+        return m * entropy - (m - 1) * mean_left_out, np.sqrt(variance) * fpc
+    elif strategy == EXPECTED_SIZE:
+        squares = np.bincount(row, counts * counts, rows)
+        size = 1 + (n - 1) / (m * (m - 1)) * (squares - m)
+        # each sampled answer contributes the size of its own part
+        variance = np.maximum(np.bincount(row, counts ** 3, rows) / m - (squares / m) ** 2, 0)
+        error = 2 * (n - 1) / (m - 1) * np.sqrt(variance / m) * fpc
+        return -(size - is_candidate / n), error
+    else:
+        raise Exception(f"Unknown partition strategy {strategy}")
+
+
+def approximate_rank(words_matrix, words_letters, pattern_matrix, guesses, candidates, strategy, budget):
+    """
+    Partition scores of `guesses` within `budget`, see `partition_scores`. The answers are a sample of the candidates
+    and the guesses are scored in chunks sized for `budget.memory`, the guesses splitting the letters of the candidates
+    the most first, until `budget.seconds` is spent.
+
+    :param budget: Budget
+    :return: Estimate
+    """
+    start = time.perf_counter()
+    number_of_letters = words_matrix.shape[1]
+    candidates = np.asarray(candidates)
+    n = len(candidates)
+    if len(guesses) == 0 or n == 0:
+        return Estimate(np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0), len(guesses), n, 0, 0.0)
+    m = max(1, min(n, budget.sample_size, budget.memory // BYTES_PER_PATTERN))
+    if m == 1 and n > 1:
+        # a sample of one answer tells nothing about the partition sizes
+        m = 2
+    sample = candidates
+    if m < n:
+        sample = np.sort(np.random.default_rng(budget.seed).choice(candidates, m, replace=False))
+    is_candidate = np.zeros(len(words_matrix), dtype=bool)
+    is_candidate[candidates] = True
+
+    # guesses with the letters present in about half the candidates first
+    presence = words_letters[:, candidates].mean(axis=1)
+    order = np.argsort(-((presence * (1 - presence)) @ words_letters[:, guesses]), kind='stable')
+    # at most CHUNK_SIZE guesses between two looks at the clock, whatever the memory allows
+    rows = max(1, min(CHUNK_SIZE, budget.memory // (BYTES_PER_PATTERN * m)))
+    scores, errors, scored = [], [], []
+    for chunk_start in range(0, len(guesses), rows):
+        if scored and time.perf_counter() - start > budget.seconds:
+            break
+        chunk = guesses[order[chunk_start:chunk_start + rows]]
+        block = pattern_block(words_matrix, words_letters, pattern_matrix, chunk, sample)
+        chunk_scores, chunk_errors = _sample_scores(block, strategy, number_of_letters, n, is_candidate[chunk])
+        scores.append(chunk_scores)
+        errors.append(Z * chunk_errors)
+        scored.append(chunk)
+
+    scored, scores, errors = np.concatenate(scored), np.concatenate(scores), np.concatenate(errors)
+    by_index = np.argsort(scored, kind='stable')
+    return Estimate(scored[by_index], scores[by_index], errors[by_index], len(guesses), n, m,
+                    time.perf_counter() - start)
+
+
+def top_n(scored_words, num_suggestions, stats=None):
+    """
+    Heap of the `num_suggestions` best (score, word), a word only replaces the worst one when its score is strictly higher
+
+    :param scored_words: iterable of (score, word)
+    :param num_suggestions: int
+    :param stats: stats.Stats counting the heap operations, None to not count them
+    :return: List[(score, word)]
+    """
+    if stats is not None:
+        return _counted_top_n(scored_words, num_suggestions, stats)
+
+    res = []
+    for score, word in scored_words:
+        if len(res) < num_suggestions:
+            heapq.heappush(res, (score, word))
+        elif res[0][0] < score:
+            heapq.heapreplace(res, (score, word))
+    return res
+
+
+def _counted_top_n(scored_words, num_suggestions, stats):
+    res = []
+    pushes = replaces = 0
+    for score, word in scored_words:
+        if len(res) < num_suggestions:
+            heapq.heappush(res, (score, word))
+            pushes += 1
+        elif res[0][0] < score:
+            heapq.heapreplace(res, (score, word))
+            replaces += 1
+    stats.add('heap_push', pushes)
+    stats.add('heap_replace', replaces)
+    return res
+
+
+def top_n_from_scores(words, indices, scores, num_suggestions):
+    """
+    Same words as `top_n` over the words at `indices` with their `scores`, in the order of `indices`, without a heap
+    operation per word. With T the `num_suggestions`-th best score, `top_n` keeps every word scoring more than T.
+    The words scoring T it keeps are those among the first `num_suggestions` words scoring at least T, less the
+    lowest of them, in (score, word) order, which are popped by each word scoring more than T arriving later.
+
+    :param words: list of str
+    :param indices: np.ndarray of indices into `words`
+    :param scores: np.ndarray of the scores of the words at `indices`
+    :return: List[(score, word)]
+    """
+    if num_suggestions <= 0 or len(scores) == 0:
+        return []
+    if len(scores) <= num_suggestions:
+        res = [(scores[i].item(), words[indices[i]]) for i in range(len(scores))]
+        heapq.heapify(res)
+        return res
+
+    threshold = np.partition(scores, len(scores) - num_suggestions)[len(scores) - num_suggestions]
+    above = np.flatnonzero(scores > threshold)
+    first = np.flatnonzero(scores >= threshold)[:num_suggestions]
+    at_threshold = sorted(words[indices[i]] for i in first if scores[i] == threshold)
+    kept_at_threshold = at_threshold[len(at_threshold) - (num_suggestions - len(above)):]
+
+    res = [(scores[i].item(), words[indices[i]]) for i in above]
+    res += [(threshold.item(), word) for word in kept_at_threshold]
+    heapq.heapify(res)
+    return res
+
+
+def top_suggestions(words, guesses, scores, candidates, num_suggestions):
+    """
+    Best `num_suggestions` guesses as a heap of (score, word) like `Solver.suggestions`.
+    Ties are broken in favor of guesses which are candidates, then of the first words of the dictionary.
+    """
+    is_candidate = np.isin(guesses, candidates)
+    order = np.lexsort((-np.arange(len(guesses)), is_candidate, scores))[::-1][:num_suggestions]
+    top_n = [(float(scores[i]), words[guesses[i]]) for i in order]
+    heapq.heapify(top_n)
+    return top_n
+
+
+_worker = {}
+
+
+def _init_worker(shm_name, number_of_words, number_of_letters, pattern_path):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix_size = number_of_words * number_of_letters
+    _worker['shm'] = shm
+    _worker['words_matrix'] = np.ndarray((number_of_words, number_of_letters), dtype=np.uint8, buffer=shm.buf)
+    _worker['words_letters'] = np.ndarray((26, number_of_words), dtype=np.int8, buffer=shm.buf, offset=matrix_size)
+    _worker['pattern_matrix'] = None
+    if pattern_path is not None:
+        _worker['pattern_matrix'] = patterns.open_pattern_matrix(pattern_path, number_of_words, number_of_letters)
+
+
+def _rank_worker(guesses, candidates, strategy):
+    return rank(_worker['words_matrix'], _worker['words_letters'], _worker['pattern_matrix'], guesses, candidates, strategy)
+
+
+def _close(pool, shm):
+    pool.terminate()
+    pool.join()
+    shm.close()
+    shm.unlink()
+
+
+class ProcessRanker:
+
+    def __init__(self, solver, processes=None):
+        """
+        Pool of worker processes computing partition scores.
+        The word arrays are copied once into shared memory, the pattern matrix, if loaded, is memory mapped by each worker.
+
+        :param solver: Solver
+        :param processes: number of worker processes, default to the number of cores
+        """
+        number_of_words, number_of_letters = solver.words_matrix.shape
+        matrix_size = number_of_words * number_of_letters
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, matrix_size + solver.words_letters.size))
+        np.ndarray(solver.words_matrix.shape, dtype=np.uint8, buffer=self.shm.buf)[:] = solver.words_matrix
+        np.ndarray(solver.words_letters.shape, dtype=np.int8, buffer=self.shm.buf, offset=matrix_size)[:] = solver.words_letters
+
+        pattern_path = solver.patterns.filename if solver.patterns is not None else None
+        self.pool = multiprocessing.Pool(self.processes, initializer=_init_worker,
+                                         initargs=(self.shm.name, number_of_words, number_of_letters, pattern_path))
+        self._finalizer = weakref.finalize(self, _close, self.pool, self.shm)
+
+    def rank(self, guesses, candidates, strategy):
+        chunks = [chunk for chunk in np.array_split(guesses, self.processes * 4) if len(chunk)]
+        if not chunks:
+            return np.empty(0)
+        return np.concatenate(self.pool.starmap(_rank_worker, [(chunk, candidates, strategy) for chunk in chunks]))
+
+    def close(self):
+        self._finalizer()
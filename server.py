@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+import ranking
+import snapshot
+from solver import Solver
+from util import format_suggestions
+
+
+class SessionEntry:
+
+    def __init__(self, session):
+        self.session = session
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+
+    def __init__(self, solver, idle_timeout=600):
+        """
+        Game sessions of a server, all sharing the same Solver
+
+        :param solver: Solver
+        :param idle_timeout: seconds after which an unused session is evicted
+        """
+        self.solver = solver
+        self.idle_timeout = idle_timeout
+        self._entries = {}
+        self._ids = itertools.count(1)
+
+    def create(self):
+        session_id = str(next(self._ids))
+        self._entries[session_id] = SessionEntry(self.solver.new_session())
+        return session_id
+
+    def get(self, session_id):
+        """
+        :return: SessionEntry
+        :raise: KeyError if there is no such session
+        """
+        entry = self._entries[session_id]
+        entry.last_used = time.monotonic()
+        return entry
+
+    def close(self, session_id):
+        return self._entries.pop(session_id, None) is not None
+
+    def sessions(self):
+        return {session_id: entry.session for session_id, entry in self._entries.items()}
+
+    def restore(self, sessions):
+        """
+        Add sessions of a snapshot, see `snapshot.load`, new sessions get ids above theirs
+
+        :param sessions: {session id: GameSession}
+        """
+        for session_id, session in sessions.items():
+            self._entries[session_id] = SessionEntry(session)
+        last = max([int(session_id) for session_id in self._entries if session_id.isdigit()] + [0])
+        self._ids = itertools.count(last + 1)
+
+    def evict_idle(self, now=None):
+        now = time.monotonic() if now is None else now
+        idle = [session_id for session_id, entry in self._entries.items()
+                if now - entry.last_used > self.idle_timeout and not entry.lock.locked()]
+        for session_id in idle:
+            del self._entries[session_id]
+        return len(idle)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SolverServer:
+
+    def __init__(self, solver, idle_timeout=600, num_suggestions=10, strategy=ranking.SCORE, executor=None):
+        """
+        JSON-lines server of game sessions. Each request is a JSON object on one line with an `op` among
+        create, guess, suggest, close and stats, and gets a JSON object on one line in response.
+        {"op": "create"} -> {"session": "1"}
+        {"op": "guess", "session": "1", "word": "rinse", "hotness": "??x11"} -> {"suggestions": [[word, score], ...]}
+        {"op": "suggest", "session": "1", "num_suggestions": 5} -> {"suggestions": [[word, score], ...]}
+        {"op": "close", "session": "1"} -> {"closed": true}
+        A request `id` is echoed in its response, errors are returned as {"error": message}.
+
+        :param solver: Solver shared by every session
+        :param idle_timeout: seconds after which an unused session is evicted
+        :param executor: concurrent.futures.Executor running the ranking, default to the event loop executor
+        """
+        self.solver = solver
+        self.store = SessionStore(solver, idle_timeout)
+        self.num_suggestions = num_suggestions
+        self.strategy = strategy
+        self.executor = executor
+        self.requests = 0
+        self._eviction = None
+
+    def _guess(self, session, word, hotness_input, num_suggestions):
+        word_hotness = self.solver.parse_hotness(word, hotness_input)
+        if all([x >= 1 for x in word_hotness.hotness]):
+            return {'solved': True, 'suggestions': []}
+        session.update(word, word_hotness)
+        return {'candidates': len(session), 'suggestions': format_suggestions(session.suggestions(num_suggestions, self.strategy))}
+
+    def _suggest(self, session, num_suggestions):
+        return {'candidates': len(session), 'suggestions': format_suggestions(session.suggestions(num_suggestions, self.strategy))}
+
+    async def dispatch(self, request):
+        op = request.get('op')
+        if op == 'create':
+            return {'session': self.store.create()}
+        if op == 'stats':
+            return {'sessions': len(self.store), 'requests': self.requests, 'cache': self.solver.suggestions_cache.info()}
+        if op == 'close':
+            return {'closed': self.store.close(request['session'])}
+
+        entry = self.store.get(request['session'])
+        num_suggestions = int(request.get('num_suggestions', self.num_suggestions))
+        if num_suggestions < 1:
+            raise ValueError(f"num_suggestions must be at least 1, got {num_suggestions}")
+        loop = asyncio.get_running_loop()
+        async with entry.lock:
+            if op == 'guess':
+                return await loop.run_in_executor(self.executor, self._guess, entry.session, request['word'],
+                                                  request['hotness'], num_suggestions)
+            if op == 'suggest':
+                return await loop.run_in_executor(self.executor, self._suggest, entry.session, num_suggestions)
+        raise ValueError(f"Unknown op {op}")
+
+    @staticmethod
+    async def read_request(reader):
+        """
+        Next line of `reader`, b'' at the end of the stream, or None for a line longer than the limit of the reader,
+        which is skipped
+        """
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b'\n')
+                return None
+            except asyncio.IncompleteReadError:
+                return None
+            except asyncio.LimitOverrunError as e:
+                consumed = e.consumed
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await self.read_request(reader)
+                if not line and line is not None:
+                    break
+                self.requests += 1
+                request = {}
+                try:
+                    if line is None:
+                        raise ValueError("Request line is too long")
+                    request = json.loads(line)
+                    response = await self.dispatch(request)
+                except KeyError as e:
+                    response = {'error': f"Missing or unknown {e}"}
+                except Exception as e:
+                    # a failed request must not close the connection of the other requests
+                    response = {'error': str(e) or type(e).__name__}
+                if isinstance(request, dict) and 'id' in request:
+                    response['id'] = request['id']
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def evict_idle_sessions(self):
+        while True:
+            await asyncio.sleep(self.store.idle_timeout / 2)
+            self.store.evict_idle()
+
+    async def start(self, host='127.0.0.1', port=8765, path=None):
+        """
+        Listen on a Unix socket at `path`, or on TCP `host`:`port`
+
+        :return: asyncio.Server
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        self._eviction = asyncio.ensure_future(self.evict_idle_sessions())
+        return server
+
+    def stop(self):
+        if self._eviction is not None:
+            self._eviction.cancel()
+            self._eviction = None
+
+    async def serve_forever(self, host='127.0.0.1', port=8765, path=None):
+        server = await self.start(host, port, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Wordle solver JSON-lines server")
+    parser.add_argument('-d', '--dictionary', default='data/words_dictionary.json')
+    parser.add_argument('-n', '--number-of-letters', type=int, default=5)
+    parser.add_argument('-g', '--max-guesses', type=int, default=6)
+    parser.add_argument('-s', '--strategy', choices=ranking.STRATEGIES, default=ranking.SCORE)
+    parser.add_argument('--patterns-dir', help="directory of the pattern matrix, see patterns.py")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="path of a Unix socket to listen on instead of TCP")
+    parser.add_argument('--idle-timeout', type=float, default=600)
+    parser.add_argument('--snapshot', help="start from this snapshot of the solver and sessions if it exists, "
+                                           "and write it on exit, see snapshot.py")
+    args = parser.parse_args()
+
+    sessions = {}
+    if args.snapshot and os.path.exists(args.snapshot):
+        s, sessions = snapshot.load(args.snapshot, verbose=True)
+    else:
+        s = Solver(args.dictionary, args.number_of_letters, args.max_guesses)
+        if args.patterns_dir:
+            s.load_patterns(args.patterns_dir)
+    server = SolverServer(s, args.idle_timeout, strategy=args.strategy)
+    server.store.restore(sessions)
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port, args.unix))
+    finally:
+        if args.snapshot:
+            snapshot.save(args.snapshot, s, server.store.sessions())
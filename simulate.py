@@ -0,0 +1,151 @@
+import multiprocessing
+import random
+import time
+from collections import Counter
+import numpy as np
+import ranking
+from worker import init_worker
+
+
+def play_game(solver, target, strategy=ranking.SCORE, first_guess=None):
+    """
+    Play the solver top suggestion against `target` until it is found or the guesses run out
+
+    :param solver: Solver
+    :param target: str
+    :param strategy: ranking strategy of the suggestions
+    :param first_guess: str, the same for every game so it can be computed once
+    :return: (number of guesses or None if the game is lost, latency in seconds of each turn computing a suggestion)
+    """
+    session = solver.new_session()
+    latencies = []
+    guess = first_guess
+    for guess_number in range(1, solver.max_guesses + 1):
+        if guess is None:
+            start = time.perf_counter()
+            suggestions = session.suggestions(1, strategy)
+            latencies.append(time.perf_counter() - start)
+            if not suggestions:
+                break
+            guess = max(suggestions)[1]
+
+        if guess == target:
+            return guess_number, latencies
+        session.update(guess, solver.hotness(guess, target))
+        guess = None
+
+    return None, latencies
+
+
+def check_answers(solver, answers):
+    """
+    Raise before any game is played if some answers are not words of the dictionary, `Solver.hotness` would fail
+    on them in the middle of the games, possibly in a worker process
+    """
+    invalid = [answer for answer in answers if not solver.is_valid_word(answer)]
+    if invalid:
+        raise Exception(f"{len(invalid)} answers are not {solver.number_of_letters}-letter words of the dictionary: "
+                        f"{', '.join(invalid[:10])}{', ...' if len(invalid) > 10 else ''}")
+
+
+def first_guess(solver, strategy=ranking.SCORE):
+    return max(solver.new_session().suggestions(1, strategy))[1]
+
+
+class SimulationReport:
+
+    def __init__(self, results, elapsed, max_guesses):
+        """
+        Summary of simulated games
+
+        :param results: list of (target, number of guesses or None, latencies) of each game
+        :param elapsed: wall time of the simulation in seconds
+        :param max_guesses: int
+        """
+        self.games = len(results)
+        self.elapsed = elapsed
+        self.max_guesses = max_guesses
+        self.distribution = Counter(guesses for _, guesses, _ in results if guesses is not None)
+        self.failed = sorted(target for target, guesses, _ in results if guesses is None)
+        latencies = np.array([latency for _, _, game_latencies in results for latency in game_latencies])
+        self.latency_percentiles = {p: float(np.percentile(latencies, p)) if len(latencies) else 0.0 for p in (50, 90, 99, 100)}
+
+    @property
+    def failure_rate(self):
+        return len(self.failed) / self.games if self.games else 0.0
+
+    @property
+    def mean_guesses(self):
+        solved = sum(self.distribution.values())
+        return sum(g * n for g, n in self.distribution.items()) / solved if solved else 0.0
+
+    @property
+    def games_per_second(self):
+        return self.games / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'games': self.games,
+            'distribution': {g: self.distribution[g] for g in range(1, self.max_guesses + 1)},
+            'failures': len(self.failed),
+            'failure_rate': self.failure_rate,
+            'mean_guesses': self.mean_guesses,
+            'latency_ms': {f"p{p}": v * 1000 for p, v in self.latency_percentiles.items()},
+            'elapsed': self.elapsed,
+            'games_per_second': self.games_per_second,
+        }
+
+    def __str__(self):
+        res = f"Games: {self.games}, solved in {self.mean_guesses:.3f} guesses on average, " \
+              f"failure rate {self.failure_rate:.2%}\n"
+        res += '\n'.join(f"{g}: {self.distribution[g]}" for g in range(1, self.max_guesses + 1))
+        res += "\nTurn latency (ms): " + ', '.join(f"p{p} {v * 1000:.3f}" for p, v in self.latency_percentiles.items())
+        res += f"\nThroughput: {self.games_per_second:.1f} games/s ({self.elapsed:.2f}s)"
+        return res
+
+
+_worker = {}
+
+
+def _init_worker(solver_args, solver_kwargs, strategy, patterns_dir):
+    solver = init_worker(_worker, solver_args, solver_kwargs, patterns_dir, strategy=strategy)
+    _worker['first_guess'] = first_guess(solver, strategy)
+
+
+def _play_worker(target):
+    guesses, latencies = play_game(_worker['solver'], target, _worker['strategy'], _worker['first_guess'])
+    return target, guesses, latencies
+
+
+def simulate(words_list_path, number_of_letters=5, max_guesses=6, answers=None, strategy=ranking.SCORE,
+             processes=1, seed=None, sample=None, patterns_dir=None, hotness_weights=None):
+    """
+    Play the solver own top suggestion against every answer
+
+    :param answers: list of answers, default to every word of the dictionary, each must be a word of the dictionary
+    :param processes: number of worker processes, each loading its own Solver
+    :param seed: seed of the answers sampling
+    :param sample: number of answers to sample, None for all answers
+    :param patterns_dir: directory of the pattern matrix to load in each worker, see `Solver.load_patterns`
+    :return: SimulationReport
+    :raise: Exception before any game is played if some answers are not words of the dictionary
+    """
+    solver_args = (words_list_path, number_of_letters, max_guesses)
+    solver_kwargs = {'hotness_weights': hotness_weights}
+    start = time.perf_counter()
+    _init_worker(solver_args, solver_kwargs, strategy, patterns_dir)
+    if answers is None:
+        answers = list(_worker['solver'].words)
+    check_answers(_worker['solver'], answers)
+    if sample is not None:
+        answers = random.Random(seed).sample(answers, min(sample, len(answers)))
+
+    if processes == 1:
+        results = [_play_worker(target) for target in answers]
+    else:
+        chunksize = max(1, len(answers) // (processes * 16))
+        with multiprocessing.Pool(processes, initializer=_init_worker,
+                                  initargs=(solver_args, solver_kwargs, strategy, patterns_dir)) as pool:
+            results = list(pool.imap(_play_worker, answers, chunksize))
+
+    return SimulationReport(results, time.perf_counter() - start, max_guesses)
@@ -0,0 +1,195 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+import numpy as np
+import patterns
+from solver import Solver, GameSession, LettersHotness
+from trie import Trie
+from word_index import WordIndex
+
+
+# bump when the layout of snapshots changes
+VERSION = 1
+MAGIC = b'WRDLSNAP'
+# arrays start at offsets multiple of ALIGNMENT
+ALIGNMENT = 64
+
+
+def _encode_frozen(frozen):
+    correct, misplaced, wrong, freq = frozen
+    return [correct.hex(), misplaced.hex(), wrong, freq.hex()]
+
+
+def _decode_frozen(encoded):
+    correct, misplaced, wrong, freq = encoded
+    return bytes.fromhex(correct), bytes.fromhex(misplaced), wrong, bytes.fromhex(freq)
+
+
+def save(path, solver, sessions=None):
+    """
+    Write the dictionary tables, the indexes, the cached suggestions of `solver` and game `sessions` to `path`,
+    without pickle: MAGIC, the size of a JSON header as 8 little endian bytes, the header, then the raw arrays it
+    describes, each aligned to ALIGNMENT bytes so that `load` maps them without copying.
+    The file is written to a temporary path and renamed, processes mapping a previous snapshot keep reading it.
+
+    :param solver: Solver
+    :param sessions: {session id: GameSession} of `solver`
+    :return: path
+    """
+    sessions = sessions or {}
+    arrays = {
+        'words': np.frombuffer(''.join(solver.words).encode('ascii'), dtype=np.uint8),
+        'words_matrix': solver.words_matrix,
+        'words_letters': solver.words_letters,
+    }
+    arrays['letter_position'], arrays['letter_count'] = solver.index.to_arrays()
+    if solver.trie is not None:
+        arrays['trie_child_start'] = np.frombuffer(solver.trie.child_start, dtype=np.uint32)
+        arrays['trie_child_letters'] = np.frombuffer(solver.trie.child_letters, dtype=np.uint8)
+        arrays['trie_word_index'] = np.frombuffer(solver.trie.word_index, dtype=np.int32)
+
+    session_entries = []
+    start = 0
+    for session_id, session in sessions.items():
+        session_entries.append({'id': session_id, 'letters_hotness': _encode_frozen(session.letters_hotness.freeze()),
+                                'guesses': session.guesses, 'candidates': [start, start + len(session)]})
+        start += len(session)
+    arrays['candidates'] = np.concatenate([np.zeros(0, dtype=np.int64)] +
+                                          [np.asarray(session.candidates, dtype=np.int64) for session in sessions.values()])
+
+    suggestions = []
+    for (frozen, strategy, num_suggestions, candidates_key), top_n in solver.suggestions_cache.items():
+        suggestions.append([_encode_frozen(frozen), strategy, num_suggestions,
+                            None if candidates_key is None else candidates_key.hex(), [list(s) for s in top_n]])
+
+    header = {
+        'version': VERSION,
+        'created': time.time(),
+        'words_list_path': solver.words_list_path,
+        'number_of_letters': solver.number_of_letters,
+        'max_guesses': solver.max_guesses,
+        'dictionary_key': patterns.dictionary_key(solver.words, solver.number_of_letters),
+        'hotness_weights': {'null' if k is None else str(k): v for k, v in solver.hotness_weights.items()},
+        'values': {w: v for w, v in solver.words_dict.items() if v != 1},
+        'cache_size': solver.suggestions_cache.maxsize,
+        'patterns_path': getattr(solver.patterns, 'filename', None),
+        'suggestions': suggestions,
+        'sessions': session_entries,
+        'arrays': {},
+    }
+    offset = 0
+    for name, a in arrays.items():
+        header['arrays'][name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset,
+                                  'fortran': bool(a.ndim > 1 and a.flags['F_CONTIGUOUS'] and not a.flags['C_CONTIGUOUS'])}
+        offset += -(-a.nbytes // ALIGNMENT) * ALIGNMENT
+
+    header_bytes = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes)
+        for name, a in arrays.items():
+            f.seek(data_start + header['arrays'][name]['offset'])
+            f.write(a.tobytes(order='F' if header['arrays'][name]['fortran'] else 'C'))
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_header(path):
+    """
+    :return: (JSON header, offset of the arrays)
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise Exception(f"{path} is not a solver snapshot")
+        size, = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(size))
+    if header.get('version') != VERSION:
+        raise Exception(f"Snapshot {path} has version {header.get('version')}, expected {VERSION}")
+    return header, -(-(len(MAGIC) + 8 + size) // ALIGNMENT) * ALIGNMENT
+
+
+def load(path, verbose=False, stats=False):
+    """
+    Solver and game sessions saved by `save`. The arrays are read-only views of a memory map of the snapshot,
+    shared by every process loading it; only the words, the bitsets of the index and the trie become Python objects.
+    The pattern matrix is mapped again when its file still exists.
+
+    :return: (Solver, {session id: GameSession})
+    """
+    header, data_start = read_header(path)
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def section(name):
+        spec = header['arrays'][name]
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        a = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + spec['offset'])
+        return a.reshape(spec['shape'], order='F' if spec['fortran'] else 'C')
+
+    number_of_letters = header['number_of_letters']
+    text = section('words').tobytes().decode('ascii')
+    words_dict = dict.fromkeys((text[i:i + number_of_letters] for i in range(0, len(text), number_of_letters)), 1)
+    words_dict.update(header['values'])
+    index = WordIndex.from_arrays(len(words_dict), section('letter_position'), section('letter_count'))
+    hotness_weights = {None if k == 'null' else int(k): v for k, v in header['hotness_weights'].items()}
+    tables = (words_dict, section('words_matrix'), section('words_letters'), index)
+    solver = Solver(header['words_list_path'], number_of_letters, max_guesses=header['max_guesses'],
+                    hotness_weights=hotness_weights, verbose=verbose, cache_size=header['cache_size'], stats=stats,
+                    tables=tables)
+
+    if 'trie_child_start' in header['arrays']:
+        solver.trie = Trie(array('I', section('trie_child_start').tobytes()), section('trie_child_letters').tobytes(),
+                           array('i', section('trie_word_index').tobytes()))
+    patterns_path = header['patterns_path']
+    if patterns_path is not None and os.path.exists(patterns_path):
+        solver.patterns = patterns.open_pattern_matrix(patterns_path, len(solver.words), number_of_letters)
+
+    for frozen, strategy, num_suggestions, candidates_key, top_n in header['suggestions']:
+        key = (_decode_frozen(frozen), strategy, num_suggestions,
+               None if candidates_key is None else bytes.fromhex(candidates_key))
+        solver.suggestions_cache.put(key, [tuple(s) for s in top_n])
+
+    candidates = section('candidates')
+    sessions = {}
+    for entry in header['sessions']:
+        session = GameSession(solver)
+        session.letters_hotness = LettersHotness.from_frozen(_decode_frozen(entry['letters_hotness']))
+        start, end = entry['candidates']
+        session.candidates = candidates[start:end]
+        session.valid = solver.candidate_indices(session.letters_hotness)
+        session.guesses = entry['guesses']
+        session.node = None
+        sessions[entry['id']] = session
+    return solver, sessions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a snapshot of a solver, warm started by snapshot.load")
+    parser.add_argument('output_path')
+    parser.add_argument('-d', '--dictionary', default='data/words_dictionary.json')
+    parser.add_argument('-n', '--number-of-letters', type=int, default=5)
+    parser.add_argument('-g', '--max-guesses', type=int, default=6)
+    parser.add_argument('--patterns-dir', help="directory of the pattern matrix, see patterns.py")
+    parser.add_argument('--weights', help="hotness weights tuned by tune.py")
+    parser.add_argument('--trie', action='store_true', help="include the trie of the dictionary, see trie.py")
+    args = parser.parse_args()
+
+    s = Solver(args.dictionary, args.number_of_letters, args.max_guesses, args.weights, verbose=False)
+    if args.patterns_dir:
+        s.load_patterns(args.patterns_dir)
+    if args.trie:
+        s.load_trie()
+    # the first suggestions of every game are the same, they are worth caching
+    s.new_session().suggestions(10)
+    save(args.output_path, s)
+    start = time.perf_counter()
+    load(args.output_path)
+    print(f"Snapshot of {len(s.words)} words written to {args.output_path}, "
+          f"loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -1,30 +1,141 @@
+import hashlib
+import heapq
 import json
+import os
 import random
-from util import dict2arr, arr2dict, a2i, i2a
+import threading
+from array import array
+import numpy as np
+import patterns
+import ranking
+import word_cache
+from lru_cache import LRUCache
+from stats import Stats, timer
+from word_index import WordIndex
+from util import arr2dict, a2i, i2a, words2matrix, letters_presence, hotness_kernel
 from enum import Enum
-from collections import Counter, defaultdict
+from types import MappingProxyType
+from collections import defaultdict
 
 
 class Solver:
 
-    def __init__(self, words_list_path, number_of_letters=5, max_guesses=6, hotness_weights=None):
+    def __init__(self, words_list_path, number_of_letters=5, max_guesses=6, hotness_weights=None, verbose=True,
+                 cache_size=1024, stats=False, tables=None):
+        """
+        :param tables: (words_dict, words_matrix, words_letters, index) of the dictionary, loaded from a snapshot
+            instead of `words_list_path`, see `snapshot.load`
+        """
         self.words_list_path = words_list_path
+        assert number_of_letters <= LettersHotness.max_letters, f"Words of more than {LettersHotness.max_letters} letters are not supported"
         self.number_of_letters = number_of_letters
-        all_words_dict = self.load_words(words_list_path)
-        self.words_dict = {w: k for w, k in all_words_dict.items() if len(w) == self.number_of_letters}
+        # counters and timers of the hot paths, see `stats.Stats`
+        self.stats = Stats() if stats else None
+        with timer(self.stats, 'load_dictionary'):
+            if tables is not None:
+                self.words_dict, self.words_matrix, self.words_letters, self.index = tables
+                self.words = list(self.words_dict)
+            else:
+                self.words_dict = self.load_words(words_list_path)
+                self.words = list(self.words_dict)
+                self.words_matrix = words2matrix(self.words, self.number_of_letters)
+                self.words_letters = letters_presence(self.words_matrix)
+                self.index = WordIndex(self.words_matrix)
+            self.word_indices = {w: i for i, w in enumerate(self.words)}
+        self.patterns = None
+        self._ranker = None
+        # the ranker is started lazily, possibly by a prefetch thread and the game at once
+        self._ranker_lock = threading.Lock()
+        self.suggestions_cache = LRUCache(cache_size)
+        # limits of the ranking.APPROXIMATE backend
+        self.budget = ranking.Budget()
+        self.strategy_tree = None
+        self.trie = None
+        # letters of each word scored once, see `_batch_scores`
+        self._distinct_letters = None
         self.max_guesses = max_guesses
         if hotness_weights is None:
-            self.hotness_weights = {}
-            self.hotness_weights.update({i: 5 for i in range(1, self.number_of_letters+1)})
-            self.hotness_weights.update({-i: 1 for i in range(1, self.number_of_letters+1)})
-            self.hotness_weights.update({HotnessType.WRONG.value: float('-inf'), None: 0})
+            hotness_weights = {}
+            hotness_weights.update({i: 5 for i in range(1, self.number_of_letters+1)})
+            hotness_weights.update({-i: 1 for i in range(1, self.number_of_letters+1)})
+            hotness_weights.update({HotnessType.WRONG.value: float('-inf'), None: 0})
+            self.hotness_weights = hotness_weights
+        elif isinstance(hotness_weights, str):
+            self.load_hotness_weights(hotness_weights)
         else:
             self.hotness_weights = hotness_weights
 
-        print(f"Dictionary size: {len(self.words_dict)}")
+        if verbose:
+            print(f"Dictionary size: {len(self.words_dict)}")
 
     def load_words(self, file_path):
-        return json.load(open(file_path))
+        """
+        Words of `number_of_letters` letters of a dictionary, read from its binary cache, see `word_cache`
+
+        :param file_path: JSON object of {word: value}
+        :return: {word: value}
+        """
+        records, values = word_cache.load(file_path, self.number_of_letters)
+        buffer = records.tobytes().decode('ascii')
+        words_dict = dict.fromkeys((buffer[i:i + self.number_of_letters] for i in range(0, len(buffer), self.number_of_letters)), 1)
+        words_dict.update(values)
+        return words_dict
+
+    def load_patterns(self, directory='data', build=False):
+        """
+        Memory map the pattern matrix of the dictionary from `directory`, see `patterns.build_pattern_matrix`.
+        Once loaded, `hotness` and `patterns_for` are table reads.
+
+        :param directory: str
+        :param build: build the matrix if it does not exist for the current dictionary
+        :return: True if the pattern matrix is loaded
+        """
+        path = patterns.pattern_matrix_path(directory, self.words, self.number_of_letters)
+        if not os.path.exists(path):
+            if not build:
+                return False
+            os.makedirs(directory, exist_ok=True)
+            patterns.build_pattern_matrix(self, path)
+
+        self.patterns = patterns.open_pattern_matrix(path, len(self.words), self.number_of_letters)
+        return True
+
+    def load_strategy_tree(self, path, strategy=None):
+        """
+        Load a solving tree built by `strategy_tree.py`, new sessions then follow it as long as the game stays in the tree
+        and the suggestions are asked with the strategy of the tree
+
+        :param strategy: raise if the tree was built with another strategy, None to accept any strategy
+        """
+        from strategy_tree import StrategyTree
+        self.strategy_tree = StrategyTree.load(path, self, strategy)
+
+    def load_trie(self):
+        """
+        Build the trie of the dictionary, `is_valid_word` then looks words up in it, see `trie.Trie`
+        """
+        from trie import Trie
+        self.trie = Trie.from_words(self.words)
+
+    @property
+    def hotness_weights(self):
+        """
+        Read-only {hotness: weight} of `score_word`. Setting new weights drops the suggestions cached with the
+        previous ones, the weights are not part of the cache key.
+        """
+        return self._hotness_weights
+
+    @hotness_weights.setter
+    def hotness_weights(self, hotness_weights):
+        self._hotness_weights = MappingProxyType(dict(hotness_weights))
+        self.suggestions_cache.clear()
+
+    def load_hotness_weights(self, path):
+        """
+        Load hotness weights tuned by `tune.py`
+        """
+        from tune import load_weights
+        self.hotness_weights = load_weights(path, self.number_of_letters)
 
     def random_word(self, words_dict=None):
         if not words_dict:
@@ -33,6 +144,8 @@ class Solver:
         return random.choice(list(words_dict.keys()))
 
     def is_valid_word(self, word, words_dict=None):
+        if not words_dict and self.trie is not None:
+            return word in self.trie
         if not words_dict:
             words_dict = self.words_dict
 
@@ -46,14 +159,11 @@ class Solver:
         :param letters_hotness: LettersHotness
         :return: list of words given the hints
         """
-        return {w: v for w, v in self.words_dict.items() if self.is_valid_by_hotness(w, letters_hotness)}
+        words = (self.words[i] for i in self.candidate_indices(letters_hotness))
+        return {w: self.words_dict[w] for w in words}
 
     def is_valid_by_hotness(self, word, letters_hotness):
-        for letter in word:
-            hv = letters_hotness.get(letter)
-            if hv and hv[0] == 0:
-                return False
-        return True
+        return letters_hotness.constraints(self.number_of_letters).is_valid(word)
 
     def hotness(self, word, target):
         """
@@ -75,6 +185,10 @@ class Solver:
         assert self.is_valid_word(word), f"{word} is not valid"
         assert self.is_valid_word(target), f"{target} is not valid"
 
+        if self.patterns is not None:
+            pattern = self.patterns[self.word_indices[word], self.word_indices[target]]
+            return WordHotness.from_pattern(word, pattern)
+
         res = []
         target_letters = set(list(target))
         for i in range(len(word)):
@@ -89,69 +203,489 @@ class Solver:
         h.update_word(word, res)
         return h
 
+    def hotness_array(self, word, indices=None):
+        """
+        Vectorized version of `hotness`: the hotness of a word relative to every word of the dictionary,
+        or to the words at `indices`. Values use the same encoding as `hotness`.
+
+        :param word: str
+        :param indices: array of indices into `self.words`, None for all words
+        :return: np.ndarray of shape (len(indices), number_of_letters)
+        """
+        if len(word) != self.number_of_letters:
+            raise Exception(f"Input word {word} is not a {self.number_of_letters}-letter word")
+
+        assert self.is_valid_word(word), f"{word} is not valid"
+
+        targets = self.words_matrix.T
+        targets_letters = self.words_letters
+        if indices is not None:
+            targets = targets[:, indices]
+            targets_letters = targets_letters[:, indices]
+
+        letters = np.array([a2i(c) for c in word], dtype=np.uint8)
+        return hotness_kernel(letters, targets, targets_letters)
+
+    def patterns_for(self, word, indices=None):
+        """
+        Pattern ids (see `patterns.encode`) of a word relative to every word of the dictionary, or to the words at `indices`
+
+        :param word: str
+        :param indices: array of indices into `self.words`, None for all words
+        :return: np.ndarray
+        """
+        if self.patterns is None:
+            return patterns.encode_array(self.hotness_array(word, indices))
+
+        assert self.is_valid_word(word), f"{word} is not valid"
+        row = self.patterns[self.word_indices[word]]
+        return row if indices is None else row[indices]
+
     def score_word(self, word, letters_hotness):
-        score = 0
-        wrong_letter_score = self.hotness_weights[HotnessType.WRONG.value]
-
-        # check letter frequency
-        word_letter_freq = Counter(word)
-        for letter, freq in word_letter_freq.items():
-            if letters_hotness.freq[a2i(letter)] is not None and freq < letters_hotness.freq[a2i(letter)]:
-                score += wrong_letter_score
-                break
-        for i, freq in enumerate(letters_hotness.freq):
-            letter = i2a(i)
-            if freq is not None and (word_letter_freq[letter] < freq or freq == 0 and word_letter_freq[letter] > 0):
-                score += wrong_letter_score
-                break
+        constraints = letters_hotness.constraints(self.number_of_letters)
+        if not constraints.is_valid(word):
+            return self.hotness_weights[HotnessType.WRONG.value]
 
+        hotness, freq = letters_hotness.hotness, letters_hotness.freq
         word_score = defaultdict(int)
         for letter in set(word):
             idx = a2i(letter)
-            for h in letters_hotness.hotness[idx]:
-                if h == 0:
-                    word_score[letter] = wrong_letter_score
-                    break
-                elif h > 0:
-                    if word[h-1] == letter:
-                        word_score[letter] = max(word_score[letter], self.hotness_weights[h])
-                    else:
-                        word_score[letter] = wrong_letter_score
-                        break
+            only_position = constraints.only_position[idx]
+            for h in hotness[idx]:
+                if h < 0 and only_position is not None and word[only_position - 1] == letter:
+                    # the letter is at the only position not excluded by its negative hotness
+                    word_score[letter] = max(word_score[letter], self.hotness_weights[only_position - 1])
                 else:
-                    if letter == word[-h-1]:
-                        word_score[letter] = wrong_letter_score
-                        break
-                    else:
-                        possible_positions = [j for j in range(1, self.number_of_letters + 1) if -j not in letters_hotness.hotness[idx]]
-                        if len(possible_positions) == 1 and word[possible_positions[0] - 1] == letter:
-                            word_score[letter] = max(word_score[letter], self.hotness_weights[possible_positions[0] - 1])
-                        else:
-                            word_score[letter] = max(word_score[letter], self.hotness_weights[h])
+                    word_score[letter] = max(word_score[letter], self.hotness_weights[h])
 
-        score += sum([score * letters_hotness.freq[a2i(letter)] for letter, score in word_score.items() if letters_hotness.freq[a2i(letter)] > 0])
+        score = sum([score * freq[a2i(letter)] for letter, score in word_score.items() if freq[a2i(letter)]])
 
         return score
 
-    def suggestions(self, letters_hotness, num_suggestions=5):
+    def candidate_indices(self, letters_hotness):
+        """
+        Indices of the words valid given a hotness array, in dictionary order
+        """
+        with timer(self.stats, 'filter_candidates'):
+            return self.index.indices(self.index.filter(letters_hotness.constraints(self.number_of_letters)))
+
+    def refilter(self, indices, delta, letters_hotness):
+        """
+        Indices of the words valid after an update of `letters_hotness`, from the indices valid before it.
+        Only the constraints tightened by the update are checked, on the words still valid.
+
+        :param indices: np.ndarray of the indices valid before the update, in dictionary order
+        :param delta: HotnessDelta filled by the update
+        :param letters_hotness: LettersHotness after the update, compiled from scratch when the update loosened it
+        :return: np.ndarray of indices
+        """
+        if delta.loosened:
+            return self.candidate_indices(letters_hotness)
+        with timer(self.stats, 'filter_candidates'):
+            if delta.excluded:
+                letters = [idx for idx in range(26) if delta.excluded >> idx & 1]
+                indices = indices[~self.words_letters[np.ix_(letters, indices)].any(axis=0)]
+            letters = delta.letters
+            while letters:
+                idx = (letters & -letters).bit_length() - 1
+                letters &= letters - 1
+                fixed, forbidden, count = delta.fixed[idx], delta.forbidden[idx], delta.min_count[idx]
+                while fixed:
+                    position = (fixed & -fixed).bit_length() - 1
+                    indices = indices[self.words_matrix[indices, position] == idx]
+                    fixed &= fixed - 1
+                while forbidden:
+                    position = (forbidden & -forbidden).bit_length() - 1
+                    indices = indices[self.words_matrix[indices, position] != idx]
+                    forbidden &= forbidden - 1
+                if count:
+                    indices = indices[(self.words_matrix[indices] == idx).sum(axis=1) >= count]
+            return indices
+
+    def count_valid_words(self, letters_hotness):
+        with timer(self.stats, 'filter_candidates'):
+            return self.index.count(letters_hotness.constraints(self.number_of_letters))
+
+    def suggestions(self, letters_hotness, num_suggestions=5, candidates=None, strategy=ranking.SCORE,
+                    backend=ranking.SERIAL, processes=None, valid=None):
         """
         Given a word hotness array, what's the next best guess to make
         :param letters_hotness: LetterHotness
+        :param candidates: indices of the words to rank, None for the whole dictionary
+        :param strategy: ranking.SCORE to rank candidates by `score_word`,
+            ranking.ENTROPY or ranking.EXPECTED_SIZE to rank every word by how it partitions the candidates
+        :param backend: ranking.SERIAL, ranking.PROCESS to compute partitions in a pool of `processes` workers,
+            or ranking.APPROXIMATE to estimate them within `budget`. The error bounds of the estimated scores are
+            dropped, use `approximate_suggestions` to get them
+        :param valid: indices of the words valid given `letters_hotness` when already known, see `GameSession.valid`
         :return: List[str]
         """
-        import heapq
-        top_n = []
-        for word in self.words_dict:
+        key = self._cache_key(letters_hotness, strategy, num_suggestions, candidates, backend)
+        top_n = self.suggestions_cache.get(key)
+        if self.stats is not None:
+            self.stats.add('suggestions_cache_hits' if top_n is not None else 'suggestions_cache_misses')
+        if top_n is None:
+            if strategy == ranking.SCORE:
+                top_n = self.score_suggestions(letters_hotness, num_suggestions, candidates, valid)
+            else:
+                top_n = self.partition_suggestions(letters_hotness, num_suggestions, candidates, strategy, backend, processes)
+            self.suggestions_cache.put(key, top_n)
+
+        return list(top_n)
+
+    def _cache_key(self, letters_hotness, strategy, num_suggestions, candidates, backend=ranking.SERIAL):
+        """
+        Key of `suggestions_cache`: (frozen hotness, strategy, num_suggestions, digest of the candidates or None)
+        """
+        # a digest rather than hash(), which is salted per process, so that cache entries can be saved, see `snapshot`
+        candidates_key = None if candidates is None else \
+            hashlib.blake2b(np.asarray(candidates, dtype=np.int64).tobytes(), digest_size=16).digest()
+        # estimated rankings are cached apart from exact ones, and apart from the estimates of other budgets
+        cached_strategy = strategy
+        if backend == ranking.APPROXIMATE and strategy != ranking.SCORE:
+            budget = self.budget
+            cached_strategy = f"{strategy}/{backend}/{budget.seconds}/{budget.memory}/{budget.sample_size}/{budget.seed}"
+        return letters_hotness.freeze(), cached_strategy, num_suggestions, candidates_key
+
+    def score_suggestions(self, letters_hotness, num_suggestions=5, candidates=None, valid=None):
+        """
+        Same heap as `ranking.top_n` of the `score_word` of every word, or of the words at `candidates`.
+        Words invalid given the hotness are dropped before scoring, and a word is only scored when its
+        `score_bounds` can beat the heap minimum. When the valid words do not fill the heap with scores above invalid
+        words, the invalid words, all scoring the WRONG weight, take part in the ties without being scored.
+        """
+        with timer(self.stats, 'score_suggestions'):
+            return self._pruned_score_suggestions(letters_hotness, num_suggestions, candidates, valid)
+
+    def _pruned_score_suggestions(self, letters_hotness, num_suggestions, candidates, valid_indices=None):
+        if num_suggestions <= 0:
+            return []
+        valid = np.zeros(len(self.words), dtype=bool)
+        valid[self.candidate_indices(letters_hotness) if valid_indices is None else valid_indices] = True
+        if candidates is None:
+            indices = np.flatnonzero(valid)
+        else:
+            candidates = np.asarray(candidates, dtype=np.int64)
+            indices = candidates[valid[candidates]]
+        bounds = self.score_bounds(letters_hotness, indices)
+
+        res = []
+        calls = replaces = 0
+        words = self.words
+        for i, bound in zip(indices.tolist(), bounds.tolist()):
+            if len(res) == num_suggestions and bound <= res[0][0]:
+                continue
+            word = words[i]
             score = self.score_word(word, letters_hotness)
-            if len(top_n) < num_suggestions:
-                heapq.heappush(top_n, (score, word))
-            elif top_n[0][0] < score:
-                heapq.heappop(top_n)
-                heapq.heappush(top_n, (score, word))
+            calls += 1
+            if len(res) < num_suggestions:
+                heapq.heappush(res, (score, word))
+            elif res[0][0] < score:
+                heapq.heapreplace(res, (score, word))
+                replaces += 1
+
+        if self.stats is not None:
+            self.stats.add('score_word', calls)
+            self.stats.add('score_word_pruned', len(indices) - calls)
+            self.stats.add('heap_push', len(res))
+            self.stats.add('heap_replace', replaces)
+        wrong = self.hotness_weights[HotnessType.WRONG.value]
+        if len(res) == num_suggestions and res[0][0] > wrong:
+            return res
+
+        # the invalid words tie at the WRONG weight, ranked like `ranking.top_n` over every word from their scores
+        if len(res) < num_suggestions:
+            # every valid word was scored and kept
+            valid_scores = {word: score for score, word in res}
+        else:
+            # valid words scoring no more than invalid ones, seldom but for tuned weights, the pruned ones are scored too
+            valid_scores = {words[i]: self.score_word(words[i], letters_hotness) for i in indices.tolist()}
+            if self.stats is not None:
+                self.stats.add('score_word', len(indices))
+        ranked = np.arange(len(words)) if candidates is None else candidates
+        scores = np.full(len(ranked), wrong, dtype=np.float64)
+        is_valid = valid[ranked]
+        scores[is_valid] = [valid_scores[words[i]] for i in ranked[is_valid].tolist()]
+        # the scores as `score_word` returns them rather than as floats
+        return [(valid_scores.get(word, wrong), word)
+                for _, word in ranking.top_n_from_scores(words, ranked, scores, num_suggestions)]
+
+    def score_bounds(self, letters_hotness, indices=None):
+        """
+        Upper bounds of `score_word` over every word of the dictionary, or over the words at `indices`:
+        the sum of the best score each letter of a word can get, whatever its position
+
+        :param letters_hotness: LettersHotness
+        :param indices: array of indices into `self.words`, None for all words
+        :return: np.ndarray of bounds
+        """
+        constraints = letters_hotness.constraints(self.number_of_letters)
+        letter_bounds = np.zeros(26)
+        integral = True
+        for idx, (hv, freq) in enumerate(zip(letters_hotness.hotness, letters_hotness.freq)):
+            if not hv or not freq:
+                continue
+            only_position = constraints.only_position[idx]
+            values = [self.hotness_weights[h] for h in hv]
+            if only_position is not None and any(h < 0 for h in hv):
+                values.append(self.hotness_weights[only_position - 1])
+            letter_bounds[idx] = max([0] + values) * freq
+            integral &= float(letter_bounds[idx]).is_integer()
+
+        words_letters = self.words_letters if indices is None else self.words_letters[:, indices]
+        bounds = letter_bounds @ words_letters
+        if not integral:
+            # the scores of non integral weights are summed in another order, whose rounding the bounds must cover
+            bounds += 1e-9 * (1 + np.abs(bounds))
+        return bounds
+
+    def score_words(self, letters_hotness, indices=None):
+        """
+        Vectorized version of `score_word` over every word of the dictionary, or over the words at `indices`
+
+        :param letters_hotness: LettersHotness
+        :param indices: array of indices into `self.words`, None for all words
+        :return: np.ndarray of scores
+        """
+        with timer(self.stats, 'score_words'):
+            return self._score_words(letters_hotness, indices)
+
+    def _score_words(self, letters_hotness, indices):
+        constraints = letters_hotness.constraints(self.number_of_letters)
+        matrix = self.words_matrix if indices is None else self.words_matrix[indices]
+        words_letters = self.words_letters if indices is None else self.words_letters[:, indices]
+
+        valid = np.ones(len(matrix), dtype=bool)
+        for position, mask in enumerate(constraints.positions):
+            if mask != constraints.all_letters:
+                allowed = np.array([mask >> idx & 1 for idx in range(26)], dtype=bool)
+                valid &= allowed[matrix[:, position]]
+        for letter, count in constraints.required:
+            valid &= (matrix == a2i(letter)).sum(axis=1) >= count
+
+        scores = np.zeros(len(matrix))
+        for idx, (hv, freq) in enumerate(zip(letters_hotness.hotness, letters_hotness.freq)):
+            if not hv or not freq:
+                continue
+            # see score_word, the score of a letter is the best of its hotness, at least 0
+            value = max([0] + [self.hotness_weights[h] for h in hv])
+            only_position = constraints.only_position[idx]
+            present = words_letters[idx] == 1
+            if only_position is not None and any(h < 0 for h in hv):
+                value_at_only_position = max([0, self.hotness_weights[only_position - 1]] + [self.hotness_weights[h] for h in hv if h > 0])
+                at_only_position = matrix[:, only_position - 1] == idx
+                scores[present & at_only_position] += value_at_only_position * freq
+                present &= ~at_only_position
+            scores[present] += value * freq
+
+        scores[~valid] = self.hotness_weights[HotnessType.WRONG.value]
+        return scores
+
+    def batch_suggestions(self, histories, num_suggestions=5):
+        """
+        Suggestions of many games at once, the same as `suggestions` of the candidates of a session playing each game,
+        see `GameSession.suggestions`. The candidates of a game are filtered on the bitsets of `index` by the pattern
+        of each guess, and the candidates of the distinct states of every game are scored together, see `_batch_scores`.
+
+        :param histories: list of games, each a list of (word, hotness) where hotness is a WordHotness,
+            a list like [-1, 2, 0, ...] or a string like ??x11
+        :param num_suggestions: int
+        :return: list of the suggestions of each game
+        """
+        states = {}
+        keys = []
+        for history in histories:
+            letters_hotness = LettersHotness()
+            bits = None
+            for word, hotness in history:
+                if isinstance(hotness, str):
+                    hotness = self.parse_hotness(word, hotness)
+                else:
+                    assert self.is_valid_word(word), f"{word} is not valid"
+                    if not isinstance(hotness, WordHotness):
+                        hotness = WordHotness(word, list(hotness))
+                with timer(self.stats, 'update_word'):
+                    letters_hotness.update_word(word, hotness)
+                    bits = self.index.pattern_filter(self.words_matrix[self.word_indices[word]].tolist(), hotness.pattern, bits)
+            key = (letters_hotness.freeze(), bits)
+            states.setdefault(key, letters_hotness)
+            keys.append(key)
+
+        results = {}
+        missed = []
+        for key, letters_hotness in states.items():
+            bits = key[1]
+            # before the first guess every word is a candidate, see `GameSession.suggestions`
+            candidates = None if bits is None else self.index.indices(bits)
+            cache_key = self._cache_key(letters_hotness, ranking.SCORE, num_suggestions, candidates)
+            top_n = self.suggestions_cache.get(cache_key)
+            if top_n is None:
+                missed.append((key, cache_key, letters_hotness, bits,
+                               np.arange(len(self.words)) if candidates is None else candidates))
+            results[key] = top_n
+
+        with timer(self.stats, 'score_words'):
+            scores = self._batch_scores([(letters_hotness, bits, candidates)
+                                         for _, _, letters_hotness, bits, candidates in missed])
+        for (key, cache_key, _, _, candidates), candidates_scores in zip(missed, scores):
+            top_n = ranking.top_n_from_scores(self.words, candidates, candidates_scores, num_suggestions)
+            self.suggestions_cache.put(cache_key, top_n)
+            results[key] = top_n
+
+        return [list(results[key]) for key in keys]
+
+    # maximum number of (state, candidate) pairs scored at once by `_batch_scores`
+    batch_pairs = 1 << 20
+
+    def _batch_scores(self, states):
+        """
+        Same scores as `score_word` of the candidates of many letters hotness. Each state is compiled to a table of
+        the score of each letter, away from or at the only position left to it, and the pairs of a state and one of
+        its candidates are scored by summing the table entries of the letters of the candidate, one gather for every
+        state. Words invalid given their state score the wrong hotness weight.
+
+        :param states: list of (LettersHotness, bitset of the candidates or None for every word, candidate indices)
+        :return: list of the np.ndarray of scores of the candidates of each state
+        """
+        res = []
+        start = 0
+        while start < len(states):
+            end, pairs = start, 0
+            while end < len(states) and (end == start or pairs + len(states[end][2]) <= self.batch_pairs):
+                pairs += len(states[end][2])
+                end += 1
+            res += self._batch_scores_chunk(states[start:end])
+            start = end
+        return res
+
+    def _batch_scores_chunk(self, states):
+        number_of_letters = self.number_of_letters
+        all_positions = (1 << number_of_letters) - 1
+        weights = self.hotness_weights
+        unknown_freq = LettersHotness.unknown_freq
+        if self._distinct_letters is None:
+            # letters of each word, the repetitions of a letter replaced by the column of a null score
+            distinct = self.words_matrix.astype(np.intp)
+            for i in range(number_of_letters):
+                for j in range(i):
+                    distinct[self.words_matrix[:, j] == self.words_matrix[:, i], i] = 52
+            self._distinct_letters = distinct
+
+        # columns: letter away from its only position, letter at its only position, repeated letter
+        table = np.zeros((len(states), 53))
+        only_position = np.full((len(states), 26), -1, dtype=np.int16)
+        invalid = []
+        for s, (letters_hotness, bits, candidates) in enumerate(states):
+            misplaced, freq = letters_hotness._misplaced, letters_hotness._freq
+            valid_bits = bits
+            for idx in range(26):
+                if freq[idx] == 0 or freq[idx] == unknown_freq:
+                    continue
+                hv = letters_hotness._values(idx)
+                table[s, idx] = max([0] + [weights[h] for h in hv]) * freq[idx]
+                # see Constraints.only_position
+                possible_positions = all_positions & ~misplaced[idx]
+                if misplaced[idx] and possible_positions and possible_positions & (possible_positions - 1) == 0:
+                    position = possible_positions.bit_length()
+                    table[s, 26 + idx] = max([0] + [weights[position - 1] if h < 0 else weights[h] for h in hv]) * freq[idx]
+                    only_position[s, idx] = position - 1
+                if bits is not None and not letters_hotness._wrong >> idx & 1:
+                    # words giving the pattern of every guess satisfy every constraint of the letters hotness but
+                    # the minimum counts, see `Constraints`: a letter repeated in a guess counts as many times
+                    valid_bits &= self.index.letter_count[idx][min(freq[idx], number_of_letters + 1)]
+            invalid.append(None if valid_bits == bits else ~self.index.mask(valid_bits)[candidates])
+
+        counts = [len(candidates) for _, _, candidates in states]
+        state = np.repeat(np.arange(len(states)), counts)
+        targets = np.concatenate([candidates for _, _, candidates in states])
+        columns = self._distinct_letters[targets]
+        at_only = (only_position >= 0).any(axis=1)[state]
+        if at_only.any():
+            rows = np.flatnonzero(at_only)
+            letters = self.words_matrix[targets[rows]]
+            for i in range(number_of_letters):
+                position = only_position[state[rows], letters[:, i]]
+                found = (position >= 0) & (letters[np.arange(len(rows)), np.maximum(position, 0)] == letters[:, i])
+                found &= columns[rows, i] != 52
+                columns[rows[found], i] += 26
+        scores = np.take(table, state[:, None] * table.shape[1] + columns).sum(axis=1)
+        res = np.split(scores, np.cumsum(counts)[:-1])
+        for state_scores, state_invalid in zip(res, invalid):
+            if state_invalid is not None:
+                state_scores[state_invalid] = weights[HotnessType.WRONG.value]
+        return res
+
+    def partition_suggestions(self, letters_hotness, num_suggestions=5, candidates=None, strategy=ranking.ENTROPY,
+                              backend=ranking.SERIAL, processes=None):
+        if strategy not in ranking.STRATEGIES:
+            raise Exception(f"Unknown ranking strategy {strategy}")
+        if candidates is None:
+            candidates = self.candidate_indices(letters_hotness)
+        if len(candidates) == 0:
+            return []
+
+        if backend == ranking.APPROXIMATE:
+            return self.approximate_suggestions(letters_hotness, num_suggestions, candidates, strategy)[0]
+
+        guesses = np.arange(len(self.words))
+        with timer(self.stats, 'partition_scores'):
+            if backend == ranking.SERIAL:
+                scores = ranking.rank(self.words_matrix, self.words_letters, self.patterns, guesses, candidates, strategy)
+            elif backend == ranking.PROCESS:
+                scores = self.ranker(processes).rank(guesses, candidates, strategy)
+            else:
+                raise Exception(f"Unknown ranking backend {backend}")
+
+        return ranking.top_suggestions(self.words, guesses, scores, candidates, num_suggestions)
 
-        return top_n
+    def approximate_suggestions(self, letters_hotness, num_suggestions=5, candidates=None, strategy=ranking.ENTROPY,
+                                budget=None):
+        """
+        Suggestions of the partition strategies estimated within a time and memory budget, see `ranking.approximate_rank`.
+        Only the guesses scored before the time ran out are ranked.
+
+        :param budget: ranking.Budget, default to `self.budget`
+        :return: (heap of (score, word), ranking.Estimate with the error bound of each score)
+        """
+        if strategy not in (ranking.ENTROPY, ranking.EXPECTED_SIZE):
+            raise Exception(f"Unknown partition strategy {strategy}")
+        if candidates is None:
+            candidates = self.candidate_indices(letters_hotness)
+        with timer(self.stats, 'partition_scores'):
+            estimate = ranking.approximate_rank(self.words_matrix, self.words_letters, self.patterns,
+                                                np.arange(len(self.words)), candidates, strategy, budget or self.budget)
+        if len(candidates) == 0:
+            return [], estimate
+        return ranking.top_suggestions(self.words, estimate.guesses, estimate.scores, candidates, num_suggestions), estimate
+
+    def ranker(self, processes=None):
+        """
+        Process pool of the ranking.PROCESS backend, started on first use and reused until `close`
+        """
+        with self._ranker_lock:
+            if self._ranker is None or (processes and self._ranker.processes != processes):
+                if self._ranker is not None:
+                    self._ranker.close()
+                self._ranker = ranking.ProcessRanker(self, processes)
+            return self._ranker
+
+    def close(self):
+        with self._ranker_lock:
+            if self._ranker is not None:
+                self._ranker.close()
+                self._ranker = None
+
+    def new_session(self):
+        return GameSession(self)
 
-    def play(self):
+    def new_multiboard_session(self, number_of_boards, max_guesses=None):
+        """
+        Session of `number_of_boards` boards played at once, see `multiboard.MultiBoardSession`
+        """
+        from multiboard import MultiBoardSession
+        return MultiBoardSession(self, number_of_boards, max_guesses)
+
+    def play(self, strategy=ranking.SCORE, prefetch=True, backend=ranking.SERIAL):
         # pick a random word
         # wait for input
         # if correct guess, finish game
@@ -160,69 +694,154 @@ class Solver:
         # calculate hotness of all letters from all attempts
         # display letter hotness
         # repeat from wait for input
+        from prefetch import Prefetcher
+
         target = self.random_word()
-        letters_hotness = LettersHotness()
-        for guess_number in range(1, self.max_guesses+1):
-            while True:
-                guess = input(f"Guess next word. Current hotness of letters: \n{letters_hotness}\nGuess {guess_number}: ")
-                if len(guess) != len(target):
-                    print(f"Guess needs to be a {self.number_of_letters}-letter word")
-                elif not self.is_valid_word(guess):
-                    print(f"Invalid word. Guess again.")
-                else:
-                    break
+        session = self.new_session()
+        suggestions = []
+        # while a guess is typed, the games after each word suggested are ranked in the background
+        with Prefetcher(self, 10, strategy, backend) as prefetcher:
+            for guess_number in range(1, self.max_guesses+1):
+                if prefetch:
+                    prefetcher.guesses(session, [word for _, word in suggestions], target)
+                while True:
+                    guess = input(f"Guess next word. Current hotness of letters: \n{session.letters_hotness}\nGuess {guess_number}: ")
+                    if len(guess) != len(target):
+                        print(f"Guess needs to be a {self.number_of_letters}-letter word")
+                    elif not self.is_valid_word(guess):
+                        print(f"Invalid word. Guess again.")
+                    else:
+                        break
 
-            if guess == target:
-                print(f'Your guess {target} is correct!')
-                return
-            else:
-                word_hotness = self.hotness(guess, target)
-                letters_hotness.update_word(guess, word_hotness)
-                print(f"Your guess is not correct but close. Here're some suggestions: "
-                      f"{', '.join([f'{word}({score})' for score, word in sorted(self.suggestions(letters_hotness, 10), reverse=True)])}, {self.score_word(target, letters_hotness)}")
-                print(word_hotness)
+                if guess == target:
+                    print(f'Your guess {target} is correct!')
+                    return
+                else:
+                    word_hotness = self.hotness(guess, target)
+                    session = prefetcher.update(session, guess, word_hotness)
+                    suggestions = sorted(session.suggestions(10, strategy, backend), reverse=True)
+                    print(f"Your guess is not correct but close. Here're some suggestions: "
+                          f"{', '.join([f'{word}({score})' for score, word in suggestions])}, {self.score_word(target, session.letters_hotness)}")
+                    print(word_hotness)
 
         print(f"Sorry, you ran out of guesses. The correct word is {target}")
         return
 
-    def suggest(self, num_suggestions=10):
+    def parse_hotness(self, word, hotness_input):
+        """
+        Parse a word hotness typed like ??x11: ? for a right letter at a wrong position, x for a wrong letter,
+        1 for a right letter at the right position
+
+        :param word: str
+        :param hotness_input: str
+        :return: WordHotness
+        """
+        input_to_hotness_map = {'?': -1, '1': 1, 'x': 0}
+        assert self.is_valid_word(word), f"{word} is an invalid word"
+        assert len(word) == len(hotness_input), "length of word and hotness must be the same"
+        assert all([x in input_to_hotness_map for x in hotness_input]), "some input value are incorrect"
+
+        return WordHotness(word, [input_to_hotness_map[x]*(i + 1) for i, x in enumerate(hotness_input)])
+
+    def suggest(self, num_suggestions=10, strategy=ranking.SCORE, prefetch=True, backend=ranking.SERIAL):
         # wait for word input
         # wait for hotness input
         # update letters hotness
         # print suggestions
         # repeat
+        from prefetch import Prefetcher
 
-        letters_hotness = LettersHotness()
-        input_to_hotness_map = {'?': -1, '1': 1, 'x': 0}
-        for i in range(1, self.max_guesses+1):
-            while True:
-                try:
-                    word = input(f"Type in guess {i}: ")
-                    assert self.is_valid_word(word), f"{word} is an invalid word"
-                    word_hotness_input = list(input(f"Type in word hotness like (ex: ??x11), ?(right but wrong pos), x (wrong char), 1 (right char right pos): "))
-                    arr = [input_to_hotness_map[x]*(i + 1) for i, x in enumerate(word_hotness_input)]
-
-                    assert len(word) == len(word_hotness_input), "length of word and hotness must be the same"
-                    assert all([-self.number_of_letters <= x <= self.number_of_letters for x in arr]), "some input value are incorrect"
-
-                    if all([x >= 1 for x in arr]):
-                        return
-                    else:
-                        word_hotness = WordHotness(word, arr)
-                        break
-                except AssertionError as e:
-                    print(e)
-                except ValueError as e:
-                    print("Input value or format is not correct")
+        session = self.new_session()
+        # while the hotness is typed, the game after each hotness the guess can get is ranked in the background
+        with Prefetcher(self, num_suggestions, strategy, backend) as prefetcher:
+            for i in range(1, self.max_guesses+1):
+                while True:
+                    try:
+                        word = input(f"Type in guess {i}: ")
+                        assert self.is_valid_word(word), f"{word} is an invalid word"
+                        if prefetch:
+                            prefetcher.guess(session, word)
+                        word_hotness = self.parse_hotness(word, input(f"Type in word hotness like (ex: ??x11), ?(right but wrong pos), x (wrong char), 1 (right char right pos): "))
+
+                        if all([x >= 1 for x in word_hotness.hotness]):
+                            return
+                        else:
+                            break
+                    except AssertionError as e:
+                        print(e)
+                    except ValueError as e:
+                        print("Input value or format is not correct")
 
-            letters_hotness.update_word(word, word_hotness)
-            suggestions = sorted(self.suggestions(letters_hotness, num_suggestions), reverse=True)
-            print(f"Current letter hotness: \n{letters_hotness}")
-            print(f"Here are some suggestions: {', '.join([f'{word}({score})' for score, word in suggestions])}")
+                session = prefetcher.update(session, word, word_hotness)
+                suggestions = sorted(session.suggestions(num_suggestions, strategy, backend), reverse=True)
+                print(f"Current letter hotness: \n{session.letters_hotness}")
+                print(f"Number of possible words: {len(session)}")
+                print(f"Here are some suggestions: {', '.join([f'{word}({score})' for score, word in suggestions])}")
 
         return
 
 
+class GameSession:
+
+    def __init__(self, solver):
+        """
+        State of one game: the letters hotness of all guesses so far and
+        the indices of the dictionary words consistent with every guess
+        """
+        self.solver = solver
+        self.letters_hotness = LettersHotness()
+        self.candidates = np.arange(len(solver.words))
+        # indices of the words valid given the letters hotness, see `Solver.candidate_indices`, refiltered on update
+        self.valid = self.candidates
+        self.guesses = []
+        self.tree = solver.strategy_tree
+        self.node = 0 if self.tree is not None else None
+        self._delta = HotnessDelta()
+
+    def update(self, word, word_hotness):
+        """
+        Narrow the candidates to the words that would have given `word_hotness` for `word`
+
+        :param word: str
+        :param word_hotness: WordHotness
+        """
+        stats = self.solver.stats
+        with timer(stats, 'update_word'):
+            delta = self.letters_hotness.update_word(word, word_hotness, self._delta)
+        self.valid = self.solver.refilter(self.valid, delta, self.letters_hotness)
+        pattern = word_hotness.pattern
+        with timer(stats, 'filter_candidates'):
+            self.candidates = self.candidates[self.solver.patterns_for(word, self.candidates) == pattern]
+        self.guesses.append(word)
+        if self.node is not None:
+            self.node = self.tree.child(self.node, pattern) if word == self.tree.guess(self.node) else None
+
+    def candidate_words(self):
+        return [self.solver.words[i] for i in self.candidates]
+
+    def copy(self):
+        o = GameSession(self.solver)
+        o.letters_hotness = self.letters_hotness.copy()
+        o.candidates = self.candidates
+        o.valid = self.valid
+        o.guesses = self.guesses.copy()
+        o.tree = self.tree
+        o.node = self.node
+        return o
+
+    def suggestions(self, num_suggestions=5, strategy=ranking.SCORE, backend=ranking.SERIAL):
+        if self.node is not None and strategy == self.tree.strategy:
+            # the guess of the strategy tree ranks above any computed suggestion
+            return [(float('inf'), self.tree.guess(self.node))]
+
+        # before the first guess every word is a candidate, which keeps the cache key of the first turn cheap
+        candidates = self.candidates if self.guesses else None
+        return self.solver.suggestions(self.letters_hotness, num_suggestions, candidates, strategy, backend, valid=self.valid)
+
+    def __len__(self):
+        return len(self.candidates)
+
+
 class HotnessType(Enum):
     CORRECT_CHAR_POS = 1
     WRONG = 0
@@ -230,21 +849,35 @@ class HotnessType(Enum):
 
 
 class Hotness:
+    __slots__ = ()
     hotness_to_char_mapping = {i: str(i) for i in range(-27, 27)}
     hotness_to_char_mapping.update({HotnessType.WRONG.value: 'x', None: ' '})
-    hotness = None
-    freq = None
 
 
 class WordHotness(Hotness):
+    __slots__ = ('word', 'pattern')
 
     def __init__(self, word=None, hotness=None):
-        self.hotness = hotness
+        """
+        Hotness of a guess, stored as its pattern id (see `patterns.encode`).
+        Value i of `hotness` is i+1, -(i+1) or 0 as returned by `Solver.hotness`.
+        """
         self.word = word
+        self.pattern = None if hotness is None else patterns.encode(hotness)
+
+    @classmethod
+    def from_pattern(cls, word, pattern):
+        o = cls(word)
+        o.pattern = int(pattern)
+        return o
+
+    @property
+    def hotness(self):
+        return None if self.pattern is None else patterns.decode(self.pattern, len(self.word))
 
     def update_word(self, word, hotness):
         self.word = word
-        self.hotness = hotness
+        self.pattern = patterns.encode(hotness)
 
     def __str__(self):
         res = f"[{' '.join([c.rjust(2, ' ') for c in self.word])}]"
@@ -255,6 +888,12 @@ class WordHotness(Hotness):
 
 
 class LettersHotness(Hotness):
+    __slots__ = ('_correct', '_misplaced', '_wrong', '_freq', '_constraints', '_hotness', '_freq_values')
+
+    # positions are bits of 64-bit masks
+    max_letters = 64
+    # `_freq` value of a letter of unknown frequency
+    unknown_freq = 255
 
     def __init__(self, hotness=None, freq=None):
         """
@@ -263,70 +902,182 @@ class LettersHotness(Hotness):
         0 for correct but wrong position
         -1 for wrong letter
         None for unknown hotness
+
+        Stored as, for each letter, the mask of its known positions in `_correct`, the mask of the positions it is
+        known not to be at in `_misplaced`, a bit of `_wrong` and its frequency in `_freq`.
         """
-        if hotness is None:
-            hotness = {}
-        if freq is None:
-            freq = {}
-        self.hotness = dict2arr(hotness, [])
-        self.freq = dict2arr(freq, None)
-
-    def update_word(self, word, word_hotness):
-        freq = defaultdict(int)
-        for i, h in enumerate(word_hotness.hotness):
-            letter = word[i]
-            idx = a2i(letter)
-            f = 0 if h == 0 else 1
-            freq[idx] += f
-
-        for idx, f in freq.items():
-            self.freq[idx] = f
-
-        new_letter_hotness = dict2arr({}, [])
-        for wi, wh in enumerate(word_hotness.hotness):
-            c = word[wi]
-            # case when letter is correct but duplicated,
-            # the hotness of the duplicated letter carries positional information
-            if wh == 0 and freq[a2i(c)] > 0:
-                new_letter_hotness[a2i(c)].append(-wi-1)
+        self._correct = array('Q', bytes(8 * 26))
+        self._misplaced = array('Q', bytes(8 * 26))
+        self._wrong = 0
+        self._freq = bytearray([self.unknown_freq]) * 26
+        self._constraints = None
+        self._hotness = None
+        self._freq_values = None
+        for letter, hv in (hotness or {}).items():
+            for h in (hv if type(hv) is list else [hv]):
+                self._add(a2i(letter), h)
+        for letter, f in (freq or {}).items():
+            if f is not None:
+                assert 0 <= f < self.unknown_freq, f"Frequency {f} of {letter} is out of range"
+                self._freq[a2i(letter)] = f
+
+    def _add(self, idx, h):
+        if h > 0:
+            self._correct[idx] |= 1 << (h - 1)
+        elif h < 0:
+            self._misplaced[idx] |= 1 << (-h - 1)
+        else:
+            self._wrong |= 1 << idx
+
+    @property
+    def hotness(self):
+        """
+        Sorted hotness values of each letter, computed once per update
+        """
+        if self._hotness is None:
+            self._hotness = [self._values(idx) for idx in range(26)]
+        return self._hotness
+
+    @property
+    def freq(self):
+        """
+        Frequency of each letter, None if unknown, computed once per update
+        """
+        if self._freq_values is None:
+            self._freq_values = [None if f == self.unknown_freq else f for f in self._freq]
+        return self._freq_values
+
+    def _values(self, idx):
+        res = []
+        misplaced = self._misplaced[idx]
+        while misplaced:
+            position = misplaced.bit_length()
+            res.append(-position)
+            misplaced ^= 1 << (position - 1)
+        if self._wrong >> idx & 1:
+            res.append(HotnessType.WRONG.value)
+        correct = self._correct[idx]
+        position = 1
+        while correct:
+            if correct & 1:
+                res.append(position)
+            correct >>= 1
+            position += 1
+        return tuple(res)
+
+    def update_word(self, word, word_hotness, delta=None):
+        """
+        Add the hotness of a guess, in place
+
+        :param word: str
+        :param word_hotness: WordHotness
+        :param delta: HotnessDelta to fill with the constraints tightened by the guess, see `Solver.refilter`,
+            None to not compute them
+        :return: delta
+        """
+        self._constraints = None
+        self._hotness = None
+        self._freq_values = None
+        correct, misplaced, freq = self._correct, self._misplaced, self._freq
+        old_wrong = self._wrong
+        if delta is not None:
+            delta.save(self)
+
+        # a letter only wrong so far keeps its hotness
+        frozen = 0
+        seen = 0
+        for letter in word:
+            # see util.a2i
+            idx = ord(letter) - 97
+            seen |= 1 << idx
+            if old_wrong >> idx & 1 and not correct[idx]:
+                frozen |= 1 << idx
+            freq[idx] = 0
+
+        pattern = word_hotness.pattern
+        for letter in word:
+            pattern, digit = divmod(pattern, 3)
+            if digit != patterns.WRONG_DIGIT:
+                freq[ord(letter) - 97] += 1
+
+        pattern = word_hotness.pattern
+        for i, letter in enumerate(word):
+            idx = ord(letter) - 97
+            pattern, digit = divmod(pattern, 3)
+            if frozen >> idx & 1:
+                continue
+            if digit == patterns.CORRECT_CHAR_POS_DIGIT:
+                correct[idx] |= 1 << i
+            elif digit == patterns.CORRECT_CHAR_DIGIT or freq[idx]:
+                # case when letter is correct but duplicated,
+                # the hotness of the duplicated letter carries positional information
+                misplaced[idx] |= 1 << i
             else:
-                new_letter_hotness[a2i(c)].append(wh)
-
-        # one letter:
-        #   case 1: [-1], [-2]
-        #   case 2: [-1], [4]
-        #   case 3: [4], [-1]
-        #   case 4: [4], [4]
-        #   case 5: [0], [0]
-        # multiple letters:
-        #   case 6: [-1], [-2]
-        #   case 7: [-1], [-1, -2]
-        #   case 8: [-1], [-2, -3]
-        #   case 9: [-1], [-2, 4]
-        #   case 10: [-1], [3, 4]
-        #   case 11: [-1, -2], [-1, -2]
-        #   case 12: [-1, -2], [-3, -4]
-        #   case 13: [-1, -2], [-3, 4]
-        #   case 7: [-1, -2], [3, 4]
-        #   case 3: [4], [-1]
-        #   case 3: [4], [-1, -2]
-        #   case 3: [4], [-1, 4]
-        #   case 3: [4], [5]
-        #   case 3: [4], [4, 5]
-
-        for i, hv in enumerate(new_letter_hotness):
-            if hv:
-                if self.hotness[i]:
-                    if self.hotness[i][-1] == HotnessType.WRONG.value:
-                        continue
-                    else:
-                        self.hotness[i] = sorted(set(self.hotness[i] + hv))
-                else:
-                    self.hotness[i] = sorted(set(hv))
+                self._wrong |= 1 << idx
+
+        if delta is not None:
+            self._fill_delta(seen, old_wrong, delta)
+        return delta
+
+    def _fill_delta(self, letters, old_wrong, delta):
+        # only the letters of the guess changed, compared like `Constraints` compiles them
+        correct, misplaced, freq, wrong = self._correct, self._misplaced, self._freq, self._wrong
+        while letters:
+            bit = letters & -letters
+            letters ^= bit
+            idx = bit.bit_length() - 1
+            old_correct, old_misplaced, old_freq = delta._correct[idx], delta._misplaced[idx], delta._freq[idx]
+            was_excluded = old_wrong >> idx & 1 or old_freq == 0
+            if wrong >> idx & 1 or freq[idx] == 0:
+                if not was_excluded:
+                    delta.excluded |= 1 << idx
+                    if old_correct or old_freq != self.unknown_freq:
+                        # a required letter now wrong drops its position and count, the excluded words may be valid
+                        delta.loosened = True
+                continue
+            if was_excluded:
+                delta.loosened = True
+                continue
+            fixed = delta.fixed[idx] = correct[idx] & ~old_correct
+            forbidden = delta.forbidden[idx] = misplaced[idx] & ~old_misplaced
+            old_min_count = 0 if old_freq == self.unknown_freq else old_freq
+            if freq[idx] > old_min_count:
+                delta.min_count[idx] = freq[idx]
+            elif freq[idx] < old_min_count:
+                delta.loosened = True
+            if fixed or forbidden or delta.min_count[idx]:
+                delta.letters |= bit
 
     def get(self, letter):
         return self.hotness[a2i(letter)]
 
+    def freeze(self):
+        """
+        Canonical, hashable and immutable snapshot of the hotness and frequencies of the letters
+        """
+        return self._correct.tobytes(), self._misplaced.tobytes(), self._wrong, bytes(self._freq)
+
+    @classmethod
+    def from_frozen(cls, frozen):
+        correct, misplaced, wrong, freq = frozen
+        o = cls()
+        o._correct = array('Q', correct)
+        o._misplaced = array('Q', misplaced)
+        o._wrong = wrong
+        o._freq = bytearray(freq)
+        return o
+
+    def constraints(self, number_of_letters):
+        """
+        Constraints compiled from the current hotness, cached until the next `update_word`
+
+        :param number_of_letters: int
+        :return: Constraints
+        """
+        if self._constraints is None or self._constraints.number_of_letters != number_of_letters:
+            self._constraints = Constraints(self, number_of_letters)
+        return self._constraints
+
     def __str__(self):
         rpad = 8
         res = f"[{' '.join([(i2a(i)).rjust(rpad, ' ') for i,h in enumerate(self.hotness)])}]"
@@ -341,16 +1092,196 @@ class LettersHotness(Hotness):
         return self.__copy__()
 
     def __copy__(self):
-        o = LettersHotness()
-        o.hotness = self.hotness.copy()
-        o.freq = self.freq.copy()
+        o = LettersHotness.__new__(LettersHotness)
+        o._correct = self._correct[:]
+        o._misplaced = self._misplaced[:]
+        o._wrong = self._wrong
+        o._freq = self._freq[:]
+        # both are only replaced, never mutated, so they can be shared until either side is updated
+        o._constraints = self._constraints
+        o._hotness = self._hotness
+        o._freq_values = self._freq_values
         return o
 
 
+class HotnessDelta:
+    __slots__ = ('excluded', 'letters', 'fixed', 'forbidden', 'min_count', 'loosened', '_correct', '_misplaced', '_freq')
+
+    def __init__(self):
+        """
+        Constraints tightened by one `LettersHotness.update_word`, see `Constraints`. Filled in place by each update,
+        a delta is reused rather than allocated per update.
+        excluded: 26-bit mask of the letters newly known not to be in the word
+        letters: 26-bit mask of the letters whose fixed, forbidden or min_count is set, the others are 0
+        fixed: for each letter, the mask of the positions it is newly known at
+        forbidden: for each letter, the mask of the positions it is newly known not to be at
+        min_count: for each letter, its raised minimum count, 0 if unchanged
+        loosened: a constraint was relaxed, a later guess with fewer occurrences of a letter lowers its minimum count or
+            reports a required letter wrong, and the words excluded before may be valid again
+        """
+        self.excluded = 0
+        self.letters = 0
+        self.fixed = array('Q', bytes(8 * 26))
+        self.forbidden = array('Q', bytes(8 * 26))
+        self.min_count = bytearray(26)
+        self.loosened = False
+        # state of the letters before the update, see `save`
+        self._correct = array('Q', bytes(8 * 26))
+        self._misplaced = array('Q', bytes(8 * 26))
+        self._freq = bytearray(26)
+
+    def save(self, letters_hotness):
+        """
+        Clear the delta and keep the state of `letters_hotness` before it is updated
+        """
+        self.clear()
+        self._correct[:] = letters_hotness._correct
+        self._misplaced[:] = letters_hotness._misplaced
+        self._freq[:] = letters_hotness._freq
+
+    def clear(self):
+        letters = self.letters
+        while letters:
+            idx = (letters & -letters).bit_length() - 1
+            self.fixed[idx] = self.forbidden[idx] = self.min_count[idx] = 0
+            letters &= letters - 1
+        self.excluded = 0
+        self.letters = 0
+        self.loosened = False
+
+    def __bool__(self):
+        return bool(self.excluded or self.letters or self.loosened)
+
+
+class Constraints:
+
+    all_letters = (1 << 26) - 1
+
+    def __init__(self, letters_hotness, number_of_letters):
+        """
+        Compiled form of a LettersHotness, checking a word costs O(number_of_letters) integer operations.
+        positions: 26-bit mask of the letters allowed at each position
+        min_count, max_count: bounds on the number of occurrences of each letter, the hotness only bounds it above
+            by excluding the letter, max_count is 0 or number_of_letters
+        only_position: for a letter of known position only by exclusion, the position (starting at 1) left
+            by its negative hotness, else None
+        A letter with a wrong hotness is excluded from every position whatever its frequency.
+
+        :param letters_hotness: LettersHotness
+        :param number_of_letters: int
+        """
+        self.number_of_letters = number_of_letters
+        self.positions = [self.all_letters] * number_of_letters
+        self.min_count = [0] * 26
+        self.max_count = [number_of_letters] * 26
+        self.only_position = [None] * 26
+
+        all_positions = (1 << number_of_letters) - 1
+        for idx in range(26):
+            bit = 1 << idx
+            freq = letters_hotness._freq[idx]
+            if letters_hotness._wrong & bit or freq == 0:
+                self.max_count[idx] = 0
+                self.positions = [mask & ~bit for mask in self.positions]
+                continue
+
+            if freq != letters_hotness.unknown_freq:
+                self.min_count[idx] = freq
+            correct, misplaced = letters_hotness._correct[idx], letters_hotness._misplaced[idx]
+            for i in range(number_of_letters):
+                if correct >> i & 1:
+                    self.positions[i] &= bit
+                if misplaced >> i & 1:
+                    self.positions[i] &= ~bit
+            possible_positions = all_positions & ~misplaced
+            if (correct or misplaced) and possible_positions and possible_positions & (possible_positions - 1) == 0:
+                self.only_position[idx] = possible_positions.bit_length()
+
+        # letters excluded by `positions` need no count check
+        self.required = [(i2a(idx), c) for idx, c in enumerate(self.min_count) if c > 0]
+
+    def is_valid(self, word):
+        positions = self.positions
+        for i, letter in enumerate(word):
+            if not positions[i] >> a2i(letter) & 1:
+                return False
+        for letter, count in self.required:
+            if word.count(letter) < count:
+                return False
+        return True
+
+
 if __name__ == '__main__':
-    number_of_letters = 5
-    max_guesses = 6
-    dictionary_path = 'data/words_dictionary.json'
-    # s = Solver(dictionary_path, number_of_letters, max_guesses).play()
-    s = Solver(dictionary_path, number_of_letters, max_guesses).suggest(20)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Wordle solver")
+    parser.add_argument('-d', '--dictionary', default='data/words_dictionary.json')
+    parser.add_argument('-n', '--number-of-letters', type=int, default=5)
+    parser.add_argument('-g', '--max-guesses', type=int, default=6)
+    parser.add_argument('-s', '--strategy', choices=ranking.STRATEGIES, default=ranking.SCORE)
+    parser.add_argument('-b', '--backend', choices=ranking.BACKENDS, default=ranking.SERIAL,
+                        help="how the partition strategies are computed")
+    parser.add_argument('--budget-seconds', type=float, default=1.0, help="time budget of the approximate backend")
+    parser.add_argument('--budget-memory', type=int, default=64, help="memory budget of the approximate backend in MiB")
+    parser.add_argument('--patterns-dir', help="directory of the pattern matrix, see patterns.py")
+    parser.add_argument('--strategy-tree', help="solving tree built by strategy_tree.py")
+    parser.add_argument('--trie', action='store_true', help="look the guesses up in a trie of the dictionary, see trie.py")
+    parser.add_argument('--weights', help="hotness weights tuned by tune.py")
+    parser.add_argument('--stats', action='store_true', help="print the counters and timers of the solver when done")
+    parser.add_argument('--no-prefetch', action='store_true',
+                        help="do not rank the next suggestions in the background while a guess or hotness is typed")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('play', help="guess a random word")
+    suggest_parser = subparsers.add_parser('suggest', help="get suggestions for a game played elsewhere")
+    suggest_parser.add_argument('-k', '--num-suggestions', type=int, default=20)
+    simulate_parser = subparsers.add_parser('simulate', help="play the top suggestion against every answer")
+    simulate_parser.add_argument('-a', '--answers', help="file of newline-delimited answers, default to the dictionary")
+    simulate_parser.add_argument('-p', '--processes', type=int, default=1)
+    simulate_parser.add_argument('--seed', type=int)
+    simulate_parser.add_argument('--sample', type=int, help="number of answers to sample")
+    simulate_parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    batch_parser = subparsers.add_parser('batch', help="stream the suggestions of JSON-lines game histories, see batch.py")
+    batch_parser.add_argument('inputs', nargs='*', default=['-'], help="files of game histories, - for stdin")
+    batch_parser.add_argument('-k', '--num-suggestions', type=int, default=10)
+    batch_parser.add_argument('-p', '--processes', type=int, default=1)
+    batch_parser.add_argument('--window', type=int, help="maximum number of chunks in flight, default to 4 per process")
+    batch_parser.add_argument('--chunk-size', type=int, default=256, help="number of records sent to a worker at once")
+    args = parser.parse_args()
 
+    if args.command == 'simulate':
+        from simulate import simulate
+        answers = None
+        if args.answers:
+            with open(args.answers) as f:
+                answers = [line.strip() for line in f if line.strip()]
+        report = simulate(args.dictionary, args.number_of_letters, args.max_guesses, answers, args.strategy,
+                          args.processes, args.seed, args.sample, args.patterns_dir, args.weights)
+        print(json.dumps(report.to_dict()) if args.json else report)
+    elif args.command == 'batch':
+        import sys
+        from batch import run
+        files = [sys.stdin if path == '-' else open(path) for path in args.inputs]
+        try:
+            run(args.dictionary, files, sys.stdout, args.number_of_letters, args.max_guesses, args.num_suggestions,
+                args.strategy, args.processes, args.window, args.chunk_size, args.patterns_dir, args.weights)
+        finally:
+            for f in files:
+                if f is not sys.stdin:
+                    f.close()
+    else:
+        s = Solver(args.dictionary, args.number_of_letters, args.max_guesses, args.weights, stats=args.stats)
+        if args.patterns_dir:
+            s.load_patterns(args.patterns_dir)
+        if args.strategy_tree:
+            s.load_strategy_tree(args.strategy_tree, args.strategy)
+        if args.trie:
+            s.load_trie()
+        s.budget = ranking.Budget(args.budget_seconds, args.budget_memory << 20)
+        try:
+            if args.command == 'play':
+                s.play(args.strategy, not args.no_prefetch, args.backend)
+            else:
+                s.suggest(getattr(args, 'num_suggestions', 20), args.strategy, not args.no_prefetch, args.backend)
+        finally:
+            if s.stats is not None:
+                print(f"Solver stats:\n{s.stats}")
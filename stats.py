@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+
+# returned by `timer` when stats are disabled
+NULL_TIMER = nullcontext()
+
+
+class Stats:
+
+    def __init__(self):
+        """
+        Counters and cumulative timers of the phases of a Solver. Safe to share between threads.
+        A timer also counts how many times it was entered.
+        """
+        self._counters = defaultdict(int)
+        self._timers = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._counters[name] += 1
+                self._timers[name] += elapsed
+
+    def snapshot(self):
+        """
+        :return: {'counters': {name: int}, 'timers': {name: seconds}}
+        """
+        with self._lock:
+            return {'counters': dict(self._counters), 'timers': dict(self._timers)}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+
+    def __str__(self):
+        snapshot = self.snapshot()
+        counters, timers = snapshot['counters'], snapshot['timers']
+        width = max([len(name) for name in counters] + [0])
+        lines = []
+        for name in sorted(counters):
+            line = f"{name.ljust(width)} {counters[name]:>10}"
+            if name in timers:
+                line += f" {timers[name] * 1000:>12.3f} ms"
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+def timer(stats, name):
+    """
+    Timer `name` of `stats`, a shared no-op context when `stats` is None
+    """
+    return NULL_TIMER if stats is None else stats.timer(name)
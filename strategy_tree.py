@@ -0,0 +1,194 @@
+import argparse
+import json
+import multiprocessing
+import numpy as np
+import patterns
+import ranking
+from solver import WordHotness
+from worker import init_worker
+
+
+# a node of a tree being built is (guess, {pattern: child node})
+
+
+def build_node(solver, session, strategy, depth):
+    """
+    Solving tree below a game state: the guess the solver makes and, for each pattern the guess can get
+    short of the answer, the subtree of the state after that pattern
+
+    :param solver: Solver
+    :param session: GameSession
+    :param strategy: ranking strategy of the guesses
+    :param depth: number of the guess to make, no guess is made past `solver.max_guesses`
+    :return: (guess, {pattern: node}) or None
+    """
+    if depth > solver.max_guesses or len(session) == 0:
+        return None
+
+    guess = max(session.suggestions(1, strategy))[1]
+    all_correct = patterns.all_correct_pattern(solver.number_of_letters)
+    children = {}
+    for pattern in np.unique(solver.patterns_for(guess, session.candidates)):
+        if pattern == all_correct:
+            continue
+        child_session = session.copy()
+        child_session.update(guess, WordHotness.from_pattern(guess, pattern))
+        child = build_node(solver, child_session, strategy, depth + 1)
+        if child is not None:
+            children[int(pattern)] = child
+    return guess, children
+
+
+_worker = {}
+
+
+def _init_worker(solver_args, solver_kwargs, patterns_dir):
+    init_worker(_worker, solver_args, solver_kwargs, patterns_dir)
+
+
+def _build_branch(guess, pattern, strategy):
+    solver = _worker['solver']
+    session = solver.new_session()
+    session.update(guess, WordHotness.from_pattern(guess, pattern))
+    return pattern, build_node(solver, session, strategy, 2)
+
+
+def build(words_list_path, number_of_letters=5, max_guesses=6, strategy=ranking.SCORE, processes=1, patterns_dir=None,
+          hotness_weights=None):
+    """
+    Build the solving tree of a dictionary, the subtrees of the first guess are built in parallel
+
+    :param processes: number of worker processes, each loading its own Solver
+    :param patterns_dir: directory of the pattern matrix to load, see `Solver.load_patterns`
+    :param hotness_weights: weights of the solver or path of weights tuned by tune.py, None for the default weights
+    :return: StrategyTree
+    """
+    solver_args = (words_list_path, number_of_letters, max_guesses)
+    solver_kwargs = {'hotness_weights': hotness_weights}
+    _init_worker(solver_args, solver_kwargs, patterns_dir)
+    solver = _worker['solver']
+    session = solver.new_session()
+    guess = max(session.suggestions(1, strategy))[1]
+    all_correct = patterns.all_correct_pattern(number_of_letters)
+    branches = [(guess, int(p), strategy) for p in np.unique(solver.patterns_for(guess)) if p != all_correct]
+
+    if processes == 1:
+        results = [_build_branch(*branch) for branch in branches]
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(solver_args, solver_kwargs, patterns_dir)) as pool:
+            results = pool.starmap(_build_branch, branches, chunksize=1)
+
+    root = (guess, {pattern: child for pattern, child in results if child is not None})
+    return StrategyTree.from_node(root, solver, strategy)
+
+
+class StrategyTree:
+
+    def __init__(self, node_guess, child_start, child_pattern, child_node, words, number_of_letters, dictionary_key,
+                 strategy, max_guesses, hotness_weights):
+        """
+        Flat solving tree, node 0 is the root.
+        node_guess[i]: index in `words` of the guess of node i
+        child_pattern[child_start[i]:child_start[i+1]], child_node[...]: patterns and children of node i
+        `strategy`, `max_guesses` and `hotness_weights` are those of the solver the tree was built with
+        """
+        self.node_guess = node_guess
+        self.child_start = child_start
+        self.child_pattern = child_pattern
+        self.child_node = child_node
+        self.words = words
+        self.number_of_letters = number_of_letters
+        self.dictionary_key = dictionary_key
+        self.strategy = strategy
+        self.max_guesses = max_guesses
+        self.hotness_weights = dict(hotness_weights)
+        self._children = {}
+        for node in range(len(node_guess)):
+            for e in range(child_start[node], child_start[node + 1]):
+                self._children[(node, int(child_pattern[e]))] = int(child_node[e])
+
+    @classmethod
+    def from_node(cls, root, solver, strategy):
+        node_guess, child_start, child_pattern, child_node = [], [0], [], []
+        queue = [root]
+        # breadth first, the children of a node get consecutive ids
+        for guess, children in queue:
+            node_guess.append(solver.word_indices[guess])
+            for pattern, child in sorted(children.items()):
+                child_pattern.append(pattern)
+                child_node.append(len(queue))
+                queue.append(child)
+            child_start.append(len(child_pattern))
+
+        return cls(np.array(node_guess, dtype=np.int32), np.array(child_start, dtype=np.int64),
+                   np.array(child_pattern, dtype=patterns.pattern_dtype(solver.number_of_letters)),
+                   np.array(child_node, dtype=np.int32), solver.words, solver.number_of_letters,
+                   patterns.dictionary_key(solver.words, solver.number_of_letters), strategy, solver.max_guesses,
+                   solver.hotness_weights)
+
+    def save(self, path):
+        # the weights as JSON, the key None and -inf values are written as "null" and -Infinity
+        weights = json.dumps({'null' if k is None else str(k): v for k, v in self.hotness_weights.items()})
+        with open(path, 'wb') as f:
+            np.savez(f, node_guess=self.node_guess, child_start=self.child_start, child_pattern=self.child_pattern,
+                     child_node=self.child_node, number_of_letters=self.number_of_letters,
+                     dictionary_key=self.dictionary_key, strategy=self.strategy, max_guesses=self.max_guesses,
+                     hotness_weights=weights)
+
+    @classmethod
+    def load(cls, path, solver, strategy=None):
+        """
+        Load a tree saved by `save`, it must have been built for the dictionary, `max_guesses` and hotness weights
+        of `solver`
+
+        :param strategy: raise if the tree was built with another strategy, None to accept any strategy
+        """
+        with np.load(path) as data:
+            dictionary_key = str(data['dictionary_key'])
+            if dictionary_key != patterns.dictionary_key(solver.words, solver.number_of_letters):
+                raise Exception(f"Strategy tree {path} was not built for this dictionary")
+            if 'max_guesses' not in data or 'hotness_weights' not in data:
+                raise Exception(f"Strategy tree {path} does not record the solver it was built with, rebuild it")
+            max_guesses = int(data['max_guesses'])
+            if max_guesses != solver.max_guesses:
+                raise Exception(f"Strategy tree {path} was built for {max_guesses} guesses, not {solver.max_guesses}")
+            hotness_weights = {None if k == 'null' else int(k): v
+                               for k, v in json.loads(str(data['hotness_weights'])).items()}
+            if hotness_weights != dict(solver.hotness_weights):
+                raise Exception(f"Strategy tree {path} was built with other hotness weights")
+            tree_strategy = str(data['strategy'])
+            if strategy is not None and tree_strategy != strategy:
+                raise Exception(f"Strategy tree {path} was built with the {tree_strategy} strategy, not {strategy}")
+            return cls(data['node_guess'], data['child_start'], data['child_pattern'], data['child_node'],
+                       solver.words, int(data['number_of_letters']), dictionary_key, tree_strategy, max_guesses,
+                       hotness_weights)
+
+    def guess(self, node):
+        return self.words[self.node_guess[node]]
+
+    def child(self, node, pattern):
+        """
+        :return: the node reached from `node` by `pattern`, None if the tree has no such branch
+        """
+        return self._children.get((node, int(pattern)))
+
+    def __len__(self):
+        return len(self.node_guess)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the solving tree of a dictionary")
+    parser.add_argument('output_path')
+    parser.add_argument('-d', '--dictionary', default='data/words_dictionary.json')
+    parser.add_argument('-n', '--number-of-letters', type=int, default=5)
+    parser.add_argument('-g', '--max-guesses', type=int, default=6)
+    parser.add_argument('-s', '--strategy', choices=ranking.STRATEGIES, default=ranking.SCORE)
+    parser.add_argument('-p', '--processes', type=int, default=1)
+    parser.add_argument('--patterns-dir', help="directory of the pattern matrix, see patterns.py")
+    parser.add_argument('--weights', help="hotness weights tuned by tune.py")
+    args = parser.parse_args()
+
+    tree = build(args.dictionary, args.number_of_letters, args.max_guesses, args.strategy, args.processes,
+                 args.patterns_dir, args.weights)
+    tree.save(args.output_path)
+    print(f"Strategy tree of {len(tree)} nodes saved to {args.output_path}")
@@ -1,5 +1,53 @@
-from unittest import TestCase
-from solver import Solver, LettersHotness, WordHotness
+import gzip
+import io
+import json
+import os
+import tempfile
+import math
+import random
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, IsolatedAsyncioTestCase, mock
+import numpy as np
+import batch
+import bench
+import multiboard
+import patterns
+import prefetch
+import ranking
+import server
+import simulate
+import snapshot
+import strategy_tree
+import tune
+import word_cache
+from lru_cache import LRUCache
+from solver import Solver, LettersHotness, WordHotness, Constraints, HotnessDelta, HotnessType
+from stats import Stats
+from trie import Trie
+from util import a2i, format_suggestions, letters_presence
+
+
+small_dictionary = ['point', 'boils', 'nails', 'bread', 'brace', 'slice', 'paint', 'flint', 'cling', 'tools',
+                    'toons', 'alarm', 'click', 'rinse', 'today', 'arrow', 'leeks', 'again', 'angry', 'wrung']
+
+
+class SmallDictionaryTestCase(TestCase):
+
+    number_of_letters = 5
+    words = small_dictionary
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.words_list_path = os.path.join(self.directory.name, 'words_dictionary.json')
+        with open(self.words_list_path, 'w') as f:
+            json.dump({w: 1 for w in self.words}, f)
+        self.fixture = Solver(self.words_list_path, self.number_of_letters)
+
+    def tearDown(self):
+        self.directory.cleanup()
 
 
 class SolverTest(TestCase):
@@ -19,6 +67,33 @@ class SolverTest(TestCase):
         with self.assertRaises(AssertionError) as context:
             self.fixture.hotness("point", "adafd")
 
+    def test_hotness_array(self):
+        targets = ['point', 'boils', 'nails', 'bread']
+        indices = [self.fixture.word_indices[w] for w in targets]
+        actual = self.fixture.hotness_array('point', indices)
+
+        self.assertEqual((len(targets), self.number_of_letters), actual.shape)
+        for target, row in zip(targets, actual):
+            self.assertEqual(self.fixture.hotness('point', target).hotness, list(row))
+
+    def test_hotness_array_of_all_words(self):
+        actual = self.fixture.hotness_array('nails')
+
+        self.assertEqual((len(self.fixture.words_dict), self.number_of_letters), actual.shape)
+        self.assertEqual([-1, 0, 3, 0, 0], list(actual[self.fixture.word_indices['point']]))
+
+    def test_hotness_array_of_invalid_word(self):
+        with self.assertRaises(AssertionError) as context:
+            self.fixture.hotness_array("adfaf")
+
+    def test_parse_hotness(self):
+        self.assertEqual([-1, 0, 3, 0, 5], self.fixture.parse_hotness('nails', '?x1x1').hotness)
+
+    def test_parse_invalid_hotness(self):
+        for word, hotness_input in (('nails', '?x1x'), ('nails', '?x1x2'), ('adfaf', '?x1x1')):
+            with self.assertRaises(AssertionError):
+                self.fixture.parse_hotness(word, hotness_input)
+
     def test_valid(self):
         self.assertFalse(self.fixture.is_valid_word("adfaf"))
 
@@ -43,6 +118,38 @@ class SolverTest(TestCase):
         self.assertTrue(self.fixture.is_valid_by_hotness("brace", letters_hotness))
         self.assertFalse(self.fixture.is_valid_by_hotness("slice", letters_hotness))
 
+    def test_constraints(self):
+        letters_hotness = LettersHotness(
+            {'a': [-4, -5], 'm': [-1, -2, -3, -4], 't': [1], 'x': [0]},
+            {'a': 2, 'm': 1, 't': 1, 'x': 0},
+        )
+        constraints = letters_hotness.constraints(self.number_of_letters)
+
+        self.assertEqual(1 << a2i('t'), constraints.positions[0])
+        self.assertFalse(constraints.positions[3] >> a2i('a') & 1)
+        self.assertTrue(all(not mask >> a2i('x') & 1 for mask in constraints.positions))
+        self.assertEqual(2, constraints.min_count[a2i('a')])
+        self.assertEqual(0, constraints.max_count[a2i('x')])
+        self.assertEqual(5, constraints.only_position[a2i('m')])
+        self.assertIsNone(constraints.only_position[a2i('a')])
+
+    def test_constraints_is_valid(self):
+        constraints = Constraints(LettersHotness({'a': [-4, -5], 'r': [0]}, {'a': 2, 'r': 0}), self.number_of_letters)
+
+        self.assertTrue(constraints.is_valid('aalii'))
+        self.assertFalse(constraints.is_valid('alarm'))
+        self.assertFalse(constraints.is_valid('basal'))
+        self.assertFalse(constraints.is_valid('blast'))
+
+    def test_constraints_are_compiled_once_per_update(self):
+        letters_hotness = LettersHotness()
+        constraints = letters_hotness.constraints(self.number_of_letters)
+        self.assertIs(constraints, letters_hotness.constraints(self.number_of_letters))
+
+        letters_hotness.update_word('paint', WordHotness('paint', [0, -2, 3, 0, 5]))
+        self.assertIsNot(constraints, letters_hotness.constraints(self.number_of_letters))
+        self.assertFalse(letters_hotness.constraints(self.number_of_letters).is_valid('paint'))
+
     def test_valid_words_from_hotness(self):
         hotness = LettersHotness(
             {'a': [-3], 'b': [1], 'r': [2], 'e': [-4], 'd': [5], 'i': [0], 'o': [0]},
@@ -244,6 +351,62 @@ class SolverTest(TestCase):
 
         self._testLettersHotness(expected, actual)
 
+    def test_copy_letters_hotness(self):
+        letter_hotness = LettersHotness()
+        letter_hotness.update_word('rinse', WordHotness('rinse', [-1, 0, 0, 0, 0]))
+        copy = letter_hotness.copy()
+        copy.update_word('today', WordHotness('today', [0, -2, 0, -4, 0]))
+        copy.update_word('arrow', WordHotness('arrow', [-1, -2, 0, 4, 0]))
+
+        self.assertEqual((-1,), letter_hotness.get('r'))
+        self.assertIsNone(letter_hotness.freq[a2i('o')])
+        self.assertEqual((-3, -2, -1), copy.get('r'))
+        self.assertTrue(letter_hotness.constraints(self.number_of_letters).is_valid('arbor'))
+        self.assertFalse(copy.constraints(self.number_of_letters).is_valid('arbor'))
+
+    def test_update_word_delta(self):
+        letter_hotness = LettersHotness()
+        delta = HotnessDelta()
+        self.assertIs(delta, letter_hotness.update_word('rinse', WordHotness('rinse', [-1, 0, 0, 0, 0]), delta))
+
+        self.assertEqual(sum(1 << a2i(c) for c in 'inse'), delta.excluded)
+        self.assertFalse(any(delta.fixed))
+        self.assertEqual({a2i('r'): 0b1}, {idx: mask for idx, mask in enumerate(delta.forbidden) if mask})
+        self.assertEqual({a2i('r'): 1}, {idx: count for idx, count in enumerate(delta.min_count) if count})
+        self.assertEqual(1 << a2i('r'), delta.letters)
+        self.assertFalse(delta.loosened)
+
+        letter_hotness.update_word('arrow', WordHotness('arrow', [-1, 2, 0, 0, 0]), delta)
+        self.assertEqual(sum(1 << a2i(c) for c in 'ow'), delta.excluded)
+        self.assertEqual({a2i('r'): 0b10}, {idx: mask for idx, mask in enumerate(delta.fixed) if mask})
+        self.assertEqual({a2i('a'): 0b1, a2i('r'): 0b100}, {idx: mask for idx, mask in enumerate(delta.forbidden) if mask})
+        self.assertEqual({a2i('a'): 1}, {idx: count for idx, count in enumerate(delta.min_count) if count})
+        self.assertEqual(1 << a2i('a') | 1 << a2i('r'), delta.letters)
+
+        self.assertFalse(letter_hotness.update_word('arrow', WordHotness('arrow', [-1, 2, 0, 0, 0]), delta))
+        self.assertIsNone(letter_hotness.update_word('arrow', WordHotness('arrow', [-1, 2, 0, 0, 0])))
+
+    def test_update_word_delta_loosened(self):
+        letter_hotness = LettersHotness()
+        letter_hotness.update_word('leeks', WordHotness('leeks', [0, -2, -3, 0, 0]))
+        delta = letter_hotness.update_word('ocean', WordHotness('ocean', [0, 0, -3, 0, 0]), HotnessDelta())
+
+        self.assertTrue(delta.loosened)
+
+        letter_hotness = LettersHotness()
+        letter_hotness.update_word('rinse', WordHotness('rinse', [-1, 0, 0, 0, 0]))
+        delta = letter_hotness.update_word('arbor', WordHotness('arbor', [0, 0, 0, 0, 0]), HotnessDelta())
+
+        self.assertTrue(delta.loosened)
+        self.assertEqual(sum(1 << a2i(c) for c in 'arbo'), delta.excluded)
+
+    def test_word_hotness_pattern(self):
+        word_hotness = WordHotness('leeks', [-1, -2, 3, 0, 5])
+
+        self.assertEqual(patterns.encode([-1, -2, 3, 0, 5]), word_hotness.pattern)
+        self.assertEqual([-1, -2, 3, 0, 5], word_hotness.hotness)
+        self.assertEqual([-1, -2, 3, 0, 5], WordHotness.from_pattern('leeks', word_hotness.pattern).hotness)
+
     def test_score_word_by_letters_closeness(self):
         word = 'paint'
         letter_hotness = LettersHotness()
@@ -414,3 +577,1204 @@ class SolverTest(TestCase):
         suggestions = self.fixture.suggestions(letters_hotness, 10)
 
         self.assertTrue((7, 'wrung') in suggestions)
+
+
+class PatternsTest(SmallDictionaryTestCase):
+
+    def test_encode_decode(self):
+        for hotness in ([1, 2, 3, 4, 5], [0, 0, 0, 0, 0], [-1, 0, 3, 0, -5]):
+            self.assertEqual(hotness, patterns.decode(patterns.encode(hotness), self.number_of_letters))
+
+    def test_all_correct_pattern(self):
+        self.assertEqual(patterns.encode([1, 2, 3, 4, 5]), patterns.all_correct_pattern(self.number_of_letters))
+
+    def test_pattern_dtype(self):
+        self.assertEqual(patterns.pattern_dtype(5), patterns.np.uint8)
+        self.assertEqual(patterns.pattern_dtype(6), patterns.np.uint16)
+
+    def test_load_patterns_without_build(self):
+        self.assertFalse(self.fixture.load_patterns(self.directory.name))
+        self.assertIsNone(self.fixture.patterns)
+
+    def test_pattern_matrix(self):
+        self.assertTrue(self.fixture.load_patterns(self.directory.name, build=True))
+
+        for word in self.words:
+            for target in self.words:
+                expected = patterns.encode(self.fixture.hotness_array(word, [self.fixture.word_indices[target]])[0])
+                self.assertEqual(expected, self.fixture.patterns[self.fixture.word_indices[word], self.fixture.word_indices[target]])
+
+    def test_hotness_from_pattern_matrix(self):
+        expected = self.fixture.hotness('boils', 'point').hotness
+        self.fixture.load_patterns(self.directory.name, build=True)
+
+        self.assertEqual(expected, self.fixture.hotness('boils', 'point').hotness)
+        self.assertEqual(list(patterns.encode_array(self.fixture.hotness_array('boils'))), list(self.fixture.patterns_for('boils')))
+
+    def test_pattern_matrix_is_keyed_by_dictionary(self):
+        self.fixture.load_patterns(self.directory.name, build=True)
+        with open(self.words_list_path, 'w') as f:
+            json.dump({w: 1 for w in self.words[1:]}, f)
+        other = Solver(self.words_list_path, self.number_of_letters)
+
+        self.assertFalse(other.load_patterns(self.directory.name))
+
+
+class GameSessionTest(SmallDictionaryTestCase):
+
+    def test_new_session(self):
+        session = self.fixture.new_session()
+
+        self.assertEqual(len(self.words), len(session))
+        self.assertEqual(self.words, session.candidate_words())
+
+    def test_update_narrows_candidates(self):
+        session = self.fixture.new_session()
+        session.update('boils', self.fixture.hotness('boils', 'point'))
+
+        expected = [w for w in self.words if self.fixture.hotness('boils', w).hotness == [0, 2, 3, 0, 0]]
+        self.assertEqual(expected, session.candidate_words())
+        self.assertIn('point', session.candidate_words())
+
+    def test_update_narrows_candidates_over_multiple_guesses(self):
+        session = self.fixture.new_session()
+        for guess in ['rinse', 'today', 'point']:
+            session.update(guess, self.fixture.hotness(guess, 'paint'))
+            self.assertIn('paint', session.candidate_words())
+
+        self.assertEqual(['paint'], session.candidate_words())
+
+    def test_update_with_pattern_matrix(self):
+        self.fixture.load_patterns(self.directory.name, build=True)
+        session = self.fixture.new_session()
+        session.update('boils', self.fixture.hotness('boils', 'point'))
+
+        self.assertIn('point', session.candidate_words())
+
+    def test_suggestions_rank_candidates_only(self):
+        session = self.fixture.new_session()
+        session.update('boils', self.fixture.hotness('boils', 'point'))
+        suggestions = session.suggestions(len(self.words))
+
+        self.assertEqual(sorted(session.candidate_words()), sorted(word for score, word in suggestions))
+
+
+class RankingTest(SmallDictionaryTestCase):
+
+    def _partition_sizes(self, guess, candidates):
+        return Counter(tuple(self.fixture.hotness(guess, c).hotness) for c in candidates).values()
+
+    def test_entropy_suggestions(self):
+        suggestions = self.fixture.suggestions(LettersHotness(), len(self.words), strategy=ranking.ENTROPY)
+
+        for score, word in suggestions:
+            sizes = self._partition_sizes(word, self.words)
+            expected = -sum(size / len(self.words) * math.log2(size / len(self.words)) for size in sizes)
+            self.assertAlmostEqual(expected, score)
+
+    def test_expected_size_suggestions(self):
+        session = self.fixture.new_session()
+        session.update('rinse', self.fixture.hotness('rinse', 'point'))
+        candidates = session.candidate_words()
+        suggestions = session.suggestions(len(self.words), strategy=ranking.EXPECTED_SIZE)
+
+        for score, word in suggestions:
+            sizes = self._partition_sizes(word, candidates)
+            expected = (sum(size * size for size in sizes) - (word in candidates)) / len(candidates)
+            self.assertAlmostEqual(-expected, score)
+
+    def test_partition_suggestions_prefer_candidates(self):
+        session = self.fixture.new_session()
+        for guess in ['rinse', 'today']:
+            session.update(guess, self.fixture.hotness(guess, 'point'))
+        best = max(session.suggestions(1, strategy=ranking.ENTROPY))
+
+        self.assertIn(best[1], session.candidate_words())
+
+    def test_partition_suggestions_with_pattern_matrix(self):
+        expected = self.fixture.suggestions(LettersHotness(), 5, strategy=ranking.ENTROPY)
+        self.fixture.load_patterns(self.directory.name, build=True)
+
+        self.assertEqual(sorted(expected), sorted(self.fixture.suggestions(LettersHotness(), 5, strategy=ranking.ENTROPY)))
+
+    def test_process_backend(self):
+        for strategy in (ranking.ENTROPY, ranking.EXPECTED_SIZE):
+            expected = self.fixture.suggestions(LettersHotness(), 5, strategy=strategy)
+            actual = self.fixture.suggestions(LettersHotness(), 5, strategy=strategy, backend=ranking.PROCESS, processes=2)
+            self.assertEqual(sorted(expected), sorted(actual))
+        self.fixture.close()
+
+    def test_process_ranker_is_started_once(self):
+        started = []
+
+        class SlowRanker:
+            def __init__(self, solver, processes=None):
+                # wide enough for every thread to find no ranker without the lock
+                time.sleep(0.05)
+                self.processes = processes
+                started.append(self)
+
+            def close(self):
+                pass
+
+        with mock.patch('ranking.ProcessRanker', SlowRanker), ThreadPoolExecutor(4) as executor:
+            rankers = list(executor.map(lambda _: self.fixture.ranker(2), range(4)))
+        self.fixture.close()
+
+        self.assertEqual(1, len(started))
+        self.assertTrue(all(ranker is started[0] for ranker in rankers))
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(Exception):
+            self.fixture.suggestions(LettersHotness(), 5, strategy='unknown')
+
+    def _assert_same_suggestions(self, expected, actual):
+        # the scores of a full sample are summed in another order than the exact ones
+        expected, actual = sorted(expected, key=lambda s: s[1]), sorted(actual, key=lambda s: s[1])
+        self.assertEqual([word for _, word in expected], [word for _, word in actual])
+        np.testing.assert_allclose([score for score, _ in expected], [score for score, _ in actual], rtol=1e-12)
+
+    def test_approximate_backend_without_sampling(self):
+        for strategy in (ranking.ENTROPY, ranking.EXPECTED_SIZE):
+            expected = self.fixture.suggestions(LettersHotness(), 5, strategy=strategy)
+            actual = self.fixture.suggestions(LettersHotness(), 5, strategy=strategy, backend=ranking.APPROXIMATE)
+            self._assert_same_suggestions(expected, actual)
+
+            _, estimate = self.fixture.approximate_suggestions(LettersHotness(), 5, strategy=strategy)
+            self.assertEqual(1.0, estimate.coverage)
+            self.assertEqual(len(self.words), estimate.sample_size)
+            self.assertTrue((estimate.errors == 0).all())
+
+    def test_approximate_scores_of_a_sample(self):
+        candidates = np.arange(len(self.words))
+        guesses = np.arange(len(self.words))
+        for strategy in (ranking.ENTROPY, ranking.EXPECTED_SIZE):
+            exact = ranking.rank(self.fixture.words_matrix, self.fixture.words_letters, None, guesses, candidates, strategy)
+            estimate = ranking.approximate_rank(self.fixture.words_matrix, self.fixture.words_letters, None, guesses,
+                                                candidates, strategy, ranking.Budget(sample_size=12))
+
+            self.assertEqual(12, estimate.sample_size)
+            self.assertEqual(list(guesses), list(estimate.guesses))
+            self.assertTrue((estimate.errors > 0).any())
+            self.assertGreater(np.mean(np.abs(estimate.scores - exact) <= 2 * estimate.errors), 0.5)
+
+    def test_approximate_ranking_within_budget(self):
+        # a chunk of 3 guesses, and no time left after the first chunk
+        budget = ranking.Budget(seconds=0, memory=3 * ranking.BYTES_PER_PATTERN * len(self.words))
+        suggestions, estimate = self.fixture.approximate_suggestions(LettersHotness(), 5, budget=budget)
+
+        self.assertEqual(3, len(estimate.guesses))
+        self.assertAlmostEqual(3 / len(self.words), estimate.coverage)
+        self.assertEqual(3, len(suggestions))
+        self.assertTrue(all(self.fixture.word_indices[word] in estimate.guesses for _, word in suggestions))
+
+    def test_approximate_rank_within_budget_of_long_words(self):
+        rng = np.random.default_rng(0)
+        # 8 letters have too many pattern ids to count them per id, even when every candidate is sampled
+        words_matrix = np.asfortranarray(rng.integers(0, 26, (2000, 8), dtype=np.uint8))
+        budget = ranking.Budget(memory=1 << 20)
+        tracemalloc.start()
+        try:
+            ranking.approximate_rank(words_matrix, letters_presence(words_matrix), None, np.arange(500), np.arange(209),
+                                     ranking.ENTROPY, budget)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 1.25 * budget.memory)
+
+        # a single candidate leaves room in memory for every guess at once, the time budget still holds
+        words_matrix = np.asfortranarray(rng.integers(0, 26, (20000, 12), dtype=np.uint8))
+        budget = ranking.Budget(seconds=0.05)
+        start = time.perf_counter()
+        estimate = ranking.approximate_rank(words_matrix, letters_presence(words_matrix), None, np.arange(20000),
+                                            np.arange(1), ranking.EXPECTED_SIZE, budget)
+        self.assertLess(time.perf_counter() - start, 10 * budget.seconds)
+        self.assertLess(estimate.coverage, 1)
+
+    def test_approximate_suggestions_are_cached_apart(self):
+        self.fixture.budget = ranking.Budget(sample_size=5)
+        approximate = self.fixture.suggestions(LettersHotness(), 3, strategy=ranking.ENTROPY, backend=ranking.APPROXIMATE)
+        exact = self.fixture.suggestions(LettersHotness(), 3, strategy=ranking.ENTROPY)
+
+        self.assertEqual(2, len(self.fixture.suggestions_cache))
+        self.assertNotEqual(sorted(approximate), sorted(exact))
+
+        self.fixture.budget = ranking.Budget(sample_size=len(self.words))
+        self._assert_same_suggestions(exact, self.fixture.suggestions(LettersHotness(), 3, strategy=ranking.ENTROPY,
+                                                                      backend=ranking.APPROXIMATE))
+        self.assertEqual(3, len(self.fixture.suggestions_cache))
+
+
+class WordIndexTest(TestCase):
+
+    number_of_letters = SolverTest.number_of_letters
+    fixture = SolverTest.fixture
+
+    def _expected(self, letters_hotness):
+        constraints = letters_hotness.constraints(self.number_of_letters)
+        return [w for w in self.fixture.words if constraints.is_valid(w)]
+
+    def test_filter(self):
+        for letters_hotness in (
+            LettersHotness(),
+            LettersHotness({'e': [0], 'i': [0], 'n': [-3], 'r': [-1], 's': [0]}, {'e': 0, 'i': 0, 'n': 1, 'r': 1, 's': 0}),
+            LettersHotness({'a': [-4, -5], 'm': [-1, -2, -3, -4]}, {'a': 2, 'm': 1}),
+            LettersHotness({'l': [-1, 4], 'e': [2, 3], 'k': [0], 's': [5]}, {'l': 1, 'e': 2, 'k': 0, 's': 1}),
+        ):
+            expected = self._expected(letters_hotness)
+            self.assertEqual(expected, [self.fixture.words[i] for i in self.fixture.candidate_indices(letters_hotness)])
+            self.assertEqual(len(expected), self.fixture.count_valid_words(letters_hotness))
+
+    def test_refilter(self):
+        rng = random.Random(0)
+        for _ in range(30):
+            target = rng.choice(self.fixture.words)
+            session = self.fixture.new_session()
+            for _ in range(4):
+                guess = rng.choice(self.fixture.words)
+                session.update(guess, self.fixture.hotness(guess, target))
+                self.assertEqual(list(self.fixture.candidate_indices(session.letters_hotness)), list(session.valid))
+
+    def test_refilter_of_conflicting_updates(self):
+        rng = random.Random(1)
+        delta = HotnessDelta()
+        for _ in range(200):
+            target = rng.choice(self.fixture.words)
+            letters_hotness = LettersHotness()
+            valid = self.fixture.candidate_indices(letters_hotness)
+            for _ in range(5):
+                guess = rng.choice(self.fixture.words)
+                # half of the guesses get the hotness of another target, conflicting with the previous guesses
+                answer = target if rng.random() < 0.5 else rng.choice(self.fixture.words)
+                letters_hotness.update_word(guess, self.fixture.hotness(guess, answer), delta)
+                valid = self.fixture.refilter(valid, delta, letters_hotness)
+                self.assertEqual(list(self.fixture.candidate_indices(letters_hotness)), list(valid))
+
+    def test_filter_subset(self):
+        letters_hotness = LettersHotness({'a': [1]}, {'a': 1})
+        constraints = letters_hotness.constraints(self.number_of_letters)
+        subset = self.fixture.index.letter_position[a2i('b')][4]
+        actual = self.fixture.index.indices(self.fixture.index.filter(constraints, subset))
+
+        self.assertTrue(all(self.fixture.words[i][0] == 'a' and self.fixture.words[i][4] == 'b' for i in actual))
+
+
+class TrieTest(TestCase):
+
+    number_of_letters = SolverTest.number_of_letters
+    fixture = SolverTest.fixture
+    trie = Trie.from_words(fixture.words)
+
+    def test_index(self):
+        self.assertTrue(all(self.trie.index(w) == i for i, w in enumerate(self.fixture.words)))
+        for word in ('zzzzz', 'poin', 'pointe', 'po1nt', ''):
+            self.assertNotIn(word, self.trie)
+
+    def test_index_of_words_of_any_length(self):
+        words = ['ab', 'a', 'abc', 'b', 'ab', 'ba']
+        trie = Trie.from_words(words)
+
+        self.assertEqual([0, 1, 2, 3, 0, 5, -1, -1], [trie.index(w) for w in words + ['c', 'abcd']])
+
+    def test_candidates(self):
+        for letters_hotness in (
+            LettersHotness(),
+            LettersHotness({'e': [0], 'i': [0], 'n': [-3], 'r': [-1], 's': [0]}, {'e': 0, 'i': 0, 'n': 1, 'r': 1, 's': 0}),
+            LettersHotness({'a': [-4, -5], 'm': [-1, -2, -3, -4]}, {'a': 2, 'm': 1}),
+            LettersHotness({'l': [-1, 4], 'e': [2, 3], 'k': [0], 's': [5]}, {'l': 1, 'e': 2, 'k': 0, 's': 1}),
+        ):
+            self.assertEqual(list(self.fixture.candidate_indices(letters_hotness)),
+                             self.trie.candidates(letters_hotness.constraints(self.number_of_letters)))
+
+    def test_candidates_of_words_of_any_length(self):
+        words = ['abc', 'abcd', 'bcd', 'ab', 'cab', 'bad']
+        trie = Trie.from_words(words)
+        letters_hotness = LettersHotness({'b': [-1], 'd': [0]}, {'b': 1, 'd': 0})
+
+        self.assertEqual([0, 4], trie.candidates(letters_hotness.constraints(3)))
+
+    def test_candidates_visit_few_nodes_late_game(self):
+        session = self.fixture.new_session()
+        for guess in ('rinse', 'cloth'):
+            session.update(guess, self.fixture.hotness(guess, 'point'))
+        stats = Stats()
+
+        self.assertEqual(list(session.candidates), self.trie.candidates(
+            session.letters_hotness.constraints(self.number_of_letters), stats))
+        self.assertLess(stats.snapshot()['counters']['trie_nodes'] * 20, len(self.trie))
+
+    def test_is_valid_word_with_trie(self):
+        solver = Solver('data/words_dictionary.json', self.number_of_letters, verbose=False)
+        solver.load_trie()
+
+        self.assertTrue(solver.is_valid_word('point'))
+        self.assertFalse(solver.is_valid_word('zzzzz'))
+
+
+class ScoreSuggestionsTest(TestCase):
+
+    number_of_letters = SolverTest.number_of_letters
+    fixture = SolverTest.fixture
+
+    def _expected(self, letters_hotness, num_suggestions, candidates=None):
+        words = self.fixture.words if candidates is None else [self.fixture.words[i] for i in candidates]
+        return ranking.top_n(((self.fixture.score_word(w, letters_hotness), w) for w in words), num_suggestions)
+
+    def test_same_suggestions_as_scoring_every_word(self):
+        for history in ([], [('rinse', 'point')], [('rinse', 'today'), ('today', 'toady')], [('arrow', 'alarm')]):
+            session = self.fixture.new_session()
+            for guess, target in history:
+                session.update(guess, self.fixture.hotness(guess, target))
+            for num_suggestions in (1, 5, 30):
+                for candidates in (None, session.candidates):
+                    self.assertEqual(
+                        sorted(self._expected(session.letters_hotness, num_suggestions, candidates)),
+                        sorted(self.fixture.score_suggestions(session.letters_hotness, num_suggestions, candidates)))
+
+    def test_no_suggestions(self):
+        session = self.fixture.new_session()
+        session.update('rinse', self.fixture.hotness('rinse', 'point'))
+        for num_suggestions in (0, -1):
+            self.assertEqual([], self.fixture.score_suggestions(session.letters_hotness, num_suggestions))
+            self.assertEqual([], self.fixture.score_suggestions(session.letters_hotness, num_suggestions, session.candidates))
+
+    def test_same_suggestions_with_non_integral_weights(self):
+        solver = Solver('data/words_dictionary.json', self.number_of_letters, verbose=False,
+                        hotness_weights=tune.default_weights(self.number_of_letters, 0.3, 0.7))
+        session = solver.new_session()
+        session.update('rinse', solver.hotness('rinse', 'point'))
+
+        expected = ranking.top_n(((solver.score_word(w, session.letters_hotness), w) for w in solver.words), 10)
+        self.assertEqual(sorted(expected), sorted(solver.score_suggestions(session.letters_hotness, 10)))
+
+    def test_score_bounds(self):
+        letters_hotness = LettersHotness({'l': [-1, 4], 'e': [2, 3], 'k': [0], 's': [5]}, {'l': 1, 'e': 2, 'k': 0, 's': 1})
+        bounds = self.fixture.score_bounds(letters_hotness)
+
+        for i in self.fixture.candidate_indices(letters_hotness):
+            self.assertLessEqual(self.fixture.score_word(self.fixture.words[i], letters_hotness), bounds[i])
+
+    def test_fewer_score_word_calls(self):
+        solver = Solver('data/words_dictionary.json', self.number_of_letters, verbose=False, stats=True)
+        session = solver.new_session()
+        session.update('rinse', solver.hotness('rinse', 'point'))
+        session.suggestions(5)
+
+        counters = solver.stats.snapshot()['counters']
+        self.assertLess(counters['score_word'] * 10, len(session))
+
+    def test_late_game_scores_only_valid_words(self):
+        solver = Solver('data/words_dictionary.json', self.number_of_letters, verbose=False, stats=True)
+        session = solver.new_session()
+        for guess in ('rinse', 'cloth', 'dumpy'):
+            session.update(guess, solver.hotness(guess, 'point'))
+        self.assertLess(len(session.valid), 10)
+        for candidates in (None, session.candidates):
+            solver.stats.reset()
+            actual = solver.score_suggestions(session.letters_hotness, 10, candidates, session.valid)
+
+            self.assertEqual(sorted(self._expected(session.letters_hotness, 10, candidates)), sorted(actual))
+            self.assertEqual(len(session.valid), solver.stats.snapshot()['counters']['score_word'])
+
+    def test_same_suggestions_with_wrong_weight_above_valid_words(self):
+        weights = dict(self.fixture.hotness_weights)
+        weights[HotnessType.WRONG.value] = 6
+        solver = Solver('data/words_dictionary.json', self.number_of_letters, verbose=False, hotness_weights=weights)
+        session = solver.new_session()
+        session.update('rinse', solver.hotness('rinse', 'point'))
+        for candidates in (None, session.candidates):
+            expected = ranking.top_n(((solver.score_word(solver.words[i], session.letters_hotness), solver.words[i])
+                                      for i in (range(len(solver.words)) if candidates is None else candidates)), 10)
+            self.assertEqual(sorted(expected), sorted(solver.score_suggestions(session.letters_hotness, 10, candidates)))
+
+
+class SimulateTest(SmallDictionaryTestCase):
+
+    def test_play_game(self):
+        guesses, latencies = simulate.play_game(self.fixture, 'point')
+
+        self.assertTrue(1 <= guesses <= self.fixture.max_guesses)
+        self.assertEqual(guesses, len(latencies))
+
+    def test_play_game_with_first_guess(self):
+        guesses, latencies = simulate.play_game(self.fixture, 'point', first_guess='point')
+
+        self.assertEqual(1, guesses)
+        self.assertEqual([], latencies)
+
+    def test_simulate(self):
+        report = simulate.simulate(self.words_list_path, self.number_of_letters)
+
+        self.assertEqual(len(self.words), report.games)
+        self.assertEqual(report.games, sum(report.distribution.values()) + len(report.failed))
+        self.assertEqual(report.games, report.to_dict()['games'])
+
+    def test_simulate_is_reproducible_across_processes(self):
+        report = simulate.simulate(self.words_list_path, self.number_of_letters, sample=10, seed=1)
+        parallel_report = simulate.simulate(self.words_list_path, self.number_of_letters, sample=10, seed=1, processes=2)
+
+        self.assertEqual(10, report.games)
+        self.assertEqual(report.distribution, parallel_report.distribution)
+        self.assertEqual(report.failed, parallel_report.failed)
+
+    def test_simulate_invalid_answers(self):
+        with self.assertRaises(Exception) as context:
+            simulate.simulate(self.words_list_path, self.number_of_letters, answers=['point', 'zzzzz', 'pointy'],
+                              processes=2)
+
+        self.assertIn('zzzzz, pointy', str(context.exception))
+
+
+class WordCacheTest(SmallDictionaryTestCase):
+
+    def _write_dictionary(self, words_dict):
+        with open(self.words_list_path, 'w') as f:
+            json.dump(words_dict, f)
+
+    def test_cache_is_built(self):
+        directory = word_cache.cache_directory(self.words_list_path)
+        meta = word_cache.read_meta(directory)
+
+        self.assertEqual(len(self.words), meta['lengths']['5'])
+        self.assertTrue(os.path.exists(os.path.join(directory, meta['files']['5'])))
+
+    def test_load(self):
+        records, values = word_cache.load(self.words_list_path, self.number_of_letters)
+
+        self.assertEqual((len(self.words), self.number_of_letters), records.shape)
+        self.assertEqual(self.words[0], records[0].tobytes().decode())
+        self.assertEqual({}, values)
+
+    def test_load_words_by_length(self):
+        self._write_dictionary({'point': 1, 'at': 1, 'paints': 1, 'Paint': 1, 'boils': 2})
+        solver = Solver(self.words_list_path, self.number_of_letters)
+
+        self.assertEqual({'point': 1, 'boils': 2}, solver.words_dict)
+        self.assertEqual(['paints'], Solver(self.words_list_path, 6).words)
+
+    def test_iter_words_of_json(self):
+        with open(self.words_list_path, 'w') as f:
+            f.write('{\n  "point": 1,\n  "it\'s": 1,\n  "Nails": 1,\n  "paints": 2, "boils": 3,\n"a\\u00e9b": 1}\n')
+
+        self.assertEqual([('point', 1), ('paints', 2), ('boils', 3)], list(word_cache.iter_words(self.words_list_path)))
+        self.assertEqual([('paints', 2)], list(word_cache.iter_words(self.words_list_path, 6)))
+
+    def test_iter_words_of_json_across_chunks(self):
+        words = [f"{w}{c}" for w in self.words for c in 'abcdefghijklmnopqrstuvwxyz']
+        self._write_dictionary({w: 1 for w in words * 100})
+        original_chunk_size = word_cache.CHUNK_SIZE
+        word_cache.CHUNK_SIZE = 7
+        try:
+            self.assertEqual(words, [w for w, v in word_cache.iter_words(self.words_list_path)])
+        finally:
+            word_cache.CHUNK_SIZE = original_chunk_size
+
+    def test_iter_words_of_invalid_json(self):
+        with open(self.words_list_path, 'w') as f:
+            f.write('{"point": 1, "boils": [1, 2]}')
+
+        with self.assertRaises(ValueError):
+            list(word_cache.iter_words(self.words_list_path))
+
+    def test_solver_from_word_list(self):
+        path = os.path.join(self.directory.name, 'words.txt.gz')
+        with gzip.open(path, 'wt') as f:
+            f.write('\n'.join(self.words + ['at', 'Paint', '']))
+
+        self.assertEqual([(w, 1) for w in self.words + ['at']], list(word_cache.iter_words(path)))
+        self.assertEqual(self.words, Solver(path, self.number_of_letters).words)
+
+    def test_cache_is_rebuilt_when_source_changes(self):
+        self._write_dictionary({w: 1 for w in self.words + ['zesty']})
+
+        self.assertIn('zesty', Solver(self.words_list_path, self.number_of_letters).words_dict)
+
+    def test_cache_is_kept_when_only_modification_time_changes(self):
+        directory = word_cache.cache_directory(self.words_list_path)
+        sha1 = word_cache.read_meta(directory)['sha1']
+        os.utime(self.words_list_path, ns=(0, 0))
+        records, _ = word_cache.load(self.words_list_path, self.number_of_letters)
+
+        self.assertEqual(len(self.words), len(records))
+        self.assertEqual(0, word_cache.read_meta(directory)['mtime_ns'])
+        self.assertEqual(sha1, word_cache.read_meta(directory)['sha1'])
+
+    def test_rebuild_keeps_records_of_previous_meta(self):
+        directory = word_cache.cache_directory(self.words_list_path)
+        old_records, _ = word_cache.load(self.words_list_path, self.number_of_letters)
+        self._write_dictionary({w: 1 for w in ['zesty'] + self.words})
+        records, _ = word_cache.load(self.words_list_path, self.number_of_letters)
+
+        self.assertEqual(self.words[0], old_records[0].tobytes().decode())
+        self.assertEqual('zesty', records[0].tobytes().decode())
+        self.assertEqual([word_cache.read_meta(directory)['files']['5']],
+                         [name for name in os.listdir(directory) if name.endswith('.bin')])
+
+    def test_load_without_writable_cache(self):
+        self._write_dictionary({w: 1 for w in self.words + ['zesty']})
+        with mock.patch('word_cache.build', side_effect=OSError(30, 'Read-only file system')):
+            records, values = word_cache.load(self.words_list_path, self.number_of_letters)
+
+        self.assertEqual(self.words + ['zesty'], [r.tobytes().decode() for r in records])
+
+
+class SuggestionsCacheTest(SmallDictionaryTestCase):
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 2, 'maxsize': 2}, cache.info())
+
+    def test_disabled_lru_cache(self):
+        cache = LRUCache(0)
+        cache.put('a', 1)
+
+        self.assertEqual(0, len(cache))
+
+    def test_freeze(self):
+        letters_hotness = LettersHotness()
+        letters_hotness.update_word('paint', WordHotness('paint', [0, -2, 3, 0, 5]))
+        same_letters_hotness = LettersHotness(
+            {'p': [0], 'a': [-2], 'i': [3], 'n': [0], 't': [5]},
+            {'p': 0, 'a': 1, 'i': 1, 'n': 0, 't': 1},
+        )
+
+        self.assertEqual(letters_hotness.freeze(), same_letters_hotness.freeze())
+        self.assertEqual(hash(letters_hotness.freeze()), hash(same_letters_hotness.freeze()))
+        self.assertNotEqual(LettersHotness().freeze(), letters_hotness.freeze())
+        self.assertEqual(letters_hotness.hotness, LettersHotness.from_frozen(letters_hotness.freeze()).hotness)
+
+    def test_suggestions_are_cached(self):
+        first = self.fixture.new_session().suggestions(5)
+        second = self.fixture.new_session().suggestions(5)
+
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.fixture.suggestions_cache.hits)
+        self.assertEqual(1, self.fixture.suggestions_cache.misses)
+
+    def test_suggestions_cache_key(self):
+        session = self.fixture.new_session()
+        session.update('boils', self.fixture.hotness('boils', 'point'))
+        session.suggestions(5)
+        session.suggestions(5, ranking.ENTROPY)
+        session.suggestions(3)
+
+        self.assertEqual(3, self.fixture.suggestions_cache.misses)
+        self.assertEqual(0, self.fixture.suggestions_cache.hits)
+
+    def test_cached_suggestions_are_copies(self):
+        self.fixture.suggestions(LettersHotness(), 5).pop()
+
+        self.assertEqual(5, len(self.fixture.suggestions(LettersHotness(), 5)))
+
+
+class StrategyTreeTest(SmallDictionaryTestCase):
+
+    def _walk(self, tree, target):
+        node = 0
+        for guess_number in range(1, self.fixture.max_guesses + 1):
+            guess = tree.guess(node)
+            if guess == target:
+                return guess_number
+            node = tree.child(node, patterns.encode(self.fixture.hotness(guess, target).hotness))
+            if node is None:
+                return None
+
+    def test_build(self):
+        tree = strategy_tree.build(self.words_list_path, self.number_of_letters)
+
+        for target in self.words:
+            self.assertEqual(simulate.play_game(self.fixture, target)[0], self._walk(tree, target))
+
+    def test_build_in_parallel(self):
+        tree = strategy_tree.build(self.words_list_path, self.number_of_letters)
+        parallel_tree = strategy_tree.build(self.words_list_path, self.number_of_letters, processes=2)
+
+        self.assertEqual(list(tree.node_guess), list(parallel_tree.node_guess))
+        self.assertEqual(list(tree.child_pattern), list(parallel_tree.child_pattern))
+
+    def test_save_and_load(self):
+        tree = strategy_tree.build(self.words_list_path, self.number_of_letters, strategy=ranking.ENTROPY)
+        path = os.path.join(self.directory.name, 'tree.npz')
+        tree.save(path)
+        loaded = strategy_tree.StrategyTree.load(path, self.fixture)
+
+        self.assertEqual(len(tree), len(loaded))
+        self.assertEqual(ranking.ENTROPY, loaded.strategy)
+        for target in self.words:
+            self.assertEqual(self._walk(tree, target), self._walk(loaded, target))
+
+    def test_load_for_another_dictionary(self):
+        path = os.path.join(self.directory.name, 'tree.npz')
+        strategy_tree.build(self.words_list_path, self.number_of_letters).save(path)
+        with open(self.words_list_path, 'w') as f:
+            json.dump({w: 1 for w in self.words[1:]}, f)
+
+        with self.assertRaises(Exception):
+            Solver(self.words_list_path, self.number_of_letters).load_strategy_tree(path)
+
+    def test_load_for_another_solver(self):
+        path = os.path.join(self.directory.name, 'tree.npz')
+        strategy_tree.build(self.words_list_path, self.number_of_letters).save(path)
+        weights = dict(self.fixture.hotness_weights)
+        weights[1] = 6
+
+        with self.assertRaises(Exception):
+            Solver(self.words_list_path, self.number_of_letters, max_guesses=5).load_strategy_tree(path)
+        with self.assertRaises(Exception):
+            Solver(self.words_list_path, self.number_of_letters, hotness_weights=weights).load_strategy_tree(path)
+        with self.assertRaises(Exception):
+            self.fixture.load_strategy_tree(path, ranking.ENTROPY)
+        self.fixture.load_strategy_tree(path, ranking.SCORE)
+
+    def test_load_tuned_weights(self):
+        path = os.path.join(self.directory.name, 'tree.npz')
+        weights_path = os.path.join(self.directory.name, 'weights.json')
+        tune.save_weights(tune.default_weights(self.number_of_letters, 3, 2), weights_path, self.number_of_letters)
+        strategy_tree.build(self.words_list_path, self.number_of_letters, hotness_weights=weights_path).save(path)
+
+        Solver(self.words_list_path, self.number_of_letters, hotness_weights=weights_path).load_strategy_tree(path)
+        with self.assertRaises(Exception):
+            self.fixture.load_strategy_tree(path)
+
+    def test_session_follows_the_tree(self):
+        path = os.path.join(self.directory.name, 'tree.npz')
+        tree = strategy_tree.build(self.words_list_path, self.number_of_letters)
+        tree.save(path)
+        self.fixture.load_strategy_tree(path)
+        session = self.fixture.new_session()
+
+        self.assertEqual([(float('inf'), tree.guess(0))], session.suggestions(5))
+        self.assertEqual(0, self.fixture.suggestions_cache.misses)
+
+    def test_session_ignores_the_tree_of_another_strategy(self):
+        path = os.path.join(self.directory.name, 'tree.npz')
+        strategy_tree.build(self.words_list_path, self.number_of_letters).save(path)
+        self.fixture.load_strategy_tree(path)
+        session = self.fixture.new_session()
+
+        self.assertEqual(self.fixture.suggestions(session.letters_hotness, 5, strategy=ranking.ENTROPY),
+                         session.suggestions(5, ranking.ENTROPY))
+
+    def test_session_falls_back_when_leaving_the_tree(self):
+        path = os.path.join(self.directory.name, 'tree.npz')
+        tree = strategy_tree.build(self.words_list_path, self.number_of_letters)
+        tree.save(path)
+        self.fixture.load_strategy_tree(path)
+        session = self.fixture.new_session()
+        guess = next(w for w in self.words if w != tree.guess(0))
+        session.update(guess, self.fixture.hotness(guess, 'point'))
+
+        self.assertIsNone(session.node)
+        self.assertEqual(sorted(session.suggestions(5)), sorted(self.fixture.suggestions(session.letters_hotness, 5, session.candidates)))
+
+
+class ServerTest(SmallDictionaryTestCase, IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = server.SolverServer(self.fixture, idle_timeout=60, num_suggestions=3)
+        self.path = os.path.join(self.directory.name, 'solver.sock')
+        self.socket_server = await self.server.start(path=self.path)
+        self.reader, self.writer = await server.asyncio.open_unix_connection(self.path)
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        self.socket_server.close()
+        await self.socket_server.wait_closed()
+        self.server.stop()
+
+    async def _request(self, **request):
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    async def test_session(self):
+        session_id = (await self._request(op='create'))['session']
+        response = await self._request(op='guess', session=session_id, word='boils', hotness='x11xx', id=7)
+
+        session = self.fixture.new_session()
+        session.update('boils', self.fixture.hotness('boils', 'point'))
+        self.assertEqual(7, response['id'])
+        self.assertEqual(len(session), response['candidates'])
+        self.assertEqual(format_suggestions(session.suggestions(3)), response['suggestions'])
+        self.assertEqual(response['suggestions'], (await self._request(op='suggest', session=session_id))['suggestions'])
+
+    async def test_solved(self):
+        session_id = (await self._request(op='create'))['session']
+        response = await self._request(op='guess', session=session_id, word='point', hotness='11111')
+
+        self.assertTrue(response['solved'])
+
+    async def test_errors(self):
+        session_id = (await self._request(op='create'))['session']
+
+        self.assertIn('error', await self._request(op='suggest', session='unknown'))
+        self.assertIn('error', await self._request(op='guess', session=session_id, word='adfaf', hotness='xxxxx'))
+        self.assertIn('error', await self._request(op='unknown', session=session_id))
+        self.writer.write(b'not json\n')
+        self.assertIn('error', json.loads(await self.reader.readline()))
+        self.assertIn('error', await self._request(op='suggest', session=session_id, num_suggestions=0))
+        self.assertIn('error', await self._request(op='suggest', session=session_id, num_suggestions=-2))
+        self.assertIn('suggestions', await self._request(op='suggest', session=session_id))
+
+    async def test_request_too_long(self):
+        self.writer.write(b'{"op": "stats", "padding": "' + b'x' * (1 << 17) + b'"}\n')
+        self.assertIn('error', json.loads(await self.reader.readline()))
+
+        self.assertIn('sessions', await self._request(op='stats'))
+
+    async def test_close_and_stats(self):
+        session_id = (await self._request(op='create'))['session']
+        self.assertEqual(1, (await self._request(op='stats'))['sessions'])
+
+        self.assertTrue((await self._request(op='close', session=session_id))['closed'])
+        self.assertEqual(0, (await self._request(op='stats'))['sessions'])
+
+    async def test_evict_idle_sessions(self):
+        store = self.server.store
+        session_id = store.create()
+        store.create()
+        store.get(session_id)
+
+        self.assertEqual(0, store.evict_idle())
+        self.assertEqual(2, store.evict_idle(server.time.monotonic() + 61))
+        self.assertEqual(0, len(store))
+
+
+class BatchSuggestionsTest(TestCase):
+
+    fixture = SolverTest.fixture
+
+    histories = [
+        [],
+        [('rinse', [-1, 0, 0, 0, 0])],
+        [('rinse', '?xxxx'), ('today', 'x?x?x')],
+        [('rinse', WordHotness('rinse', [-1, 0, 0, 0, 0])), ('today', [0, -2, 0, -4, 0]), ('arrow', [-1, -2, 0, 4, 0])],
+        [('paint', [0, 0, -3, 4, 5])],
+        [('rinse', [-1, 0, 0, 0, 0])],
+    ]
+
+    def _letters_hotness(self, history):
+        letters_hotness = LettersHotness()
+        for word, hotness in history:
+            if isinstance(hotness, str):
+                hotness = self.fixture.parse_hotness(word, hotness)
+            elif isinstance(hotness, list):
+                hotness = WordHotness(word, hotness)
+            letters_hotness.update_word(word, hotness)
+        return letters_hotness
+
+    def test_score_words(self):
+        for history in self.histories:
+            letters_hotness = self._letters_hotness(history)
+            scores = self.fixture.score_words(letters_hotness)
+            for i in range(0, len(self.fixture.words), 7):
+                self.assertEqual(self.fixture.score_word(self.fixture.words[i], letters_hotness), scores[i])
+
+    def test_score_words_subset(self):
+        letters_hotness = self._letters_hotness(self.histories[3])
+        indices = self.fixture.candidate_indices(letters_hotness)
+
+        self.assertEqual([self.fixture.score_word(self.fixture.words[i], letters_hotness) for i in indices],
+                         list(self.fixture.score_words(letters_hotness, indices)))
+
+    def _session_suggestions(self, history, num_suggestions):
+        session = self.fixture.new_session()
+        for word, hotness in history:
+            if isinstance(hotness, str):
+                hotness = self.fixture.parse_hotness(word, hotness)
+            elif isinstance(hotness, list):
+                hotness = WordHotness(word, hotness)
+            session.update(word, hotness)
+        return sorted(session.suggestions(num_suggestions))
+
+    def test_batch_suggestions(self):
+        expected = [self._session_suggestions(history, 10) for history in self.histories]
+        actual = self.fixture.batch_suggestions(self.histories, 10)
+
+        self.assertEqual(expected, [sorted(suggestions) for suggestions in actual])
+
+    def test_batch_suggestions_of_random_games(self):
+        rng = random.Random(3)
+        histories = []
+        for _ in range(60):
+            target = rng.choice(self.fixture.words)
+            history = []
+            for _ in range(rng.randint(0, 3)):
+                word = rng.choice(self.fixture.words)
+                # some games get the hotness of another target, conflicting with the previous guesses
+                history.append((word, self.fixture.hotness(word, target if rng.random() < 0.8 else rng.choice(self.fixture.words))))
+            histories.append(history)
+        solver = Solver('data/words_dictionary.json', self.fixture.number_of_letters, verbose=False)
+        actual = solver.batch_suggestions(histories, 5)
+
+        for history, suggestions in zip(histories, actual):
+            self.assertEqual(self._session_suggestions(history, 5), sorted(suggestions))
+        self.assertEqual(actual, solver.batch_suggestions(histories, 5))
+
+    def test_top_n_from_scores(self):
+        words = ['d', 'b', 'a', 'e', 'c', 'f']
+        scores = ranking.np.array([1, 0, 1, 2, 1, float('-inf')])
+        for num_suggestions in range(1, 8):
+            expected = ranking.top_n(zip(scores.tolist(), words), num_suggestions)
+            actual = ranking.top_n_from_scores(words, ranking.np.arange(len(words)), scores, num_suggestions)
+            self.assertEqual(sorted(expected), sorted(actual))
+
+
+class StatsTest(SmallDictionaryTestCase):
+
+    def test_stats_are_disabled_by_default(self):
+        self.assertIsNone(self.fixture.stats)
+        self.assertEqual(self.fixture.new_session().suggestions(3), Solver(self.words_list_path, stats=True).new_session().suggestions(3))
+
+    def test_stats_of_a_game(self):
+        solver = Solver(self.words_list_path, self.number_of_letters, stats=True)
+        session = solver.new_session()
+        session.update('rinse', solver.hotness('rinse', 'point'))
+        session.suggestions(3)
+        session.suggestions(3)
+
+        snapshot = solver.stats.snapshot()
+        counters, timers = snapshot['counters'], snapshot['timers']
+        self.assertEqual(1, counters['load_dictionary'])
+        self.assertEqual(1, counters['update_word'])
+        self.assertEqual(2, counters['filter_candidates'])
+        self.assertEqual(len(session), counters['score_word'] + counters['score_word_pruned'])
+        self.assertEqual(min(3, len(session)), counters['heap_push'])
+        self.assertEqual(1, counters['suggestions_cache_misses'])
+        self.assertEqual(1, counters['suggestions_cache_hits'])
+        self.assertGreater(timers['score_suggestions'], 0)
+        self.assertIn('score_word', str(solver.stats))
+
+        solver.stats.reset()
+        self.assertEqual({'counters': {}, 'timers': {}}, solver.stats.snapshot())
+
+
+class BenchTest(SmallDictionaryTestCase):
+
+    def test_synthetic_words(self):
+        words = bench.synthetic_words(100, self.number_of_letters, random.Random(0))
+
+        self.assertEqual(100, len(set(words)))
+        self.assertTrue(all(len(w) == self.number_of_letters and w.isalpha() for w in words))
+        self.assertEqual(words, bench.synthetic_words(100, self.number_of_letters, random.Random(0)))
+
+    def test_sample_words(self):
+        words = bench.sample_words(self.words_list_path, 5, self.number_of_letters, random.Random(0))
+
+        self.assertEqual(5, len(words))
+        self.assertEqual(sorted(words, key=self.words.index), words)
+        with self.assertWarns(UserWarning):
+            self.assertEqual(self.words, bench.sample_words(self.words_list_path, 100, self.number_of_letters, random.Random(0)))
+
+    def test_bench_solver(self):
+        results = bench.bench_solver(self.fixture, len(self.words), repeat=3, min_time=0, samples=2)
+
+        self.assertEqual({f"{name}/{len(self.words)}/{stage}" for name in bench.BENCHMARKS for stage in bench.STAGES},
+                         set(results))
+        self.assertTrue(all(len(runs) == 3 and 0 < runs[0] and runs == sorted(runs) for runs in results.values()))
+
+    def test_compare(self):
+        baseline = {'version': bench.VERSION, 'dictionary': 'synthetic', 'number_of_letters': 5,
+                    'sizes': {'1000': 1000, '5000': 5000}, 'results': {'a': 1.0, 'b': 1.0, 'c': 1.0}}
+        report = {'version': bench.VERSION, 'dictionary': 'synthetic', 'number_of_letters': 5,
+                  'sizes': {'1000': 1000}, 'results': {'a': 1.1, 'b': 2.0, 'd': 5.0}}
+
+        self.assertEqual([('b', 1.0, 2.0, 2.0)], bench.compare(report, baseline, 0.25))
+        self.assertEqual([('b', 1.0, 2.0, 2.0), ('a', 1.0, 1.1, 1.1)], bench.compare(report, baseline, 0.05))
+        # slower medians within the spread of the runs are noise
+        noisy = dict(report, ranges={'a': [0.9, 1.2], 'b': [1.5, 2.5]})
+        self.assertEqual([('b', 1.0, 2.0, 2.0)], bench.compare(noisy, dict(baseline, ranges={'b': [0.9, 1.4]}), 0.05))
+        self.assertEqual([], bench.compare(noisy, dict(baseline, ranges={'b': [0.9, 1.6]}), 0.05))
+        with self.assertRaises(Exception):
+            bench.compare(dict(report, dictionary='words_dictionary.json'), baseline)
+        with self.assertRaises(Exception):
+            bench.compare(dict(report, number_of_letters=6), baseline)
+        with self.assertRaises(Exception):
+            bench.compare(dict(report, sizes={'5000': 4000}), baseline)
+
+
+class TuneTest(SmallDictionaryTestCase):
+
+    def test_save_and_load_weights(self):
+        path = os.path.join(self.directory.name, 'weights.json')
+        weights = tune.default_weights(self.number_of_letters, 3, 0.5)
+        tune.save_weights(weights, path, self.number_of_letters, cost=4.0)
+
+        self.assertEqual(weights, tune.load_weights(path, self.number_of_letters))
+        self.assertEqual(weights, Solver(self.words_list_path, self.number_of_letters, hotness_weights=path).hotness_weights)
+        with self.assertRaises(Exception):
+            tune.load_weights(path, 6)
+
+    def test_load_hotness_weights_drops_cached_suggestions(self):
+        path = os.path.join(self.directory.name, 'weights.json')
+        tune.save_weights(tune.default_weights(self.number_of_letters, 1, 3), path, self.number_of_letters)
+        self.fixture.new_session().suggestions(3)
+        self.fixture.load_hotness_weights(path)
+
+        self.assertEqual(0, len(self.fixture.suggestions_cache))
+        self.assertEqual(3, self.fixture.hotness_weights[-2])
+
+    def test_set_hotness_weights_drops_cached_suggestions(self):
+        session = self.fixture.new_session()
+        session.update('rinse', self.fixture.hotness('rinse', 'point'))
+        session.suggestions(3)
+        weights = tune.default_weights(self.number_of_letters, 1, 30)
+        self.fixture.hotness_weights = weights
+
+        self.assertEqual(0, len(self.fixture.suggestions_cache))
+        self.assertEqual(sorted(Solver(self.words_list_path, self.number_of_letters, hotness_weights=weights)
+                                .suggestions(session.letters_hotness, 3, session.candidates)),
+                         sorted(session.suggestions(3)))
+        with self.assertRaises(TypeError):
+            self.fixture.hotness_weights[1] = 0
+
+    def test_evaluate(self):
+        report = simulate.simulate(self.words_list_path, self.number_of_letters)
+        expected = (sum(g * n for g, n in report.distribution.items()) + 7 * len(report.failed)) / report.games
+
+        with tune.Tuner(self.words_list_path, self.number_of_letters, patterns_dir=self.directory.name) as tuner:
+            self.assertAlmostEqual(expected, tuner.evaluate(tune.default_weights(self.number_of_letters)))
+            self.assertEqual(1, len(tuner.costs))
+
+    def test_search(self):
+        with tune.Tuner(self.words_list_path, self.number_of_letters, patterns_dir=self.directory.name) as tuner:
+            default_cost = tuner.evaluate(tune.default_weights(self.number_of_letters))
+            weights, cost = tuner.search(tuner.grid([1, 5], [1]), step=1, min_step=1)
+
+            self.assertLessEqual(cost, default_cost)
+            self.assertEqual(cost, tuner.evaluate(weights))
+
+    def test_invalid_answers(self):
+        with self.assertRaises(Exception) as context:
+            tune.Tuner(self.words_list_path, self.number_of_letters, answers=['rinse', 'zzzzz'], processes=2,
+                       patterns_dir=None)
+
+        self.assertIn('zzzzz', str(context.exception))
+
+    def test_parallel_evaluation(self):
+        candidates = [tune.default_weights(self.number_of_letters, 5, 1), tune.default_weights(self.number_of_letters, 1, 5)]
+        with tune.Tuner(self.words_list_path, self.number_of_letters, patterns_dir=self.directory.name) as tuner:
+            expected = tuner.evaluate_many(candidates)
+        with tune.Tuner(self.words_list_path, self.number_of_letters, processes=2, patterns_dir=self.directory.name) as tuner:
+            self.assertEqual(expected, tuner.evaluate_many(candidates))
+
+
+class MultiBoardTest(SmallDictionaryTestCase):
+
+    def _session(self, histories):
+        session = self.fixture.new_multiboard_session(len(histories))
+        for turn in range(len(histories[0])):
+            guess = histories[0][turn][0]
+            session.update(guess, [self.fixture.hotness(guess, target) for _, target in (h[turn] for h in histories)])
+        return session
+
+    def test_one_board_is_ranked_like_a_game_session(self):
+        session = self._session([[('rinse', 'point')]])
+        board = session.boards[0]
+
+        expected = self.fixture.partition_suggestions(board.letters_hotness, 5, board.candidates, ranking.ENTROPY)
+        self.assertEqual(sorted(expected), sorted(session.suggestions(5, ranking.ENTROPY, all_words=True)))
+
+    def test_scores_are_summed_over_boards(self):
+        session = self._session([[('rinse', 'point')], [('rinse', 'alarm')]])
+        suggestions = session.suggestions(len(self.words), ranking.EXPECTED_SIZE)
+
+        union = np.unique(np.concatenate([board.candidates for board in session.boards]))
+        expected = sum(ranking.rank(self.fixture.words_matrix, self.fixture.words_letters, None, union, board.candidates,
+                                    ranking.EXPECTED_SIZE) for board in session.boards)
+        self.assertEqual(len(union), len(suggestions))
+        for score, word in suggestions:
+            self.assertAlmostEqual(expected[list(union).index(self.fixture.word_indices[word])], score)
+
+    def test_board_left_with_one_candidate_is_guessed(self):
+        session = self._session([[('brace', 'bread')], [('brace', 'point')]])
+
+        self.assertEqual(1, len(session.boards[0]))
+        self.assertEqual('bread', max(session.suggestions(1))[1])
+
+    def test_update(self):
+        session = self._session([[('point', 'point')], [('point', 'paint')]])
+
+        self.assertEqual([True, False], session.solved)
+        self.assertEqual(['point'], session.guesses)
+        with self.assertRaises(AssertionError):
+            session.update('paint', [])
+
+    def test_solve(self):
+        for targets in (['point', 'paint'], ['slice', 'angry', 'leeks', 'alarm']):
+            solved_at, guesses = multiboard.solve(self.fixture, targets)
+
+            self.assertTrue(all(n is not None for n in solved_at))
+            self.assertEqual(max(solved_at), len(guesses))
+            self.assertEqual(sorted(targets), sorted(guesses[n - 1] for n in solved_at))
+
+
+class PrefetchTest(SmallDictionaryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.fixture = Solver(self.words_list_path, self.number_of_letters, verbose=False, stats=True)
+
+    def test_update_returns_prefetched_session(self):
+        session = self.fixture.new_session()
+        expected = session.copy()
+        word_hotness = self.fixture.hotness('rinse', 'point')
+        expected.update('rinse', word_hotness)
+        with prefetch.Prefetcher(self.fixture, 3) as prefetcher:
+            prefetcher.guess(session, 'rinse')
+            actual = prefetcher.update(session, 'rinse', word_hotness)
+
+        self.assertEqual([], session.guesses)
+        self.assertEqual(['rinse'], actual.guesses)
+        self.assertEqual(list(expected.candidates), list(actual.candidates))
+        self.assertEqual(expected.letters_hotness.freeze(), actual.letters_hotness.freeze())
+        self.assertEqual(1, self.fixture.stats.snapshot()['counters']['prefetch_hits'])
+
+        # the suggestions of the prefetched session were cached in the background
+        self.fixture.stats.reset()
+        self.assertEqual(sorted(expected.suggestions(3)), sorted(actual.suggestions(3)))
+        self.assertEqual(2, self.fixture.stats.snapshot()['counters']['suggestions_cache_hits'])
+
+    def test_update_of_guess_not_prefetched(self):
+        session = self.fixture.new_session()
+        with prefetch.Prefetcher(self.fixture, 3) as prefetcher:
+            prefetcher.guesses(session, ['nails', 'point'], 'paint')
+            actual = prefetcher.update(session, 'rinse', self.fixture.hotness('rinse', 'paint'))
+
+        self.assertEqual([], session.guesses)
+        self.assertEqual(['rinse'], actual.guesses)
+        self.assertEqual(1, self.fixture.stats.snapshot()['counters']['prefetch_misses'])
+
+    def test_suggest(self):
+        inputs = iter(['rinse', 'x??xx', 'click', 'xx1xx', 'paint', '11111'])
+        with mock.patch('builtins.input', lambda prompt: next(inputs)), mock.patch('builtins.print'):
+            self.fixture.suggest(3)
+
+        self.assertEqual(2, self.fixture.stats.snapshot()['counters']['prefetch_hits'])
+
+
+class SnapshotTest(SmallDictionaryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.directory.name, 'solver.snapshot')
+
+    def _session(self, guesses, target):
+        session = self.fixture.new_session()
+        for guess in guesses:
+            session.update(guess, self.fixture.hotness(guess, target))
+        return session
+
+    def test_load_dictionary_tables(self):
+        self.fixture.load_trie()
+        snapshot.save(self.path, self.fixture)
+        solver, sessions = snapshot.load(self.path)
+
+        self.assertEqual({}, sessions)
+        self.assertEqual(self.fixture.words, solver.words)
+        self.assertEqual(self.fixture.word_indices, solver.word_indices)
+        self.assertTrue((self.fixture.words_matrix == solver.words_matrix).all())
+        self.assertTrue(solver.words_matrix.flags['F_CONTIGUOUS'])
+        self.assertTrue((self.fixture.words_letters == solver.words_letters).all())
+        self.assertEqual(self.fixture.index.letter_position, solver.index.letter_position)
+        self.assertEqual(self.fixture.index.letter_count, solver.index.letter_count)
+        self.assertEqual(self.fixture.hotness_weights, solver.hotness_weights)
+        self.assertTrue(all(solver.trie.index(w) == i for i, w in enumerate(self.words)))
+
+    def test_resume_sessions(self):
+        saved = {'1': self._session(['rinse'], 'point'), '2': self.fixture.new_session()}
+        snapshot.save(self.path, self.fixture, saved)
+        solver, sessions = snapshot.load(self.path)
+
+        self.assertEqual(['1', '2'], list(sessions))
+        for session_id, session in sessions.items():
+            self.assertEqual(saved[session_id].guesses, session.guesses)
+            self.assertEqual(list(saved[session_id].candidates), list(session.candidates))
+            self.assertEqual(saved[session_id].letters_hotness.freeze(), session.letters_hotness.freeze())
+        sessions['1'].update('paint', solver.hotness('paint', 'point'))
+        self.assertEqual(list(self._session(['rinse', 'paint'], 'point').candidates), list(sessions['1'].candidates))
+
+    def test_load_cached_suggestions(self):
+        session = self._session(['rinse'], 'point')
+        expected = session.suggestions(3, ranking.ENTROPY)
+        snapshot.save(self.path, self.fixture, {'1': session})
+        solver, sessions = snapshot.load(self.path)
+
+        self.assertEqual(1, len(solver.suggestions_cache))
+        self.assertEqual(sorted(expected), sorted(sessions['1'].suggestions(3, ranking.ENTROPY)))
+        self.assertEqual(1, solver.suggestions_cache.hits)
+
+    def test_load_invalid_snapshot(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a snapshot')
+        with self.assertRaises(Exception):
+            snapshot.load(self.path)
+
+        snapshot.save(self.path, self.fixture)
+        with mock.patch('snapshot.VERSION', snapshot.VERSION + 1):
+            with self.assertRaises(Exception):
+                snapshot.load(self.path)
+
+    def test_restore_server_sessions(self):
+        store = server.SessionStore(self.fixture)
+        store.restore({'1': self._session(['rinse'], 'point'), '7': self.fixture.new_session()})
+
+        self.assertEqual(2, len(store))
+        self.assertEqual(['rinse'], store.get('1').session.guesses)
+        self.assertEqual('8', store.create())
+
+
+class BatchTest(SmallDictionaryTestCase):
+
+    lines = ['[["rinse", "??x11"]]\n',
+             '\n',
+             '{"id": "a", "history": [["rinse", "x??xx"], ["paint", [1, 2, 3, 0, 0]]]}\n',
+             '[["zzzzz", "xxxxx"]]\n',
+             'not json\n',
+             '[]\n']
+
+    def _expected(self, history, k=10, strategy=ranking.SCORE):
+        session = self.fixture.new_session()
+        for word, hotness in history:
+            hotness = self.fixture.parse_hotness(word, hotness) if isinstance(hotness, str) else WordHotness(word, hotness)
+            session.update(word, hotness)
+        return format_suggestions(session.suggestions(k, strategy))
+
+    def _run(self, **kwargs):
+        output = io.StringIO()
+        count = batch.run(self.words_list_path, [io.StringIO(''.join(self.lines))], output, **kwargs)
+        return count, [json.loads(line) for line in output.getvalue().splitlines()]
+
+    def test_process_lines(self):
+        responses = [json.loads(line) for line in
+                     batch.process_lines(self.fixture, [line for line in self.lines if line.strip()]).splitlines()]
+
+        self.assertEqual(5, len(responses))
+        self.assertEqual({'suggestions': self._expected([('rinse', '??x11')])}, responses[0])
+        self.assertEqual('a', responses[1]['id'])
+        self.assertEqual(self._expected([('rinse', 'x??xx'), ('paint', [1, 2, 3, 0, 0])]), responses[1]['suggestions'])
+        self.assertIn('error', responses[2])
+        self.assertIn('error', responses[3])
+        self.assertEqual({'suggestions': self._expected([])}, responses[4])
+
+    def test_process_lines_with_strategy(self):
+        responses = [json.loads(line) for line in
+                     batch.process_lines(self.fixture, ['[["rinse", "x??xx"]]'], 3, ranking.ENTROPY).splitlines()]
+
+        self.assertEqual([{'suggestions': self._expected([('rinse', 'x??xx')], 3, ranking.ENTROPY)}], responses)
+
+    def test_run_keeps_input_order(self):
+        count, responses = self._run(chunk_size=2)
+        parallel_count, parallel_responses = self._run(chunk_size=1, processes=2, window=2)
+
+        self.assertEqual(5, count)
+        self.assertEqual(5, parallel_count)
+        self.assertEqual(responses, parallel_responses)
+        self.assertEqual('a', responses[1]['id'])
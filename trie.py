@@ -0,0 +1,156 @@
+import argparse
+import sys
+from array import array
+import numpy as np
+from util import a2i
+
+
+class Trie:
+
+    def __init__(self, child_start, child_letters, word_index):
+        """
+        Flat trie of a dictionary, node 0 is the root and nodes are numbered breadth first.
+        The edges of node i are child_letters[child_start[i]:child_start[i+1]], sorted, and edge e leads to node e + 1.
+        word_index[i] is the index of the word ending at node i, -1 if no word ends there.
+
+        :param child_start: array('I')
+        :param child_letters: bytes of letter indices, see `util.a2i`
+        :param word_index: array('i')
+        """
+        self.child_start = child_start
+        self.child_letters = child_letters
+        self.word_index = word_index
+
+    @classmethod
+    def from_words(cls, words):
+        """
+        :param words: list of lowercase words of any length, a word index is its position in `words`
+        :return: Trie
+        """
+        number_of_words = len(words)
+        if number_of_words == 0:
+            return cls(array('I', [0, 0]), b'', array('i', [-1]))
+        order = sorted(range(number_of_words), key=words.__getitem__)
+        lengths = np.array([len(words[i]) for i in order], dtype=np.int64)
+        max_length = int(lengths.max())
+        # letters of the sorted words, 0 past their end
+        matrix = np.zeros((number_of_words, max_length), dtype=np.uint8)
+        buffer = np.frombuffer(''.join(words[i] for i in order).encode('ascii'), dtype=np.uint8)
+        rows = np.repeat(np.arange(number_of_words), lengths)
+        columns = np.arange(len(buffer)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        matrix[rows, columns] = buffer - ord('a') + 1
+
+        # length of the prefix shared with the previous word, a node is created by the first word of its prefix
+        common = np.zeros(number_of_words, dtype=np.int64)
+        if number_of_words > 1:
+            differ = matrix[1:] != matrix[:-1]
+            common[1:] = np.where(differ.any(axis=1), differ.argmax(axis=1), max_length)
+
+        parents, letters = [], []
+        node = np.zeros(number_of_words, dtype=np.int64)
+        number_of_nodes = 1
+        for depth in range(max_length):
+            has_letter = lengths > depth
+            new = has_letter & (common <= depth)
+            parents.append(node[new])
+            letters.append(matrix[new, depth] - 1)
+            child = number_of_nodes - 1 + np.cumsum(new)
+            number_of_nodes += int(new.sum())
+            node = np.where(has_letter, child, node)
+
+        parents = np.concatenate(parents)
+        child_start = np.zeros(number_of_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parents, minlength=number_of_nodes), out=child_start[1:])
+        word_index = np.full(number_of_nodes, -1, dtype=np.int64)
+        # the first of duplicated words keeps the node
+        word_index[node[::-1]] = np.array(order[::-1], dtype=np.int64)
+        return cls(array('I', child_start.astype(np.uint32).tobytes()), np.concatenate(letters).tobytes(),
+                   array('i', word_index.astype(np.int32).tobytes()))
+
+    def index(self, word):
+        """
+        :return: index of `word`, -1 if it is not in the trie
+        """
+        child_start, child_letters = self.child_start, self.child_letters
+        node = 0
+        for letter in word:
+            idx = a2i(letter)
+            if not 0 <= idx < 26:
+                return -1
+            edge = child_letters.find(idx, child_start[node], child_start[node + 1])
+            if edge < 0:
+                return -1
+            node = edge + 1
+        return self.word_index[node]
+
+    def __contains__(self, word):
+        return self.index(word) >= 0
+
+    def candidates(self, constraints, stats=None):
+        """
+        Indices of the words of `constraints.number_of_letters` letters valid given `constraints`, sorted.
+        The subtree of a letter is skipped when its position or count is excluded, or when the positions left
+        are too few for the letters still required.
+
+        :param constraints: solver.Constraints
+        :param stats: stats.Stats counting the nodes visited, or None
+        :return: list of word indices
+        """
+        number_of_letters = constraints.number_of_letters
+        positions, min_count, max_count = constraints.positions, constraints.min_count, constraints.max_count
+        child_start, child_letters, word_index = self.child_start, self.child_letters, self.word_index
+        counts = [0] * 26
+        res = []
+        visits = 0
+
+        def visit(node, depth, missing):
+            nonlocal visits
+            visits += 1
+            if depth == number_of_letters:
+                if word_index[node] >= 0:
+                    res.append(word_index[node])
+                return
+            mask = positions[depth]
+            left = number_of_letters - depth - 1
+            for edge in range(child_start[node], child_start[node + 1]):
+                letter = child_letters[edge]
+                if not mask >> letter & 1:
+                    continue
+                count = counts[letter] + 1
+                if count > max_count[letter]:
+                    continue
+                child_missing = missing - 1 if count <= min_count[letter] else missing
+                if child_missing > left:
+                    continue
+                counts[letter] = count
+                visit(edge + 1, depth + 1, child_missing)
+                counts[letter] = count - 1
+
+        if sum(min_count) <= number_of_letters:
+            visit(0, 0, sum(min_count))
+        if stats is not None:
+            stats.add('trie_nodes', visits)
+        res.sort()
+        return res
+
+    def __len__(self):
+        return len(self.word_index)
+
+    def nbytes(self):
+        return self.child_start.itemsize * len(self.child_start) + len(self.child_letters) + \
+            self.word_index.itemsize * len(self.word_index)
+
+
+if __name__ == '__main__':
+    import word_cache
+
+    parser = argparse.ArgumentParser(description="Size of the trie of every word of a dictionary")
+    parser.add_argument('-d', '--dictionary', default='data/words_dictionary.json')
+    args = parser.parse_args()
+
+    words = [word for word, _ in word_cache.iter_words(args.dictionary)]
+    trie = Trie.from_words(words)
+    words_dict = dict.fromkeys(words, 1)
+    dict_size = sys.getsizeof(words_dict) + sum(sys.getsizeof(w) for w in words_dict)
+    print(f"{len(words)} words, {len(trie)} nodes: trie {trie.nbytes() / 2 ** 20:.1f} MiB, "
+          f"dict {dict_size / 2 ** 20:.1f} MiB")
@@ -0,0 +1,247 @@
+import argparse
+import json
+import multiprocessing
+import random
+import time
+import numpy as np
+import ranking
+from simulate import check_answers, play_game, first_guess
+from solver import HotnessType
+from worker import init_worker
+
+
+def default_weights(number_of_letters, correct=5, misplaced=1):
+    """
+    Hotness weights of `Solver`: `correct` for a letter at a known position, `misplaced` for a letter in the word
+    at an unknown position
+    """
+    weights = {i: correct for i in range(1, number_of_letters + 1)}
+    weights.update({-i: misplaced for i in range(1, number_of_letters + 1)})
+    weights.update({HotnessType.WRONG.value: float('-inf'), None: 0})
+    return weights
+
+
+def tuned_keys(number_of_letters):
+    # the weight of a wrong letter makes a word invalid and is not tuned
+    return [i for i in range(1, number_of_letters + 1)] + [-i for i in range(1, number_of_letters + 1)]
+
+
+def save_weights(weights, path, number_of_letters, **metadata):
+    """
+    Write hotness weights as JSON, the keys None and -inf values are written as "null" and -Infinity
+    """
+    data = dict(metadata, number_of_letters=number_of_letters,
+                weights={'null' if k is None else str(k): v for k, v in weights.items()})
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def load_weights(path, number_of_letters=None):
+    """
+    Hotness weights written by `save_weights`
+
+    :param number_of_letters: raise if the weights were tuned for words of another length
+    :return: {hotness: weight}
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if number_of_letters is not None and data['number_of_letters'] != number_of_letters:
+        raise Exception(f"Weights {path} are for {data['number_of_letters']}-letter words, not {number_of_letters}")
+    return {None if k == 'null' else int(k): float(v) for k, v in data['weights'].items()}
+
+
+_worker = {}
+
+
+def _init_worker(solver_args, patterns_dir, cache_size, build=False):
+    init_worker(_worker, solver_args, {'cache_size': cache_size}, patterns_dir, build, key=None)
+
+
+def _evaluate_worker(weights, answers):
+    """
+    :return: total number of guesses of the games against `answers`, see `Tuner`
+    """
+    solver = _worker['solver']
+    key = tuple(sorted(weights.items(), key=repr))
+    if _worker['key'] != key:
+        # setting the weights drops the suggestions cached for other weights, those of these weights are kept
+        # for the next chunks
+        solver.hotness_weights = weights
+        _worker['key'] = key
+        _worker['first_guess'] = first_guess(solver)
+
+    cost = 0
+    for target in answers:
+        guesses, _ = play_game(solver, target, ranking.SCORE, _worker['first_guess'])
+        cost += solver.max_guesses + 1 if guesses is None else guesses
+    return cost
+
+
+class Tuner:
+
+    def __init__(self, words_list_path, number_of_letters=5, max_guesses=6, answers=None, processes=1,
+                 patterns_dir='data', sample=None, seed=None, cache_size=1 << 16):
+        """
+        Search of the hotness weights solving games in the fewest guesses.
+        The cost of weights is the mean number of guesses of the games played against `answers` with the top
+        `ranking.SCORE` suggestion, a lost game counting `max_guesses + 1`. Costs are memoized by weights.
+
+        The answers of an evaluation are split in chunks played by a pool of `processes` workers, each loading its
+        own Solver. The pattern matrix, which does not depend on the weights, is built once in `patterns_dir` and
+        memory mapped by every worker, and each worker keeps its suggestions cached while the weights are unchanged.
+
+        :param answers: list of answers, default to every word of the dictionary, each must be a word of the dictionary
+        :param patterns_dir: directory of the pattern matrix, None to compute the hotness of each guess
+        :param sample: number of answers to sample, None for all answers
+        :param cache_size: size of the suggestions cache of each worker
+        """
+        solver_args = (words_list_path, number_of_letters, max_guesses)
+        self.number_of_letters = number_of_letters
+        self.max_guesses = max_guesses
+        self.processes = processes
+        self.costs = {}
+        _init_worker(solver_args, patterns_dir, cache_size, build=True)
+        solver = _worker['solver']
+        if answers is None:
+            answers = list(solver.words)
+        check_answers(solver, answers)
+        if sample is not None:
+            answers = random.Random(seed).sample(answers, min(sample, len(answers)))
+        self.answers = answers
+        number_of_chunks = min(len(answers), processes * 4)
+        self.chunks = [answers[i::number_of_chunks] for i in range(number_of_chunks)]
+        self.pool = None
+        if processes > 1:
+            self.pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                             initargs=(solver_args, patterns_dir, cache_size))
+
+    def _key(self, weights):
+        return tuple(weights[k] for k in tuned_keys(self.number_of_letters))
+
+    def evaluate_many(self, candidates):
+        """
+        Costs of many weights, the games of all of them are spread over the pool at once
+
+        :param candidates: list of {hotness: weight}
+        :return: list of costs
+        """
+        todo = []
+        for weights in candidates:
+            if self._key(weights) not in self.costs and all(self._key(weights) != self._key(w) for w in todo):
+                todo.append(weights)
+
+        tasks = [(weights, chunk) for weights in todo for chunk in self.chunks]
+        if self.pool is None:
+            results = [_evaluate_worker(*task) for task in tasks]
+        else:
+            results = self.pool.starmap(_evaluate_worker, tasks, chunksize=1)
+
+        for i, weights in enumerate(todo):
+            chunk_results = results[i * len(self.chunks):(i + 1) * len(self.chunks)]
+            self.costs[self._key(weights)] = sum(chunk_results) / len(self.answers)
+        return [self.costs[self._key(weights)] for weights in candidates]
+
+    def evaluate(self, weights):
+        return self.evaluate_many([weights])[0]
+
+    def grid(self, correct_values, misplaced_values):
+        """
+        Weights of every (correct, misplaced) pair, the same for every position, see `default_weights`
+        """
+        return [default_weights(self.number_of_letters, c, m) for c in correct_values for m in misplaced_values]
+
+    def random(self, n, low=0.0, high=10.0, seed=None):
+        """
+        `n` weights drawn uniformly in [low, high] for each position
+        """
+        rng = random.Random(seed)
+        res = []
+        for _ in range(n):
+            weights = default_weights(self.number_of_letters)
+            weights.update({k: round(rng.uniform(low, high), 3) for k in tuned_keys(self.number_of_letters)})
+            res.append(weights)
+        return res
+
+    def refine(self, weights, step=1.0, min_step=0.125, max_rounds=20):
+        """
+        Local search from `weights`: each round evaluates moving each weight by +/- `step`, keeps the best move
+        and halves `step` when no move improves the cost, until it is below `min_step`
+
+        :return: (best weights, cost)
+        """
+        best, best_cost = weights, self.evaluate(weights)
+        for _ in range(max_rounds):
+            if step < min_step:
+                break
+            neighbours = []
+            for k in tuned_keys(self.number_of_letters):
+                for delta in (step, -step):
+                    neighbour = dict(best)
+                    neighbour[k] = best[k] + delta
+                    neighbours.append(neighbour)
+            costs = self.evaluate_many(neighbours)
+            i = int(np.argmin(costs))
+            if costs[i] < best_cost:
+                best, best_cost = neighbours[i], costs[i]
+            else:
+                step /= 2
+        return best, best_cost
+
+    def search(self, candidates, step=1.0, min_step=0.125, max_rounds=20):
+        """
+        Evaluate `candidates`, from `grid` or `random`, then `refine` the best of them
+
+        :return: (best weights, cost)
+        """
+        candidates = list(candidates) or [default_weights(self.number_of_letters)]
+        costs = self.evaluate_many(candidates)
+        start = candidates[int(np.argmin(costs))]
+        return self.refine(start, step, min_step, max_rounds)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tune the hotness weights of the solver by simulating games")
+    parser.add_argument('output_path', help="JSON file of the best weights, see Solver.load_hotness_weights")
+    parser.add_argument('-d', '--dictionary', default='data/words_dictionary.json')
+    parser.add_argument('-n', '--number-of-letters', type=int, default=5)
+    parser.add_argument('-g', '--max-guesses', type=int, default=6)
+    parser.add_argument('-a', '--answers', help="file of newline-delimited answers, default to the dictionary")
+    parser.add_argument('-p', '--processes', type=int, default=1)
+    parser.add_argument('--patterns-dir', default='data', help="directory of the pattern matrix, built if missing")
+    parser.add_argument('--sample', type=int, help="number of answers to sample")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--grid', type=float, nargs='+', default=[1, 2, 5, 10],
+                        help="values of the correct and misplaced weights of the grid search")
+    parser.add_argument('--random', type=int, default=0, help="number of random weights to evaluate with the grid")
+    parser.add_argument('--step', type=float, default=1.0, help="initial step of the local refinement")
+    parser.add_argument('--min-step', type=float, default=0.125)
+    args = parser.parse_args()
+
+    answers = None
+    if args.answers:
+        with open(args.answers) as f:
+            answers = [line.strip() for line in f if line.strip()]
+    start = time.perf_counter()
+    with Tuner(args.dictionary, args.number_of_letters, args.max_guesses, answers, args.processes,
+               args.patterns_dir, args.sample, args.seed) as tuner:
+        candidates = tuner.grid(args.grid, args.grid) + tuner.random(args.random, seed=args.seed)
+        baseline_cost = tuner.evaluate(default_weights(args.number_of_letters))
+        weights, cost = tuner.search(candidates, args.step, args.min_step)
+        evaluations = len(tuner.costs)
+
+    save_weights(weights, args.output_path, args.number_of_letters, cost=cost, baseline_cost=baseline_cost,
+                 games=len(tuner.answers), evaluations=evaluations)
+    print(f"Mean guesses {cost:.4f} (default weights {baseline_cost:.4f}) after {evaluations} evaluations "
+          f"of {len(tuner.answers)} games in {time.perf_counter() - start:.1f}s, weights saved to {args.output_path}")
@@ -1,5 +1,8 @@
+import math
 from string import ascii_lowercase
 
+import numpy as np
+
 
 def a2i(letter):
     return ord(letter) - ord('a')
@@ -38,3 +41,59 @@ def arr2dict(arr):
     """
 
     return {i2a(i): v for i, v in enumerate(arr)}
+
+
+def is_alpha_word(word):
+    return word.isascii() and word.isalpha() and word.islower()
+
+
+def words2matrix(words, number_of_letters):
+    """
+
+    :param words: ['abc', 'bcd', ...], all of length `number_of_letters`
+    :return: np.ndarray of shape (len(words), number_of_letters) with the a2i value of each letter
+    """
+    buffer = ''.join(words).encode('ascii')
+    matrix = (np.frombuffer(buffer, dtype=np.uint8) - ord('a')).reshape(-1, number_of_letters)
+    # column-major so that a single letter position across all words is contiguous
+    return np.asfortranarray(matrix)
+
+
+def letters_presence(matrix):
+    """
+
+    :param matrix: np.ndarray returned by words2matrix
+    :return: np.ndarray of shape (26, len(matrix)), 1 at [a2i(letter), i] if the letter appears in the i-th word
+    """
+    res = np.zeros((len(ascii_lowercase), len(matrix)), dtype=np.int8)
+    rows = np.arange(len(matrix))
+    for i in range(matrix.shape[1]):
+        res[matrix[:, i], rows] = 1
+    return res
+
+
+def hotness_kernel(letters, targets, targets_letters):
+    """
+    Hotness of one word relative to many targets, see `Solver.hotness`
+
+    :param letters: np.ndarray of the a2i values of the word letters
+    :param targets: np.ndarray of shape (number_of_letters, n), the transposed words2matrix of the targets
+    :param targets_letters: np.ndarray of shape (26, n), the letters_presence of the targets
+    :return: np.ndarray of shape (n, number_of_letters)
+    """
+    positions = np.arange(1, len(letters) + 1, dtype=np.int8)[:, None]
+    # 2 for a letter at the right position, 1 for a letter appearing in the target, 0 otherwise
+    res = (targets == letters[:, None]).view(np.int8) * np.int8(2)
+    res -= targets_letters[letters]
+    res *= positions
+    return res.T
+
+
+def format_suggestions(suggestions):
+    """
+    Suggestions as JSON, see `server.SolverServer` and `batch.process_lines`
+
+    :param suggestions: heap of (score, word)
+    :return: list of [word, score] best first, non finite scores are not valid JSON and become None
+    """
+    return [[word, score if math.isfinite(score) else None] for score, word in sorted(suggestions, reverse=True)]
@@ -0,0 +1,222 @@
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import re
+import numpy as np
+from util import is_alpha_word
+
+
+# bump when the layout of the cache files changes
+VERSION = 2
+
+
+def cache_directory(source_path):
+    return f"{source_path}.cache"
+
+
+def source_hash(source_path):
+    h = hashlib.sha1()
+    with open(source_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+CHUNK_SIZE = 1 << 16
+# one "word": value member of a JSON object, values are scalars
+JSON_MEMBER = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*:\s*'
+                         r'(-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null|"(?:[^"\\]|\\.)*")\s*([,}])')
+
+
+def open_source(source_path):
+    """
+    Open a dictionary source file as text, gzip-compressed files are detected by their magic number
+    """
+    with open(source_path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    return gzip.open(source_path, 'rt') if compressed else open(source_path)
+
+
+def _iter_json_members(buffer, f):
+    buffer = buffer[buffer.index('{') + 1:]
+    while True:
+        position = 0
+        for match in JSON_MEMBER.finditer(buffer):
+            if match.start() != position:
+                break
+            key, value, end = match.groups()
+            yield json.loads(f'"{key}"') if '\\' in key else key, json.loads(value)
+            position = match.end()
+            if end == '}':
+                return
+        buffer = buffer[position:]
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            if buffer.strip() not in ('', '}'):
+                raise ValueError(f"Invalid dictionary near: {buffer[:50]}")
+            return
+        buffer += chunk
+
+
+def _iter_lines(buffer, f):
+    lines = buffer.split('\n')
+    last = lines.pop()
+    for line in itertools.chain(lines, [last + f.readline()], f):
+        yield line.strip(), 1
+
+
+def iter_words(source_path, number_of_letters=None):
+    """
+    Stream the (word, value) pairs of a dictionary source file without loading it, keeping only lowercase alphabetic
+    words, of `number_of_letters` letters if given. The source is a JSON object of {word: value}, or a list of words,
+    one per line, of value 1. Either can be gzip-compressed.
+
+    :param source_path: str
+    :param number_of_letters: int or None for every length
+    :return: generator of (word, value)
+    """
+    with open_source(source_path) as f:
+        buffer = f.read(CHUNK_SIZE)
+        pairs = _iter_json_members(buffer, f) if buffer.lstrip().startswith('{') else _iter_lines(buffer, f)
+        for word, value in pairs:
+            if is_alpha_word(word) and (number_of_letters is None or len(word) == number_of_letters):
+                yield word, value
+
+
+def _write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build(source_path, directory=None):
+    """
+    Split a dictionary source file by word length into fixed-width records, `words_{length}.{build}.bin` holding the
+    ASCII letters of each word back to back. Values other than 1 are kept in `meta.json` along with the size,
+    modification time and hash of the source and the name of each records file. The source is streamed,
+    see `iter_words`.
+    Every file is written to a temporary name and renamed. The records files are named after the hash of the source,
+    so a process holding the meta data of a previous build keeps reading the records it describes.
+
+    :param source_path: str
+    :param directory: cache directory, default to `cache_directory(source_path)`
+    :return: meta data of the cache
+    """
+    directory = directory or cache_directory(source_path)
+    os.makedirs(directory, exist_ok=True)
+    stat = os.stat(source_path)
+    sha1 = source_hash(source_path)
+    meta = {
+        'version': VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha1': sha1,
+        'lengths': {},
+        'files': {},
+        'values': {},
+    }
+    files = {}
+    try:
+        for word, value in iter_words(source_path):
+            length = len(word)
+            if length not in files:
+                meta['files'][str(length)] = f"words_{length}.{sha1[:16]}.bin"
+                files[length] = open(os.path.join(directory, f"{meta['files'][str(length)]}.{os.getpid()}.tmp"), 'wb')
+                meta['lengths'][str(length)] = 0
+            files[length].write(word.encode('ascii'))
+            meta['lengths'][str(length)] += 1
+            if value != 1:
+                meta['values'][word] = value
+    except BaseException:
+        for f in files.values():
+            f.close()
+            os.remove(f.name)
+        raise
+    for length, f in files.items():
+        f.close()
+        os.replace(f.name, os.path.join(directory, meta['files'][str(length)]))
+
+    # meta data is written last, a cache without it is rebuilt
+    _write(os.path.join(directory, 'meta.json'), json.dumps(meta).encode())
+    # records of previous builds, a process mapping them keeps its mapping
+    current = set(meta['files'].values())
+    for name in os.listdir(directory):
+        if name.startswith('words_') and name.endswith('.bin') and name not in current:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    return meta
+
+
+def _load_source(source_path, number_of_letters):
+    records = bytearray()
+    values = {}
+    for word, value in iter_words(source_path, number_of_letters):
+        records += word.encode('ascii')
+        if value != 1:
+            values[word] = value
+    return np.frombuffer(records, dtype=np.uint8).reshape(-1, number_of_letters), values
+
+
+def read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == VERSION else None
+
+
+def is_fresh(source_path, directory, meta):
+    """
+    Whether the cache was built from the current source. The source is only hashed when its size or modification
+    time changed, and the meta data is refreshed when the content did not.
+    """
+    stat = os.stat(source_path)
+    if meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    if meta['size'] != stat.st_size or meta['sha1'] != source_hash(source_path):
+        return False
+
+    meta['mtime_ns'] = stat.st_mtime_ns
+    _write(os.path.join(directory, 'meta.json'), json.dumps(meta).encode())
+    return True
+
+
+def load(source_path, number_of_letters, directory=None):
+    """
+    Words of a given length from the cache of a dictionary, (re)building the cache when needed
+
+    :param source_path: str
+    :param number_of_letters: int
+    :param directory: cache directory, default to `cache_directory(source_path)`
+    :return: (np.ndarray of shape (number of words, number_of_letters) of ASCII letters, memory mapped,
+        {word: value} of the words whose value is not 1)
+    """
+    directory = directory or cache_directory(source_path)
+    # a build by another process may remove the records of the meta data read, which is then read again
+    for attempt in range(2):
+        meta = read_meta(directory)
+        try:
+            if meta is None or not is_fresh(source_path, directory, meta):
+                meta = build(source_path, directory)
+        except OSError:
+            # read-only location or file system, no cache
+            return _load_source(source_path, number_of_letters)
+
+        count = meta['lengths'].get(str(number_of_letters), 0)
+        if count == 0:
+            return np.zeros((0, number_of_letters), dtype=np.uint8), {}
+
+        try:
+            records = np.memmap(os.path.join(directory, meta['files'][str(number_of_letters)]), dtype=np.uint8,
+                                mode='r', shape=(count, number_of_letters))
+        except FileNotFoundError:
+            continue
+        values = {w: v for w, v in meta['values'].items() if len(w) == number_of_letters}
+        return records, values
+    return _load_source(source_path, number_of_letters)
@@ -0,0 +1,158 @@
+import numpy as np
+import patterns
+
+
+def to_bitset(mask):
+    """
+
+    :param mask: np.ndarray of bool
+    :return: int with bit i set if mask[i]
+    """
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+def from_bitset(bits, length):
+    """
+    Inverse of `to_bitset`
+
+    :param bits: int
+    :param length: length of the mask
+    :return: np.ndarray of the indices of the bits set
+    """
+    buffer = bits.to_bytes((length + 7) // 8, 'little')
+    # nonzero is several times faster on bool than on uint8
+    return np.flatnonzero(np.unpackbits(np.frombuffer(buffer, dtype=np.uint8), bitorder='little')[:length].view(bool))
+
+
+def to_mask(bits, length):
+    """
+    Inverse of `to_bitset`, as a mask
+
+    :return: np.ndarray of bool
+    """
+    buffer = bits.to_bytes((length + 7) // 8, 'little')
+    return np.unpackbits(np.frombuffer(buffer, dtype=np.uint8), bitorder='little')[:length].view(bool)
+
+
+class WordIndex:
+
+    def __init__(self, words_matrix):
+        """
+        Inverted index of a dictionary to bitsets of word indices, bit i standing for the i-th word.
+        letter_position[letter][position]: words with `letter` at `position`
+        letter_count[letter][count]: words with at least `count` times `letter`, count from 0 to number_of_letters + 1
+
+        :param words_matrix: np.ndarray of shape (n, number_of_letters), see `util.words2matrix`
+        """
+        number_of_words, number_of_letters = words_matrix.shape
+        self.number_of_words = number_of_words
+        self.number_of_letters = number_of_letters
+        self.all_words = (1 << number_of_words) - 1
+
+        counts = np.zeros((26, number_of_words), dtype=np.uint8)
+        rows = np.arange(number_of_words)
+        self.letter_position = [[] for _ in range(26)]
+        for p in range(number_of_letters):
+            column = words_matrix[:, p]
+            counts[column, rows] += 1
+            for letter in range(26):
+                self.letter_position[letter].append(to_bitset(column == letter))
+        self.letter_count = [[to_bitset(counts[letter] >= c) for c in range(number_of_letters + 2)] for letter in range(26)]
+
+    def to_arrays(self):
+        """
+        Bitsets as fixed-width little endian bytes, see `from_arrays`
+
+        :return: (np.ndarray of shape (26, number_of_letters, nbytes), np.ndarray of shape (26, number_of_letters + 2, nbytes))
+        """
+        nbytes = (self.number_of_words + 7) // 8
+
+        def pack(bitsets):
+            return np.frombuffer(b''.join(bits.to_bytes(nbytes, 'little') for row in bitsets for bits in row),
+                                 dtype=np.uint8).reshape(26, -1, nbytes)
+
+        return pack(self.letter_position), pack(self.letter_count)
+
+    @classmethod
+    def from_arrays(cls, number_of_words, letter_position, letter_count):
+        """
+        Index of the bitsets returned by `to_arrays`, without the dictionary
+        """
+        o = cls.__new__(cls)
+        o.number_of_words = number_of_words
+        o.number_of_letters = letter_position.shape[1]
+        o.all_words = (1 << number_of_words) - 1
+        o.letter_position = [[int.from_bytes(bits, 'little') for bits in row] for row in letter_position]
+        o.letter_count = [[int.from_bytes(bits, 'little') for bits in row] for row in letter_count]
+        return o
+
+    def position_bitset(self, position, mask):
+        """
+        Words with one of the letters of `mask` at `position`
+
+        :param position: int, starting at 0
+        :param mask: 26-bit mask of letters
+        :return: int
+        """
+        allowed = [letter for letter in range(26) if mask >> letter & 1]
+        if len(allowed) <= 13:
+            res = 0
+            for letter in allowed:
+                res |= self.letter_position[letter][position]
+        else:
+            res = self.all_words
+            for letter in range(26):
+                if not mask >> letter & 1:
+                    res &= ~self.letter_position[letter][position]
+        return res
+
+    def filter(self, constraints, bits=None):
+        """
+        Words satisfying the constraints
+
+        :param constraints: Constraints
+        :param bits: bitset of the words to filter, None for all words
+        :return: bitset of the words satisfying the constraints
+        """
+        res = self.all_words if bits is None else bits
+        for position, mask in enumerate(constraints.positions):
+            if mask != constraints.all_letters:
+                res &= self.position_bitset(position, mask)
+        for letter in range(26):
+            min_count = constraints.min_count[letter]
+            max_count = constraints.max_count[letter]
+            if min_count > 0:
+                res &= self.letter_count[letter][min(min_count, self.number_of_letters + 1)]
+            if max_count < self.number_of_letters:
+                res &= ~self.letter_count[letter][max_count + 1]
+        return res
+
+    def pattern_filter(self, letters, pattern, bits=None):
+        """
+        Words that would give `pattern` for a guess, see `patterns.encode`
+
+        :param letters: a2i values of the letters of the guess
+        :param pattern: pattern id
+        :param bits: bitset of the words to filter, None for all words
+        :return: bitset of the words giving `pattern`
+        """
+        res = self.all_words if bits is None else bits
+        for position, letter in enumerate(letters):
+            pattern, digit = divmod(pattern, 3)
+            at_position = self.letter_position[letter][position]
+            if digit == patterns.CORRECT_CHAR_POS_DIGIT:
+                res &= at_position
+            elif digit == patterns.CORRECT_CHAR_DIGIT:
+                res &= self.letter_count[letter][1] & ~at_position
+            else:
+                res &= ~self.letter_count[letter][1]
+        return res
+
+    def count(self, constraints, bits=None):
+        return self.filter(constraints, bits).bit_count()
+
+    def indices(self, bits):
+        return from_bitset(bits, self.number_of_words)
+
+    def mask(self, bits):
+        return to_mask(bits, self.number_of_words)
@@ -0,0 +1,21 @@
+from solver import Solver
+
+
+def init_worker(state, solver_args, solver_kwargs=None, patterns_dir=None, build=False, **values):
+    """
+    Set up the state of a worker process of a pool, or of the main process when it does the work itself:
+    a quiet Solver in state['solver'] and `values`, the previous state is dropped
+
+    :param state: dict of the module running the pool
+    :param solver_args: positional arguments of `Solver`
+    :param solver_kwargs: keyword arguments of `Solver`
+    :param patterns_dir: directory of the pattern matrix to load, None to compute the hotness of each guess
+    :param build: build the pattern matrix if it does not exist, see `Solver.load_patterns`
+    :return: Solver
+    """
+    solver = Solver(*solver_args, verbose=False, **(solver_kwargs or {}))
+    if patterns_dir is not None:
+        solver.load_patterns(patterns_dir, build=build)
+    state.clear()
+    state.update(values, solver=solver)
+    return solver